@@ -0,0 +1,390 @@
+"""
+benchmarks.py
+This module provides the benchmark suite of the store hot paths.
+
+It builds synthetic catalogs of increasing size with a realistic mix of Product,
+NonStockedProduct and LimitedProduct and of promotions, times the catalog, ordering and
+promotion operations on every catalog, and emits the results as JSON. The results can
+be saved as a baseline, and later runs compared against it to flag regressions.
+
+Usage:
+    python3 benchmarks.py                                   # 10^3 to 10^5 products
+    python3 benchmarks.py --sizes 1000,10000000 --output results.json
+    python3 benchmarks.py --save-baseline baseline.json
+    python3 benchmarks.py --baseline baseline.json --threshold 0.25
+
+Functions:
+    build_catalog: Builds a synthetic catalog.
+    run_benchmarks: Runs the benchmarks and returns their results.
+    measure_product_memory: Measures the memory of the slotted products.
+    compare_with_baseline: Compares results with a baseline.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from products import Product, NonStockedProduct, LimitedProduct
+from store import Store
+import promotions
+import metrics
+from promotion_engine import CompiledPromotion, NthItemDiscount, PercentOff, QuantityTiers
+from flash_sale import OrderBatcher
+
+# The share of every kind of product in the synthetic catalogs
+NON_STOCKED_SHARE = 0.05
+LIMITED_SHARE = 0.10
+# The share of products with a promotion
+PROMOTION_SHARE = 0.30
+# The number of lines of the benchmarked orders
+ORDER_LINES = 20
+# The number of lookups timed per run
+LOOKUPS = 10000
+# The default sizes of the catalogs
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5]
+# The number of products created to measure their memory
+MEMORY_SAMPLE = 100000
+# The benchmarks run again with the metrics enabled, to measure their overhead
+INSTRUMENTED = ("order", "add_product_to_order", "Product.buy", "PercentDiscount.apply_promotion")
+
+
+def build_catalog(size: int, seed: int = 0) -> List[Product]:
+    """
+    Builds a synthetic catalog.
+
+    :param size: (int) The number of products.
+    :param seed: (int) The seed of the random generator, the same seed builds the same catalog.
+    :return: (List[Product]) The products of the catalog.
+    """
+    rand = random.Random(seed)
+    catalog_promotions = [promotions.SecondHalfPrice("Second Half price!"),
+                          promotions.ThirdOneFree("Third One Free!"),
+                          promotions.PercentDiscount("30% off!", percent=30)]
+    products = []
+    for index in range(size):
+        name = f"Product {index:08d}"
+        price = round(rand.uniform(1, 2000), 2)
+        kind = rand.random()
+        if kind < NON_STOCKED_SHARE:
+            product = NonStockedProduct(name, price)
+        elif kind < NON_STOCKED_SHARE + LIMITED_SHARE:
+            product = LimitedProduct(name, price, rand.randint(1, 1000), limit=rand.randint(1, 5))
+        else:
+            product = Product(name, price, rand.randint(0, 10000))
+        if rand.random() < PROMOTION_SHARE:
+            product.set_promotion(rand.choice(catalog_promotions))
+        products.append(product)
+    return products
+
+
+def _time(function: Callable[[], int], repeat: int) -> Tuple[float, int]:
+    """
+    Times a function, the best of the repeats is kept.
+
+    :param function: The function to time, it returns the number of operations it ran.
+    :param repeat: (int) The number of runs.
+    :return: (Tuple[float, int]) The best time in seconds and the number of operations.
+    """
+    best = float("inf")
+    operations = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operations = function()
+        best = min(best, time.perf_counter() - started)
+    return best, operations
+
+
+def _order_lines(store: Store, rand: random.Random, repeat: int) -> List[Tuple[str, int]]:
+    """
+    Picks the lines of an order that the store can fulfil on every run, with and
+    without the metrics.
+    """
+    candidates = [product for product in store.get_products()[0]
+                  if isinstance(product, NonStockedProduct) or product.quantity > 2 * repeat]
+    return [(product.name, 1)
+            for product in rand.sample(candidates, min(ORDER_LINES, len(candidates)))]
+
+
+def benchmark_size(size: int, repeat: int = 3, seed: int = 0) -> List[Dict]:
+    """
+    Runs all the benchmarks on a catalog of the given size.
+
+    :param size: (int) The number of products.
+    :param repeat: (int) The number of runs of every benchmark.
+    :param seed: (int) The seed of the random generator.
+    :return: (List[Dict]) The result of every benchmark.
+    """
+    rand = random.Random(seed)
+    started = time.perf_counter()
+    products = build_catalog(size, seed)
+    store = Store(products)
+    results = [{"name": "build_store", "size": size, "seconds": time.perf_counter() - started,
+                "operations": size}]
+    names = [rand.choice(products).name for _ in range(LOOKUPS)]
+    cart_lines = _order_lines(store, rand, repeat)
+    order_lines = _order_lines(store, rand, repeat)
+
+    def find_product_by_name():
+        for name in names:
+            store.find_product_by_name(name)
+        return len(names)
+
+    def add_product_to_order():
+        cart = store.init_order_list()
+        for name, quantity in cart_lines:
+            store.add_product_to_order(name, quantity, cart)
+        return len(cart_lines)
+
+    def order():
+        store.order(order_lines)
+        return 1
+
+    def get_products():
+        # a product changes status between the listings, as it does between menu actions
+        products[0].deactivate()
+        products[0].activate()
+        store.get_products()
+        return 1
+
+    def get_total_quantity():
+        for _ in range(LOOKUPS):
+            store.get_total_quantity()
+        return LOOKUPS
+
+    def get_cheapest_products():
+        for _ in range(LOOKUPS):
+            store.get_cheapest_products(10)
+        return LOOKUPS
+
+    def get_products_in_price_range():
+        for _ in range(LOOKUPS):
+            store.get_products_in_price_range(100, 110)
+        return LOOKUPS
+
+    def get_products_page():
+        for page in range(1, LOOKUPS + 1):
+            store.get_products_page(page, 20)
+        return LOOKUPS
+
+    def render_products():
+        # served from the cache, the catalog does not change between the listings
+        for _ in range(LOOKUPS):
+            store.render_products(page=1)
+        return LOOKUPS
+
+    buyer = Product("Benchmark product", 10.0, LOOKUPS * repeat * 2)
+
+    def buy():
+        for _ in range(LOOKUPS):
+            buyer.buy(1)
+        return LOOKUPS
+
+    # a flash sale: many small orders of a handful of products, placed one by one and
+    # by batches
+    sale = Store([Product(f"Flash sale {index}", 100.0, 4 * LOOKUPS * repeat)
+                  for index in range(4)])
+    batcher = OrderBatcher(sale)
+    sale_orders = [[(f"Flash sale {index % 4}", 1), (f"Flash sale {(index + 1) % 4}", 1)]
+                   for index in range(LOOKUPS)]
+
+    def submit_orders():
+        sale.submit_orders(sale_orders)
+        return len(sale_orders)
+
+    def place_batch():
+        batcher.place_batch(sale_orders)
+        return len(sale_orders)
+
+    benchmarks = {
+        "find_product_by_name": find_product_by_name,
+        "add_product_to_order": add_product_to_order,
+        "order": order,
+        "get_products": get_products,
+        "get_total_quantity": get_total_quantity,
+        "get_cheapest_products": get_cheapest_products,
+        "get_products_in_price_range": get_products_in_price_range,
+        "get_products_page": get_products_page,
+        "render_products": render_products,
+        "Product.buy": buy,
+        "flash sale submit_orders": submit_orders,
+        "flash sale OrderBatcher.place_batch": place_batch,
+    }
+
+    promoted = [product for product in products if product.promotion][:LOOKUPS]
+    # a stack of rules compiled by the promotion engine, priced over the same products
+    stacked = CompiledPromotion([NthItemDiscount("Second Half price!"),
+                                 PercentOff("30% off!", percent=30),
+                                 QuantityTiers("Bulk", {5: 5, 8: 10})])
+    for promotion in [*{id(product.promotion): product.promotion
+                        for product in promoted}.values(), stacked]:
+        lines = [product for product in promoted
+                 if product.promotion is promotion or promotion is stacked]
+        quantities = [rand.randint(1, 10) for _ in lines]
+        prices = [product.price for product in lines]
+
+        def apply_promotion(promotion=promotion, lines=lines, quantities=quantities):
+            for product, quantity in zip(lines, quantities):
+                promotion.apply_promotion(product, quantity)
+            return len(lines)
+
+        def apply_promotion_batch(promotion=promotion, prices=prices, quantities=quantities):
+            promotion.apply_promotion_batch(prices, quantities)
+            return len(prices)
+
+        def apply_promotion_batch_cents(promotion=promotion, quantities=quantities,
+                                        prices_cents=[product.price_cents for product in lines]):
+            promotion.apply_promotion_batch_cents(prices_cents, quantities)
+            return len(prices_cents)
+
+        benchmarks[f"{type(promotion).__name__}.apply_promotion"] = apply_promotion
+        benchmarks[f"{type(promotion).__name__}.apply_promotion_batch"] = apply_promotion_batch
+        benchmarks[f"{type(promotion).__name__}.apply_promotion_batch_cents"] = \
+            apply_promotion_batch_cents
+
+    for name, function in benchmarks.items():
+        seconds, operations = _time(function, repeat)
+        results.append({"name": name, "size": size, "seconds": seconds,
+                        "operations": operations})
+
+    # the same hot paths timed with the metrics enabled, the runs above are the cost
+    # of the disabled metrics since disabling them puts the original methods back
+    metrics.enable(metrics.Registry())
+    try:
+        for name in INSTRUMENTED:
+            if name in benchmarks:
+                seconds, operations = _time(benchmarks[name], repeat)
+                results.append({"name": f"{name} [metrics]", "size": size,
+                                "seconds": seconds, "operations": operations})
+    finally:
+        metrics.disable()
+    return results
+
+
+class _DictProduct:
+    """
+    The same attributes as a Product kept in a per-instance __dict__, the layout the
+    products had before __slots__, used as the reference of the memory measurement.
+    """
+    def __init__(self, name, price, quantity):
+        self._store = None
+        self.name = name
+        self._price = price
+        self._price_cents = round(price * 100)
+        self._quantity = quantity
+        self._promotion = None
+        self._active = quantity > 0
+
+
+def _allocated(factory: Callable[[int], object], count: int) -> int:
+    """
+    Returns the bytes allocated to keep count objects built by factory alive.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory(index) for index in range(count)]
+        allocated = tracemalloc.get_traced_memory()[0] - before
+        del objects
+    finally:
+        tracemalloc.stop()
+    return allocated
+
+
+def measure_product_memory(count: int = MEMORY_SAMPLE) -> Dict:
+    """
+    Measures the memory of the slotted products against the same products kept in a
+    __dict__. The names are shared between both measurements so only the objects count.
+
+    :param count: (int) The number of products to create.
+    :return: (Dict) The bytes per product of both layouts and the saving per million products.
+    """
+    names = [f"Product {index:08d}" for index in range(count)]
+    list_bytes = _allocated(lambda index: None, count)
+    slotted = (_allocated(lambda index: Product(names[index], 10.0, 5), count) - list_bytes) / count
+    unslotted = (_allocated(lambda index: _DictProduct(names[index], 10.0, 5), count) -
+                 list_bytes) / count
+    return {"products": count,
+            "slotted_bytes_per_product": slotted,
+            "dict_bytes_per_product": unslotted,
+            "saved_mb_per_million_products": (unslotted - slotted) * 10 ** 6 / 2 ** 20}
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, seed: int = 0) -> Dict:
+    """
+    Runs the benchmarks on catalogs of every size.
+
+    :param sizes: (List[int]) The sizes of the catalogs.
+    :param repeat: (int) The number of runs of every benchmark.
+    :param seed: (int) The seed of the random generator.
+    :return: (Dict) The results, with the Python version and platform they were measured on.
+    """
+    results = []
+    for size in sizes:
+        results.extend(benchmark_size(size, repeat, seed))
+    for result in results:
+        result["us_per_operation"] = result["seconds"] / max(result["operations"], 1) * 1e6
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "results": results, "memory": measure_product_memory()}
+
+
+def compare_with_baseline(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Compares results with a baseline.
+
+    :param current: (Dict) The results of this run.
+    :param baseline: (Dict) The results of the baseline run.
+    :param threshold: (float) The tolerated slowdown, 0.25 flags what got more than 25% slower.
+    :return: (List[str]) A description of every regression.
+    """
+    reference = {(result["name"], result["size"]): result["us_per_operation"]
+                 for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = reference.get((result["name"], result["size"]))
+        if before and result["us_per_operation"] > before * (1 + threshold):
+            regressions.append(f"{result['name']} ({result['size']} products): "
+                               f"{before:.3f} -> {result['us_per_operation']:.3f} us/op")
+    return regressions
+
+
+def main():
+    """
+    Runs the benchmark suite from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the store hot paths.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated catalog sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--save-baseline", help="write the JSON results as a new baseline")
+    parser.add_argument("--baseline", help="compare the results with this baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run_benchmarks([int(size) for size in args.sizes.split(",")], args.repeat,
+                             args.seed)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            file.write(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare_with_baseline(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION:", regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+binary_catalog.py - Module file containing the memory-mapped binary catalog
+
+This module defines a fixed-width binary file format for product catalogs and the
+MappedCatalog class, which opens such a file with mmap. The file is laid out column by
+column like a ProductTable, so a MappedCatalog can back a ColumnarStore directly: the
+store serves reads as soon as the file is mapped, without parsing or building products,
+and stock updates are written in place into the mapped file.
+
+File layout (native byte order, every section aligned to 8 bytes):
+    header          magic, version, byte order, row count, promotion count and the
+                    offset of every section
+    prices          float64 per row
+    quantities      int64 per row
+    active          int8 per row
+    kinds           int8 per row (see product_table.KIND_*)
+    limits          int64 per row
+    promotion ids   int64 per row, -1 for no promotion
+    name offsets    uint64 per row + 1, offsets of the names in the string table
+    name index      uint64 per row, the rows sorted by name for the binary search
+    string table    the UTF-8 names, back to back
+    promotions      the UTF-8 JSON list of the promotion names, referenced by id
+
+Classes:
+    MappedCatalog: A product catalog mapped from a binary catalog file.
+
+Functions:
+    write_catalog: Writes products to a binary catalog file.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Union
+from products import Product
+from product_table import ProductTable
+
+MAGIC = b"BBCATLOG"
+VERSION = 1
+# magic, version, byte order, row count, promotion count, then 11 section offsets
+# (prices, quantities, active, kinds, limits, promotion ids, name offsets, name index,
+# string table, promotions, end of file)
+HEADER = struct.Struct("<8sII QQ 11Q")
+BYTE_ORDERS = {"little": 1, "big": 2}
+
+
+def _align(offset: int) -> int:
+    """
+    :return: (int) The offset rounded up to a multiple of 8.
+    """
+    return (offset + 7) & ~7
+
+
+def write_catalog(path: str, products: Union[ProductTable, Iterable[Product]]):
+    """
+    Writes products to a binary catalog file.
+
+    :param path: (str) The path of the file.
+    :param products: The products to write, or a ProductTable holding them.
+    """
+    table = products if isinstance(products, ProductTable) else \
+        ProductTable.from_products(products)
+    rows = list(table.rows())
+    encoded_names = [table.name_at(row).encode("utf-8") for row in rows]
+
+    name_offsets = array("Q", [0])
+    for name in encoded_names:
+        name_offsets.append(name_offsets[-1] + len(name))
+    name_index = array("Q", sorted(range(len(rows)), key=lambda index: encoded_names[index]))
+    promotion_names = json.dumps([promotion.name for promotion in table.promotions]).encode()
+
+    sections = [
+        array("d", (table.prices[row] for row in rows)).tobytes(),
+        array("q", (table.quantities[row] for row in rows)).tobytes(),
+        array("b", (table.active[row] for row in rows)).tobytes(),
+        array("b", (table.kinds[row] for row in rows)).tobytes(),
+        array("q", (table.limits[row] for row in rows)).tobytes(),
+        array("q", (table.promotion_ids[row] for row in rows)).tobytes(),
+        name_offsets.tobytes(),
+        name_index.tobytes(),
+        b"".join(encoded_names),
+        promotion_names,
+    ]
+    offsets = []
+    offset = _align(HEADER.size)
+    for section in sections:
+        offsets.append(offset)
+        offset = _align(offset + len(section))
+    offsets.append(offset)
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDERS[sys.byteorder], len(rows),
+                               len(table.promotions), *offsets))
+        for section_offset, section in zip(offsets, sections):
+            file.seek(section_offset)
+            file.write(section)
+        file.truncate(offsets[-1])
+
+
+class MappedCatalog(ProductTable):
+    """
+    A product catalog mapped from a binary catalog file.
+
+    The columns are memoryviews of the mapped file, the quantities, active flags, prices,
+    limits and promotions of the rows can be updated in place, but rows can't be added
+    or removed.
+    """
+    # pylint: disable=super-init-not-called
+    def __init__(self, path: str, promotions: Optional[Dict[str, object]] = None,
+                 writable: bool = True):
+        """
+        Maps a binary catalog file.
+
+        :param path: (str) The path of the file.
+        :param promotions: (Dict[str, Promotion]) The promotions by name, the rows whose
+                           promotion is not among them have no promotion.
+        :param writable: (bool) Whether the updates are written back to the file, they
+                         are only kept in memory otherwise.
+
+        Raises:
+            ValueError: If the file is not a binary catalog of this platform's byte order.
+        """
+        self.path = path
+        self._writable = writable
+        with open(path, "r+b" if writable else "rb") as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is not a binary catalog file")
+            # a private copy-on-write mapping takes the updates of a read-only catalog,
+            # a read-only mapping would fail the first order
+            self._map = mmap.mmap(file.fileno(), 0,
+                                  access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_COPY)
+        header = HEADER.unpack_from(self._map)
+        magic, version, byte_order, count, _ = header[:5]
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a binary catalog file")
+        if byte_order != BYTE_ORDERS[sys.byteorder]:
+            self._map.close()
+            raise ValueError(f"{path} was written with another byte order")
+        offsets = header[5:]
+
+        self._count = count
+        self._views: List[memoryview] = []
+        self.prices = self._column(offsets[0], count, "d")
+        self.quantities = self._column(offsets[1], count, "q")
+        self.active = self._column(offsets[2], count, "b")
+        self.kinds = self._column(offsets[3], count, "b")
+        self.limits = self._column(offsets[4], count, "q")
+        self.promotion_ids = self._column(offsets[5], count, "q")
+        self._name_offsets = self._column(offsets[6], count + 1, "Q")
+        self._name_index = self._column(offsets[7], count, "Q")
+        self._names_offset = offsets[8]
+
+        promotion_names = json.loads(self._map[offsets[9]:offsets[10]].rstrip(b"\0"))
+        promotions = promotions or {}
+        self.promotions = [promotions.get(name) for name in promotion_names]
+
+    def _column(self, offset: int, count: int, type_code: str) -> memoryview:
+        """
+        Returns a section of the mapped file as a typed memoryview.
+        """
+        size = struct.calcsize(type_code)
+        view = memoryview(self._map)[offset:offset + count * size].cast(type_code)
+        self._views.append(view)
+        return view
+
+    def __len__(self) -> int:
+        return self._count
+
+    def rows(self):
+        return iter(range(self._count))
+
+    def _name_bytes(self, row: int) -> bytes:
+        """
+        :return: (bytes) The UTF-8 name of a row.
+        """
+        start = self._names_offset + self._name_offsets[row]
+        return self._map[start:self._names_offset + self._name_offsets[row + 1]]
+
+    def name_at(self, row: int) -> str:
+        return self._name_bytes(row).decode("utf-8")
+
+    def row_of(self, name: str) -> Optional[int]:
+        """
+        Finds a row by name with a binary search of the name index.
+
+        :param name: (str) The product name.
+        :return: (int) The row of the product, None if the catalog has no such product.
+        """
+        encoded = name.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_bytes(self._name_index[middle]) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._name_bytes(self._name_index[low]) == encoded:
+            return self._name_index[low]
+        return None
+
+    def promotion_id(self, promotion) -> int:
+        """
+        Returns the id of a promotion, only the promotions of the file have one.
+
+        Raises:
+            ValueError: If the promotion is not one of the promotions of the file.
+        """
+        if promotion is None:
+            return -1
+        for promotion_id, known in enumerate(self.promotions):
+            if known is promotion:
+                return promotion_id
+        raise ValueError("A mapped catalog can't reference new promotions")
+
+    def append(self, *args, **kwargs) -> int:
+        raise ValueError("Products can't be added to a mapped catalog")
+
+    def remove(self, row: int):
+        raise ValueError("Products can't be removed from a mapped catalog")
+
+    def active_count(self) -> int:
+        return bytes(self.active).count(1)
+
+    def flush(self):
+        """
+        Writes the updates of the mapped file to disk.
+        """
+        self._map.flush()
+
+    def close(self):
+        """
+        Unmaps the file, the updates are flushed first.
+        """
+        if self._map.closed:
+            return
+        if self._writable:
+            self._map.flush()
+        for view in self._views:
+            view.release()
+        self._map.close()
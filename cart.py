@@ -0,0 +1,165 @@
+"""
+cart.py - Module file containing the Cart class
+
+This module defines the Cart class, which holds the lines of an order while the
+customer is shopping.
+
+Every line is keyed by the product name and keeps a direct reference to the
+Product instance, so adding, merging, removing and looking up a line are O(1)
+and checkout never has to resolve the names again. The cart also keeps a
+running count of the ordered units and a running total of the line prices, in
+integer cents so the total never drifts from the sum of the lines.
+
+Every cart has an ID of its own, the reservations of a store hold stock under it.
+
+Classes:
+    CartLine: A single line of the cart (product, quantity and line price).
+    Cart: A class representing a shopping cart.
+"""
+
+import itertools
+from typing import Dict, Iterator, Tuple
+from products import Product
+from money import to_amount
+
+# the IDs of the carts, the increment of itertools.count is atomic
+_cart_ids = itertools.count(1)
+
+
+class CartLine:
+    """
+    A single line of the cart.
+
+    Attributes:
+        product (Product): The product of the line.
+        quantity (int): The ordered quantity of the product.
+        price (float): The price of the line, promotions included.
+        price_cents (int): The price of the line in cents, promotions included.
+    """
+    def __init__(self, product: Product, quantity: int):
+        """
+        Initializes a new cart line.
+
+        :param product: (Product): The product of the line.
+        :param quantity: (int): The ordered quantity of the product.
+        """
+        self.product = product
+        self.quantity = quantity
+        self.price_cents = product.quote_cents(quantity)
+
+    @property
+    def price(self) -> float:
+        return to_amount(self.price_cents)
+
+
+class Cart:
+    """
+    A class representing a shopping cart.
+
+    Attributes:
+        cart_id (int): The ID of the cart, unique within the process.
+        total_quantity (int): The number of units over all the lines.
+        total_price (float): The price of all the lines, promotions included.
+        total_cents (int): The price of all the lines in cents, promotions included.
+    """
+    def __init__(self):
+        """
+        Initializes an empty cart.
+        """
+        self.cart_id = next(_cart_ids)
+        self._lines: Dict[str, CartLine] = {}
+        self.total_quantity = 0
+        self.total_cents = 0
+
+    @property
+    def total_price(self) -> float:
+        return to_amount(self.total_cents)
+
+    def __len__(self) -> int:
+        """
+        :return: (int) The number of lines in the cart.
+        """
+        return len(self._lines)
+
+    def __contains__(self, product_name) -> bool:
+        """
+        :param product_name: (str) The name of the product to check.
+        :return: (bool) True if the product has a line in the cart, False otherwise.
+        """
+        return product_name in self._lines
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        """
+        Iterates over the cart as (product name, quantity) tuples, in the order
+        the lines were first added.
+        """
+        for name, line in self._lines.items():
+            yield name, line.quantity
+
+    def lines(self) -> Iterator[CartLine]:
+        """
+        :return: An iterator over the lines of the cart.
+        """
+        return iter(self._lines.values())
+
+    def quantity_of(self, product_name: str) -> int:
+        """
+        Returns the quantity of a product that has been added to the cart.
+
+        :param product_name: (str) The name of the product.
+        :return: (int) The quantity in the cart, 0 if the product has no line.
+        """
+        line = self._lines.get(product_name)
+        return line.quantity if line else 0
+
+    def add(self, product: Product, quantity: int) -> int:
+        """
+        Adds a quantity of a product to the cart, merging it with the existing line
+        of the same product if there is one.
+
+        :param product: (Product) The product to add.
+        :param quantity: (int) The quantity to add.
+        :return: (int) The new quantity of the line.
+        """
+        line = self._lines.get(product.name)
+        if line is None:
+            line = CartLine(product, quantity)
+            self._lines[product.name] = line
+        else:
+            self.total_cents -= line.price_cents
+            line.quantity += quantity
+            line.price_cents = product.quote_cents(line.quantity)
+        self.total_quantity += quantity
+        self.total_cents += line.price_cents
+        return line.quantity
+
+    def remove(self, product_name: str) -> int:
+        """
+        Removes the line of a product from the cart.
+
+        :param product_name: (str) The name of the product.
+        :return: (int) The quantity that was removed, 0 if the product has no line.
+        """
+        line = self._lines.pop(product_name, None)
+        if line is None:
+            return 0
+        self.total_quantity -= line.quantity
+        self.total_cents -= line.price_cents
+        return line.quantity
+
+    def merge(self, other: "Cart"):
+        """
+        Adds all the lines of another cart to this cart.
+
+        :param other: (Cart) The cart to merge into this one.
+        """
+        for line in other.lines():
+            self.add(line.product, line.quantity)
+
+    def clear(self):
+        """
+        Removes all the lines from the cart.
+        """
+        self._lines.clear()
+        self.total_quantity = 0
+        self.total_cents = 0
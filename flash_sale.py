@@ -0,0 +1,238 @@
+"""
+flash_sale.py - Module file containing the batched order processing of the store
+
+During a flash sale thousands of orders a second compete for a handful of products.
+Placed one by one, every order locks, checks and updates the same few products. The
+OrderBatcher collects the orders arriving within a short window and places them as a
+group: the products of the batch are locked once, the demand of the orders is allocated
+in one pass over the orders in arrival order, and each product is then updated once
+with the total taken from it.
+
+The allocation is deterministic: an order is served from the stock left by the orders
+that arrived before it. An order whose lines can't all be served is rejected and takes
+nothing, or with partial fills it takes what is left of every line and is only rejected
+when nothing at all is left for it.
+
+Usage:
+    with OrderBatcher(store, window=0.005) as batcher:
+        future = batcher.submit([("Google Pixel 7", 1)])
+        receipt = future.result()       # raises OrderRejected if the order was rejected
+
+Classes:
+    OrderBatcher: Places the orders by batches.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
+from cart import Cart
+from products import Product, NonStockedProduct
+from receipt import Receipt
+from store import Store, OrderRejected
+
+ShoppingList = Union[Cart, List[Tuple[str, int]]]
+
+
+class OrderBatcher:
+    """
+    Places the orders submitted to a store by batches, from a thread of its own.
+
+    Attributes:
+        window (float): The seconds the first order of a batch waits for the others.
+        max_batch (int): The most orders placed in one batch.
+        partial (bool): Whether the orders are partially filled when the stock runs out.
+    """
+    def __init__(self, store: Store, window: float = 0.005, max_batch: int = 1024,
+                 partial: bool = False):
+        """
+        :param store: (Store) The store.
+        :param window: (float) The seconds the first order of a batch waits for the others.
+        :param max_batch: (int) The most orders placed in one batch.
+        :param partial: (bool) Whether the orders are partially filled when the stock
+                        runs out, rather than rejected.
+
+        Raises:
+            ValueError: If the window is negative or max_batch is not positive.
+        """
+        if window < 0:
+            raise ValueError("The batch window can't be negative.")
+        if max_batch <= 0:
+            raise ValueError("The batches must hold at least one order.")
+        self.window = window
+        self.max_batch = max_batch
+        self.partial = partial
+        self._store = store
+        self._pending: List[Tuple[ShoppingList, Future]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, shopping_list: ShoppingList) -> Future:
+        """
+        Queues an order for the next batch.
+
+        :param shopping_list: (Cart or List[Tuple[str, int]]) The order cart, or a shopping
+                              list containing the product names and quantities.
+        :return: (Future) The future of the order, its result is the receipt of the
+                 order, or it raises the OrderRejected error that rejected the order.
+
+        Raises:
+            ValueError: If the batcher is closed.
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise ValueError("The order batcher is closed.")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._pending.append((shopping_list, future))
+            # the thread only waits for the first order of a batch and for a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return future
+
+    def close(self):
+        """
+        Places the orders still queued and stops the thread of the batcher.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        """
+        Collects the batches and places them, until the batcher is closed.
+        """
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            try:
+                results = self.place_batch([shopping_list for shopping_list, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, OrderRejected):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def place_batch(self, shopping_lists: List[ShoppingList]) \
+            -> List[Union[Receipt, OrderRejected]]:
+        """
+        Places a batch of orders, in the given order. The batch thread calls it, it may
+        also be called directly to place a batch at once.
+
+        :param shopping_lists: (List[ShoppingList]) The shopping lists of the orders.
+        :return: (List[Union[Receipt, OrderRejected]]) For every order, its receipt or
+                 the error that rejected it.
+        """
+        store = self._store
+        results: List[Union[Receipt, OrderRejected, None]] = [None] * len(shopping_lists)
+        orders = []
+        for index, shopping_list in enumerate(shopping_lists):
+            try:
+                orders.append((index, store.validate_order(shopping_list, check_stock=False),
+                               getattr(shopping_list, "cart_id", None)))
+            except OrderRejected as error:
+                results[index] = error
+
+        products: Dict[int, Product] = {}
+        for _, lines, _ in orders:
+            for product, _ in lines:
+                products[id(product)] = product
+        reservations = store.reservations
+
+        purchases = []
+        with store.locked_products(products.values()):
+            # the stock left for the batch, the stock held by carts is not part of it
+            left = {key: product.quantity if reservations is None
+                    else reservations.available(product)
+                    for key, product in products.items()
+                    if not isinstance(product, NonStockedProduct) and product.is_active()}
+            for index, lines, cart_id in orders:
+                held = reservations.held_by(cart_id) \
+                    if reservations is not None and cart_id is not None else {}
+                filled, error = self._allocate(lines, left, held)
+                if error is not None:
+                    results[index] = error
+                else:
+                    purchases.append((index, filled, cart_id))
+
+            taken: Dict[int, int] = {}
+            for _, filled, _ in purchases:
+                for product, quantity in filled:
+                    if id(product) in left:
+                        taken[id(product)] = taken.get(id(product), 0) + quantity
+            for key, quantity in taken.items():
+                products[key].deduct_stock(quantity)
+            if reservations is not None:
+                for _, _, cart_id in purchases:
+                    if cart_id is not None:
+                        reservations.release(cart_id)
+
+        for index, filled, _ in purchases:
+            results[index] = store.make_receipt(filled)
+        return results
+
+    def _allocate(self, lines: List[Tuple[Product, int]], left: Dict[int, int],
+                  held: Dict[str, int]) \
+            -> Tuple[Optional[List[Tuple[Product, int]]], Optional[OrderRejected]]:
+        """
+        Allocates the lines of an order from the stock left, and from the stock held by
+        the cart of the order, which is taken first.
+
+        :return: The lines filled and None, or None and the error rejecting the order.
+        """
+        filled = []
+        # (key, quantity taken from the stock left) of the stocked lines
+        takes = []
+        for product, quantity in lines:
+            key = id(product)
+            available = left.get(key)
+            if available is None:
+                # a non stocked product, or a product inactive when the batch started
+                if not product.is_active():
+                    return None, OrderRejected(f"The {product.name} is currently out of stock.")
+                filled.append((product, quantity))
+                continue
+            own = held.get(product.name, 0) if held else 0
+            if own >= quantity:
+                served, take = quantity, 0
+            else:
+                take = min(quantity - own, available)
+                served = own + take
+                if served < quantity and not self.partial:
+                    return None, OrderRejected(f"The {product.name} has insufficient quantity "
+                                               "available.")
+            if served:
+                filled.append((product, served))
+                takes.append((key, take))
+        if not filled:
+            return None, OrderRejected("The order can't be filled, the stock ran out.")
+        for key, take in takes:
+            left[key] -= take
+        return filled, None
@@ -0,0 +1,237 @@
+"""
+importer.py - Module file containing the streaming catalog importer
+
+This module imports product catalogs from CSV or JSON Lines files into a store. The
+files are read row by row and the products are inserted in chunks, so catalogs of
+millions of rows are imported in constant memory.
+
+Every row describes one product with the fields name, price, quantity, kind
+("product", "non_stocked" or "limited"), limit and promotion. The kind may be left out,
+a row with a limit is then a LimitedProduct. The promotion is referenced by name among
+the promotions given to the importer. The rows that can't be imported (an invalid
+product, an unknown promotion, a malformed line) are reported through a side channel
+and the import goes on.
+
+Classes:
+    RejectedRow: A row that could not be imported.
+    ImportReport: The outcome of an import.
+
+Functions:
+    import_catalog: Imports a CSV or JSON Lines catalog file into a store.
+    import_rows: Imports catalog rows into a store.
+"""
+
+import csv
+import json
+import math
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from products import Product
+from store import Store
+from persistence import product_from_record
+
+# The spellings accepted for the kind of a product
+KINDS = {
+    "product": "product",
+    "non_stocked": "non_stocked",
+    "nonstockedproduct": "non_stocked",
+    "limited": "limited",
+    "limitedproduct": "limited",
+}
+
+
+class RejectedRow:
+    """
+    A row that could not be imported.
+
+    Attributes:
+        line_number (int): The line of the row in the file.
+        row (dict): The row, None if the line could not be parsed.
+        message (str): Why the row was rejected.
+    """
+    def __init__(self, line_number: int, row: Optional[dict], message: str):
+        self.line_number = line_number
+        self.row = row
+        self.message = message
+
+    def __repr__(self):
+        return f"RejectedRow({self.line_number}, {self.message!r})"
+
+
+class ImportReport:
+    """
+    The outcome of an import.
+
+    Attributes:
+        imported (int): The number of products imported.
+        rejected (int): The number of rows rejected.
+        errors (List[RejectedRow]): The first rejected rows, up to the max_errors of the import.
+    """
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[RejectedRow] = []
+
+
+def iter_csv_rows(path: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Reads the rows of a CSV catalog, the first line holds the field names.
+
+    :param path: (str) The path of the file.
+    :return: An iterator over the (line number, row) pairs.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def iter_jsonl_rows(path: str) -> Iterator[Tuple[int, Optional[dict]]]:
+    """
+    Reads the rows of a JSON Lines catalog, one JSON object per line.
+
+    :param path: (str) The path of the file.
+    :return: An iterator over the (line number, row) pairs, the row is None for
+             a line that is not a JSON object.
+    """
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def _to_price(value) -> float:
+    """
+    :param value: The price of a row.
+    :return: (float) The price.
+
+    Raises:
+        ValueError: If the price is not a number, not finite, or too large to count
+                    in cents.
+    """
+    try:
+        price = float(value)
+    except OverflowError as error:
+        raise ValueError(f"Invalid price {value!r}") from error
+    if not math.isfinite(price) or not math.isfinite(price * 100):
+        raise ValueError(f"Invalid price {value!r}")
+    return price
+
+
+def _to_count(value, field: str) -> int:
+    """
+    :param value: The quantity or limit of a row.
+    :param field: (str) The name of the field, for the error message.
+    :return: (int) The value as an integer.
+
+    Raises:
+        ValueError: If the value is not a whole number.
+    """
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"Invalid {field} {value!r}, a whole number is expected")
+    return int(value)
+
+
+def row_to_product(row: dict, promotions: Dict[str, object]) -> Product:
+    """
+    Creates the product described by a catalog row.
+
+    :param row: (dict) The row.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    :return: (Product) The product.
+
+    Raises:
+        ValueError: If the row describes an invalid product or an unknown promotion.
+    """
+    kind = str(row.get("kind") or "").strip().lower()
+    limit = row.get("limit")
+    has_limit = limit not in (None, "")
+    if not kind:
+        kind = "limited" if has_limit else "product"
+    if kind not in KINDS:
+        raise ValueError(f"Unknown product kind {kind!r}")
+    kind = KINDS[kind]
+    if kind == "limited" and not has_limit:
+        raise ValueError("A limited product needs a limit")
+
+    promotion = row.get("promotion") or None
+    if promotion is not None and not isinstance(promotion, str):
+        raise ValueError(f"Invalid promotion {promotion!r}")
+    if promotion is not None and promotion not in promotions:
+        raise ValueError(f"Unknown promotion {promotion!r}")
+
+    try:
+        record = {"kind": kind, "name": str(row.get("name") or "").strip(),
+                  "price": _to_price(row["price"]),
+                  "quantity": _to_count(row.get("quantity") or 0, "quantity"),
+                  "limit": _to_count(limit, "limit") if kind == "limited" else None,
+                  "promotion": promotion}
+    except KeyError as error:
+        raise ValueError(f"Missing field {error}") from error
+    except TypeError as error:
+        raise ValueError(str(error)) from error
+    return product_from_record(record, promotions)
+
+
+def import_rows(store: Store, rows: Iterable[Tuple[int, Optional[dict]]],
+                promotions: Dict[str, object], chunk_size: int = 10000,
+                on_error: Optional[Callable[[RejectedRow], None]] = None,
+                max_errors: int = 100) -> ImportReport:
+    """
+    Imports catalog rows into a store.
+
+    The rows are consumed lazily and the products are added with Store.add_products,
+    one chunk at a time.
+
+    :param store: (Store) The store to import into.
+    :param rows: The (line number, row) pairs, as made by iter_csv_rows or iter_jsonl_rows.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    :param chunk_size: (int) The number of rows read before the products are inserted.
+    :param on_error: Called with every rejected row.
+    :param max_errors: (int) The number of rejected rows kept in the report.
+    :return: (ImportReport) The outcome of the import.
+    """
+    report = ImportReport()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return report
+        products = []
+        for line_number, row in chunk:
+            try:
+                if row is None:
+                    raise ValueError("Invalid JSON line")
+                products.append(row_to_product(row, promotions))
+            except ValueError as error:
+                rejected = RejectedRow(line_number, row, str(error))
+                report.rejected += 1
+                if len(report.errors) < max_errors:
+                    report.errors.append(rejected)
+                if on_error is not None:
+                    on_error(rejected)
+        store.add_products(products)
+        report.imported += len(products)
+
+
+def import_catalog(store: Store, path: str, promotions: Dict[str, object],
+                   file_format: Optional[str] = None, **options) -> ImportReport:
+    """
+    Imports a CSV or JSON Lines catalog file into a store.
+
+    :param store: (Store) The store to import into.
+    :param path: (str) The path of the file.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    :param file_format: (str) "csv" or "jsonl", guessed from the file extension if not given.
+    :param options: The chunk_size, on_error and max_errors of import_rows.
+    :return: (ImportReport) The outcome of the import.
+    """
+    if file_format is None:
+        file_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+    rows = iter_csv_rows(path) if file_format == "csv" else iter_jsonl_rows(path)
+    return import_rows(store, rows, promotions, **options)
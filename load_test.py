@@ -0,0 +1,146 @@
+"""
+load_test.py
+This module provides a load-test client for the store server.
+
+It opens many concurrent connections to a server started with server.py, every client
+sends a mix of list, total and order requests one after the other, and the run reports
+the throughput in requests per second and the p50 and p99 latencies.
+
+Usage:
+    python3 load_test.py --clients 50 --requests 200
+    python3 load_test.py --local          # runs its own server in the same process
+
+Functions:
+    run_load: Runs the load test against a server and returns its statistics.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List
+from server import StoreServer
+from main import create_store
+
+# The default share of every operation in the request mix
+DEFAULT_MIX = {"list": 0.2, "total": 0.3, "order": 0.5}
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Returns a percentile of already sorted values, using the nearest rank.
+
+    :param sorted_values: (List[float]) The sorted values.
+    :param percent: (float) The percentile, between 0 and 100.
+    :return: (float) The value at the percentile, 0.0 if there are no values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(percent / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def _client(host: str, port: int, requests: int, mix: Dict[str, float],
+                  product_names: List[str], latencies: List[float], errors: List[str],
+                  seed: int):
+    """
+    Sends the requests of one client and records their latencies.
+    """
+    rand = random.Random(seed)
+    operations = list(mix)
+    weights = [mix[operation] for operation in operations]
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            operation = rand.choices(operations, weights)[0]
+            request = {"op": operation}
+            if operation == "order":
+                request["lines"] = [[rand.choice(product_names), 1]]
+            started = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            if not response["ok"]:
+                errors.append(response["error"])
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, clients: int = 50, requests: int = 200,
+                   mix: Dict[str, float] = None) -> dict:
+    """
+    Runs the load test against a server.
+
+    :param host: (str) The address of the server.
+    :param port: (int) The port of the server.
+    :param clients: (int) The number of concurrent clients.
+    :param requests: (int) The number of requests sent by every client.
+    :param mix: (Dict[str, float]) The share of every operation, defaults to DEFAULT_MIX.
+    :return: (dict) The statistics of the run: requests, rejected, seconds,
+             requests_per_second, p50_ms and p99_ms.
+    """
+    mix = mix or DEFAULT_MIX
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"op": "list"}\n')
+    await writer.drain()
+    product_names = [product["name"] for product in json.loads(await reader.readline())["products"]]
+    writer.close()
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, requests, mix, product_names, latencies, errors,
+                                   seed) for seed in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rejected": len(errors),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def _run_local(clients: int, requests: int) -> dict:
+    """
+    Runs the load test against a server started in this process.
+    """
+    server = StoreServer(create_store(), port=0)
+    await server.start()
+    try:
+        return await run_load(server.host, server.port, clients, requests)
+    finally:
+        await server.close()
+
+
+def main():
+    """
+    Runs the load test and prints its statistics.
+    """
+    parser = argparse.ArgumentParser(description="Load test the store server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--local", action="store_true",
+                        help="start a server in this process instead of connecting to one")
+    args = parser.parse_args()
+
+    if args.local:
+        stats = asyncio.run(_run_local(args.clients, args.requests))
+    else:
+        stats = asyncio.run(run_load(args.host, args.port, args.clients, args.requests))
+
+    print(f"{stats['requests']} requests ({stats['rejected']} rejected) "
+          f"in {stats['seconds']:.2f}s")
+    print(f"  {stats['requests_per_second']:.0f} requests/sec")
+    print(f"  p50 latency: {stats['p50_ms']:.2f} ms")
+    print(f"  p99 latency: {stats['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
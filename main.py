@@ -71,9 +71,14 @@ Author:
 Date:
     [2023-06-01]
 """
+import argparse
+from typing import Dict
 from products import Product, NonStockedProduct, LimitedProduct
 from store import Store
 import promotions
+import persistence
+import order_journal
+import store_io
 
 
 def start(store: Store):
@@ -91,12 +96,13 @@ def start(store: Store):
     # assuming we are not done.
     # exit will be from within the loop
     done: bool = False
-    print("Welcome to our store! We are delighted to have you here.\n"
-          "Start exploring our wide range of products and enjoy your shopping experience.")
+    store.io.print("Welcome to our store! We are delighted to have you here.\n"
+                   "Start exploring our wide range of products and enjoy your shopping"
+                   " experience.")
     while not done:
         store.display_store_menu()
 
-        choice = input("\nPlease choose a number (1, 2, 3 or 4):>")
+        choice = store.io.input("\nPlease choose a number (1, 2, 3 or 4):>")
 
         if choice == "4":
             done = True
@@ -105,16 +111,37 @@ def start(store: Store):
         if choice in commands:
             commands[choice]()
         else:
-            print("\n  Please provide a valid input. Only values of 1, 2, 3, or 4 are allowed.")
+            store.io.print("\n  Please provide a valid input. Only values of 1, 2, 3, or 4"
+                           " are allowed.")
 
-    print("Thank you for shopping with us, Wish you a fantastic day!"
-          " We look forward to serving you again in the future.\n")
+    store.io.print("Thank you for shopping with us, Wish you a fantastic day!"
+                   " We look forward to serving you again in the future.\n")
+    store.io.flush()
 
 
-def main():
+def create_promotions() -> Dict[str, promotions.Promotion]:
     """
-    Main function to start the store application.
+    Creates the promotion catalog.
+
+    :return: (Dict[str, Promotion]) The promotions by name.
+    """
+    catalog = [promotions.SecondHalfPrice("Second Half price!"),
+               promotions.ThirdOneFree("Third One Free!"),
+               promotions.PercentDiscount("30% off!", percent=30)]
+    return {promotion.name: promotion for promotion in catalog}
+
+
+def create_store(promotion_catalog: Dict[str, promotions.Promotion] = None) -> Store:
+    """
+    Creates the store with the catalog of available products and promotions.
+
+    :param promotion_catalog: (Dict[str, Promotion]) The promotions by name, a new
+                              promotion catalog is created if not given.
+    :return: (Store) The store.
     """
+    if promotion_catalog is None:
+        promotion_catalog = create_promotions()
+
     # Create a list of Product instances representing available products in the store
     product_list = [
         Product("MacBook Air M2", price=1450, quantity=100),
@@ -124,19 +151,49 @@ def main():
         LimitedProduct("Shipping", price=10, quantity=250, limit=1)
     ]
 
-    # Create promotion catalog
-    second_half_price = promotions.SecondHalfPrice("Second Half price!")
-    third_one_free = promotions.ThirdOneFree("Third One Free!")
-    thirty_percent = promotions.PercentDiscount("30% off!", percent=30)
+    product_list[0].set_promotion(promotion_catalog["Second Half price!"])
+    product_list[1].set_promotion(promotion_catalog["Third One Free!"])
+    product_list[3].set_promotion(promotion_catalog["30% off!"])
+
+    # Create a Store instance using the 'product_list'
+    return Store(product_list)
 
-    product_list[0].set_promotion(second_half_price)
-    product_list[1].set_promotion(third_one_free)
-    product_list[3].set_promotion(thirty_percent)
 
-    # Create a Store instance named 'best_buy' using the 'product_list'
-    best_buy = Store(product_list)
-    # Start the store application by calling the 'start' function with the 'best_buy' store instance
-    start(best_buy)
+def main():
+    """
+    Main function to start the store application.
+
+    With --data-dir, the inventory is recovered from and persisted to that directory.
+    With --journal, the orders and inventory changes are appended to that order journal.
+    With --buffered, the output is written out in one piece before every prompt.
+    """
+    parser = argparse.ArgumentParser(description="Best Buy store application.")
+    parser.add_argument("--data-dir", help="directory of the persisted inventory")
+    parser.add_argument("--journal", help="path of the order journal")
+    parser.add_argument("--buffered", action="store_true",
+                        help="buffer the output until the next prompt")
+    args = parser.parse_args()
+
+    promotion_catalog = create_promotions()
+    inventory = journal = None
+    if args.data_dir:
+        best_buy, inventory = persistence.open_store(args.data_dir, promotion_catalog,
+                                                     lambda: create_store(promotion_catalog))
+    else:
+        # Create a Store instance named 'best_buy' with the available products
+        best_buy = create_store(promotion_catalog)
+    if args.buffered:
+        best_buy.io = store_io.BufferedIO()
+    if args.journal:
+        journal = order_journal.OrderJournal(best_buy, args.journal)
+    try:
+        # Start the store application by calling the 'start' function with the 'best_buy' store
+        start(best_buy)
+    finally:
+        if journal is not None:
+            journal.close()
+        if inventory is not None:
+            inventory.close()
 
 
 if __name__ == "__main__":
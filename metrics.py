@@ -0,0 +1,453 @@
+"""
+metrics.py - Module file containing the instrumentation of the store
+
+This module defines counters, gauges and latency histograms, a registry exporting them
+in the Prometheus text format, and the instrumentation of the hot paths of the store:
+Store.order, Store.checkout, Store.add_product_to_order, Product.buy,
+Product.deduct_stock, Promotion.apply_promotion, and the batched pricing of the orders,
+promotions.price_lines_cents and Promotion.apply_promotion_batch_cents. Every order
+placed (order, submit_order, place_order, the batches of flash_sale) goes through
+deduct_stock and the batched pricing.
+
+The instrumentation replaces the hot path methods by timed wrappers when it is enabled
+and puts the original methods back when it is disabled, so a disabled instrumentation
+costs nothing at all, not even a flag check.
+
+The histograms use log-linear buckets in the manner of HDR histograms: every power of
+two from 1 microsecond up is split into SUB_BUCKETS buckets, so the relative error of a
+bucket is at most 1 / SUB_BUCKETS whatever the latency, and finding the bucket of a
+value is one frexp. An observation is only appended to a deque, whose append is atomic,
+the values are sorted into the buckets by batches, so the hot paths never take a lock.
+
+Usage:
+    registry = metrics.enable()
+    registry.track_store(store)
+    registry.serve(9100)                # or registry.write("store.prom")
+    ...
+    metrics.disable()
+
+Classes:
+    Counter: A value that only goes up.
+    Gauge: A value that goes up and down, or is read from a function.
+    Histogram: The distribution of latencies.
+    Registry: The metrics exported together.
+
+Functions:
+    enable: Instruments the hot paths of the store.
+    disable: Removes the instrumentation.
+    is_enabled: Whether the hot paths are instrumented.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+import store as store_module
+from products import Product, NonStockedProduct
+from promotions import Promotion, SecondHalfPrice, ThirdOneFree, PercentDiscount
+from store import Store
+
+# The upper bound of the first bucket of the histograms, in seconds
+MIN_LATENCY = 1e-6
+# The buckets per power of two
+SUB_BUCKETS = 4
+# The powers of two covered, from 1 us to about 67 s, slower values land in the last bucket
+OCTAVES = 26
+# The observations a histogram keeps before sorting them into its buckets
+PENDING_OBSERVATIONS = 1024
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """
+    A value that only goes up, such as a number of errors.
+
+    Attributes:
+        name (str): The name of the metric.
+        help (str): The description of the metric.
+    """
+    def __init__(self, name: str, help_text: str):
+        """
+        :param name: (str) The name of the metric.
+        :param help_text: (str) The description of the metric.
+        """
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """
+        :param amount: (float) The increase, not negative.
+
+        Raises:
+            ValueError: If the amount is negative.
+        """
+        if amount < 0:
+            raise ValueError("A counter can't go down.")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def render(self) -> List[str]:
+        """
+        :return: (List[str]) The lines of the metric in the Prometheus text format.
+        """
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {self._value}"]
+
+
+class Gauge:
+    """
+    A value that goes up and down, set by the application or read from a function
+    when the metrics are exported.
+
+    Attributes:
+        name (str): The name of the metric.
+        help (str): The description of the metric.
+    """
+    def __init__(self, name: str, help_text: str,
+                 function: Optional[Callable[[], float]] = None):
+        """
+        :param name: (str) The name of the metric.
+        :param help_text: (str) The description of the metric.
+        :param function: Returns the value, if given the gauge is read from it.
+        """
+        self.name = name
+        self.help = help_text
+        self._function = function
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        """
+        :param value: (float) The new value.
+        """
+        self._value = value
+
+    def inc(self, amount: float = 1):
+        """
+        :param amount: (float) The change of the value, negative to decrease it.
+        """
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def render(self) -> List[str]:
+        """
+        :return: (List[str]) The lines of the metric in the Prometheus text format.
+        """
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {self.value}"]
+
+
+def bucket_bounds() -> List[float]:
+    """
+    :return: (List[float]) The upper bounds of the buckets of the histograms, in seconds.
+    """
+    bounds = [MIN_LATENCY]
+    for octave in range(OCTAVES):
+        for sub in range(1, SUB_BUCKETS + 1):
+            bounds.append(MIN_LATENCY * 2 ** octave * (1 + sub / SUB_BUCKETS))
+    return bounds
+
+
+_BOUNDS = bucket_bounds()
+
+
+class Histogram:
+    """
+    The distribution of latencies, in log-linear buckets.
+
+    Attributes:
+        name (str): The name of the metric.
+        help (str): The description of the metric.
+    """
+    def __init__(self, name: str, help_text: str):
+        """
+        :param name: (str) The name of the metric.
+        :param help_text: (str) The description of the metric.
+        """
+        self.name = name
+        self.help = help_text
+        self._counts = [0] * len(_BOUNDS)
+        self._sum = 0.0
+        self._count = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        :param value: (float) The latency, in seconds.
+        """
+        self._pending.append(value)
+        if len(self._pending) > PENDING_OBSERVATIONS:
+            self._drain()
+
+    def _drain(self):
+        """
+        Sorts the pending observations into the buckets.
+        """
+        last = len(_BOUNDS) - 1
+        frexp = math.frexp
+        with self._lock:
+            counts = self._counts
+            pending = self._pending
+            while True:
+                try:
+                    value = pending.popleft()
+                except IndexError:
+                    break
+                if value <= MIN_LATENCY:
+                    index = 0
+                else:
+                    mantissa, exponent = frexp(value / MIN_LATENCY)
+                    index = min((exponent - 1) * SUB_BUCKETS +
+                                int((mantissa * 2 - 1) * SUB_BUCKETS) + 1, last)
+                counts[index] += 1
+                self._sum += value
+                self._count += 1
+
+    @property
+    def count(self) -> int:
+        self._drain()
+        return self._count
+
+    def quantile(self, fraction: float) -> float:
+        """
+        :param fraction: (float) The fraction of the observations, 0.99 for the 99th
+                         percentile.
+        :return: (float) The upper bound of the bucket of the quantile, 0 without
+                 observations.
+        """
+        self._drain()
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        rank = math.ceil(fraction * total)
+        seen = 0
+        for bound, count in zip(_BOUNDS, counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0.0
+
+    def render(self) -> List[str]:
+        """
+        :return: (List[str]) The lines of the metric in the Prometheus text format.
+        """
+        self._drain()
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, bucket in zip(_BOUNDS, counts):
+            cumulative += bucket
+            lines.append(f'{self.name}_bucket{{le="{bound:.9g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics exported together.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        """
+        Registers a metric, or returns the metric already registered under its name.
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        """
+        :return: (Counter) The counter of the given name, created on first use.
+        """
+        return self._add(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str,
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        """
+        :return: (Gauge) The gauge of the given name, created on first use.
+        """
+        return self._add(Gauge(name, help_text, function))
+
+    def histogram(self, name: str, help_text: str) -> Histogram:
+        """
+        :return: (Histogram) The histogram of the given name, created on first use.
+        """
+        return self._add(Histogram(name, help_text))
+
+    def get(self, name: str):
+        """
+        :param name: (str) The name of a metric.
+        :return: The metric, None if there is none of that name.
+        """
+        return self._metrics.get(name)
+
+    def track_store(self, store: Store):
+        """
+        Exports the totals of a store as gauges, read when the metrics are exported.
+
+        :param store: (Store) The store.
+        """
+        self.gauge("store_total_quantity", "Units in stock.", store.get_total_quantity)
+        self.gauge("store_active_products", "Products available for sale.",
+                   store.get_active_count)
+
+    def render(self) -> str:
+        """
+        :return: (str) All the metrics in the Prometheus text format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Writes the metrics to a file, for the textfile collector of the node exporter.
+        The file is replaced atomically so a reader never sees it half written.
+
+        :param path: (str) The path of the file.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(self.render())
+        os.replace(temporary, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serves the metrics over HTTP from a daemon thread.
+
+        :param port: (int) The port, 0 for any free port.
+        :param host: (str) The address to listen on.
+        :return: (ThreadingHTTPServer) The server, shut it down to stop serving.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# The registry of the instrumentation
+REGISTRY = Registry()
+
+# The instrumented methods: (class, method name, metric name, description), the
+# overrides of a method are listed with it. The store module stands for its functions,
+# checkout calls the price_lines_cents imported there.
+_HOT_PATHS = [
+    (Store, "order", "store_order", "Store.order"),
+    (Store, "checkout", "store_checkout", "Store.checkout"),
+    (Store, "add_product_to_order", "store_add_product_to_order", "Store.add_product_to_order"),
+    (Product, "buy", "product_buy", "Product.buy"),
+    (NonStockedProduct, "buy", "product_buy", "Product.buy"),
+    (Product, "deduct_stock", "product_deduct_stock", "Product.deduct_stock"),
+    (NonStockedProduct, "deduct_stock", "product_deduct_stock", "Product.deduct_stock"),
+    (Promotion, "apply_promotion", "promotion_apply", "Promotion.apply_promotion"),
+    (store_module, "price_lines_cents", "promotion_price_lines", "promotions.price_lines_cents"),
+]
+_HOT_PATHS.extend((cls, "apply_promotion_batch_cents", "promotion_apply_batch",
+                   "Promotion.apply_promotion_batch_cents")
+                  for cls in (Promotion, SecondHalfPrice, ThirdOneFree, PercentDiscount))
+
+# (class, method name, original method) of the instrumented methods
+_originals: List[Tuple[type, str, Callable]] = []
+_state_lock = threading.Lock()
+
+
+def _timed(function: Callable, latency: Histogram, errors: Counter) -> Callable:
+    """
+    Wraps a method to time its calls and count its errors.
+    """
+    clock = time.perf_counter
+    observe = latency.observe
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        started = clock()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            observe(clock() - started)
+    return timed
+
+
+def enable(registry: Optional[Registry] = None) -> Registry:
+    """
+    Instruments the hot paths of the store, the calls are timed into the histograms
+    <path>_seconds and their errors counted by <path>_errors_total.
+
+    :param registry: (Registry) The registry of the metrics, REGISTRY if not given.
+    :return: (Registry) The registry.
+    """
+    registry = registry or REGISTRY
+    with _state_lock:
+        _disable()
+        for cls, method, metric, description in _HOT_PATHS:
+            original = cls.__dict__[method]
+            latency = registry.histogram(f"{metric}_seconds", f"Latency of {description}.")
+            errors = registry.counter(f"{metric}_errors_total", f"Errors of {description}.")
+            setattr(cls, method, _timed(original, latency, errors))
+            _originals.append((cls, method, original))
+    return registry
+
+
+def disable():
+    """
+    Removes the instrumentation, the hot paths are the original methods again.
+    """
+    with _state_lock:
+        _disable()
+
+
+def _disable():
+    """
+    Puts the original methods back, the state lock must be held.
+    """
+    while _originals:
+        cls, method, original = _originals.pop()
+        setattr(cls, method, original)
+
+
+def is_enabled() -> bool:
+    """
+    :return: (bool) Whether the hot paths are instrumented.
+    """
+    return bool(_originals)
@@ -0,0 +1,147 @@
+"""
+money.py - Module file containing the money helpers
+
+The store prices in integer cents: the prices of the products are kept in cents next to
+their float prices, the promotions work out their discounts as exact fractions and round
+every line once, to a cent, with the rounding rule of the promotion, and the lines and
+the totals are added as integers. Integer sums never drift, so a total is always the sum
+of its lines to the cent, and integer arithmetic is as cheap as float arithmetic.
+
+The float amounts of the API (Product.price, the cart and receipt totals) are the cent
+amounts divided by 100, the closest float to the amount in cents.
+
+Rounding rules:
+    ROUND_HALF_UP: half a cent or more rounds up, the usual rule for bills.
+    ROUND_HALF_EVEN: half a cent rounds to the even cent, the banker's rule.
+    ROUND_DOWN: the fraction of a cent is dropped, in favor of the customer.
+    ROUND_UP: any fraction of a cent is charged.
+
+Functions:
+    to_cents: Converts an amount to cents.
+    to_amount: Converts cents to an amount.
+    format_cents: Formats cents as an amount with two decimals.
+    divide: Divides integers to a whole number of cents with a rounding rule.
+    divide_all: Divides many integers by the same denominator with a rounding rule.
+    as_fraction: Converts a number to an exact fraction of integers.
+"""
+
+import math
+from fractions import Fraction
+from typing import List, Sequence, Tuple
+
+ROUND_HALF_UP = "half_up"
+ROUND_HALF_EVEN = "half_even"
+ROUND_DOWN = "down"
+ROUND_UP = "up"
+ROUNDING_RULES = (ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN, ROUND_UP)
+
+# The largest denominator kept when a float is turned into a fraction, the floats of
+# the prices and discounts have a short decimal expansion
+MAX_DENOMINATOR = 10 ** 6
+
+
+def to_cents(amount) -> int:
+    """
+    Converts an amount to cents, rounded to the nearest cent.
+
+    :param amount: (int or float) The amount.
+    :return: (int) The amount in cents.
+
+    Raises:
+        ValueError: If the amount is not finite, or too large to count in cents.
+    """
+    if isinstance(amount, int):
+        return amount * 100
+    # the product of a price with at most two decimals is within a rounding error of
+    # the right number of cents
+    cents = amount * 100
+    if not math.isfinite(cents):
+        raise ValueError(f"The amount {amount!r} can't be counted in cents.")
+    return round(cents)
+
+
+def to_amount(cents: int) -> float:
+    """
+    :param cents: (int) An amount in cents.
+    :return: (float) The amount.
+    """
+    return cents / 100
+
+
+def format_cents(cents: int) -> str:
+    """
+    :param cents: (int) An amount in cents.
+    :return: (str) The amount with two decimals, such as "1812.50".
+    """
+    sign = "-" if cents < 0 else ""
+    whole, fraction = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{fraction:02d}"
+
+
+def divide(numerator: int, denominator: int, rounding: str = ROUND_HALF_UP) -> int:
+    """
+    Divides two integers to a whole number, with a rounding rule.
+
+    :param numerator: (int) The numerator.
+    :param denominator: (int) The denominator, positive.
+    :param rounding: (str) The rounding rule, one of ROUNDING_RULES.
+    :return: (int) The rounded quotient.
+
+    Raises:
+        ValueError: If the rounding rule is unknown.
+    """
+    quotient, remainder = divmod(numerator, denominator)
+    if not remainder:
+        return quotient
+    if rounding == ROUND_HALF_UP:
+        return quotient + 1 if 2 * remainder >= denominator else quotient
+    if rounding == ROUND_HALF_EVEN:
+        twice = 2 * remainder
+        if twice > denominator or (twice == denominator and quotient % 2):
+            return quotient + 1
+        return quotient
+    if rounding == ROUND_DOWN:
+        return quotient
+    if rounding == ROUND_UP:
+        return quotient + 1
+    raise ValueError(f"Unknown rounding rule {rounding!r}")
+
+
+def divide_all(numerators: Sequence[int], denominator: int,
+               rounding: str = ROUND_HALF_UP) -> List[int]:
+    """
+    Divides many integers by the same denominator, with a rounding rule. The rules
+    are written as floor divisions so a batch is a single comprehension.
+
+    :param numerators: (Sequence[int]) The numerators.
+    :param denominator: (int) The denominator, positive.
+    :param rounding: (str) The rounding rule, one of ROUNDING_RULES.
+    :return: (List[int]) The rounded quotients.
+
+    Raises:
+        ValueError: If the rounding rule is unknown.
+    """
+    if denominator == 1:
+        return list(numerators)
+    if rounding == ROUND_HALF_UP:
+        twice = 2 * denominator
+        return [(2 * numerator + denominator) // twice for numerator in numerators]
+    if rounding == ROUND_DOWN:
+        return [numerator // denominator for numerator in numerators]
+    if rounding == ROUND_UP:
+        return [-(-numerator // denominator) for numerator in numerators]
+    return [divide(numerator, denominator, rounding) for numerator in numerators]
+
+
+def as_fraction(number) -> Tuple[int, int]:
+    """
+    Converts a number to an exact fraction, the floats are taken at their shortest
+    decimal value, 0.7 is 7/10 rather than the binary value of the float.
+
+    :param number: (int, float or Fraction) The number.
+    :return: (Tuple[int, int]) The numerator and the positive denominator.
+    """
+    if isinstance(number, int):
+        return number, 1
+    fraction = Fraction(number).limit_denominator(MAX_DENOMINATOR)
+    return fraction.numerator, fraction.denominator
@@ -0,0 +1,110 @@
+"""
+order_ids.py - Module file containing the order ID allocator
+
+This module defines the OrderIdAllocator class, which hands out collision-free order IDs
+made of three fixed-width hexadecimal fields:
+
+    time        11 digits, the milliseconds since the epoch when the ID was allocated
+    shard       8 digits, the allocator's shard, the process ID by default
+    sequence    10 digits, the allocator's counter
+
+Two allocators with different shards never produce the same ID, and an allocator never
+produces the same sequence twice, so the IDs are unique without any coordination.
+
+The shard field holds any 32-bit process ID, the whole pid is used rather than a hash of
+it, so the processes running on a host at the same time always have different shards.
+That is the limit of the default: processes of different hosts allocating IDs for the
+same store must be given distinct shards explicitly, by the deployment or by whatever
+coordinates them. The sequence comes from itertools.count, whose increment is atomic, so
+the threads of a process share an allocator without a lock. The time comes first, so the
+IDs sort by allocation time, and the IDs allocated by one thread always increase.
+
+Classes:
+    OrderIdAllocator: Allocates collision-free, time ordered order IDs.
+
+Functions:
+    parse_order_id: Splits an order ID into its time, shard and sequence.
+"""
+
+import itertools
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Optional, Tuple
+
+SHARD_COUNT = 16 ** 8
+SEQUENCE_COUNT = 16 ** 10
+ORDER_ID_LENGTH = 29
+# the IDs made before the shard field held the whole process ID, with a 4 digit shard
+LEGACY_ORDER_ID_LENGTH = 25
+
+
+def parse_order_id(order_id: str) -> Tuple[int, int, int]:
+    """
+    Splits an order ID into its fields.
+
+    :param order_id: (str) An order ID made by an OrderIdAllocator.
+    :return: (Tuple[int, int, int]) The milliseconds since the epoch, the shard and the
+             sequence of the ID.
+
+    Raises:
+        ValueError: If the string is not such an order ID.
+    """
+    if len(order_id) == ORDER_ID_LENGTH:
+        return int(order_id[:11], 16), int(order_id[11:19], 16), int(order_id[19:], 16)
+    if len(order_id) == LEGACY_ORDER_ID_LENGTH:
+        return int(order_id[:11], 16), int(order_id[11:15], 16), int(order_id[15:], 16)
+    raise ValueError(f"Invalid order ID {order_id!r}")
+
+
+class OrderIdAllocator:
+    """
+    Allocates collision-free, time ordered order IDs.
+
+    Attributes:
+        shard (int): The shard of the allocator, between 0 and SHARD_COUNT - 1.
+    """
+    def __init__(self, shard: Optional[int] = None, clock: Callable[[], float] = time.time):
+        """
+        Initializes an allocator.
+
+        :param shard: (int) The shard of the allocator. Every process or host allocating
+                      IDs at the same time needs its own shard. If not given, the shard is
+                      the process ID, taken again in a forked child, which is only unique
+                      among the processes of one host.
+        :param clock: Returns the current time in seconds since the epoch.
+
+        Raises:
+            ValueError: If the shard is out of range.
+        """
+        if shard is not None and not 0 <= shard < SHARD_COUNT:
+            raise ValueError(f"The shard must be between 0 and {SHARD_COUNT - 1}")
+        self._clock = clock
+        self._local = threading.local()
+        self._reset(shard)
+        if shard is None and hasattr(os, "register_at_fork"):
+            reference = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: reference() and reference()._reset())
+
+    def _reset(self, shard: Optional[int] = None):
+        """
+        Takes a shard and restarts the sequence.
+        """
+        self.shard = os.getpid() if shard is None else shard
+        if not 0 <= self.shard < SHARD_COUNT:
+            raise ValueError(f"The shard must be between 0 and {SHARD_COUNT - 1}")
+        self._prefix = f"{self.shard:08X}"
+        self._sequence = itertools.count()
+
+    def next_id(self) -> str:
+        """
+        Allocates an order ID.
+
+        :return: (str) The new order ID.
+        """
+        sequence = next(self._sequence) % SEQUENCE_COUNT
+        # the clock may step back, the IDs of a thread still increase
+        millis = max(int(self._clock() * 1000), getattr(self._local, "millis", 0))
+        self._local.millis = millis
+        return f"{millis:011X}{self._prefix}{sequence:010X}"
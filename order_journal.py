@@ -0,0 +1,322 @@
+"""
+order_journal.py - Module file containing the order journal
+
+This module keeps an append-only journal of a store: every confirmed order with its
+order ID, timestamp, lines, unit prices, promotions and line totals, and every inventory
+change (stock, price and promotion changes, added and removed products). Every
+checkpoint_every records the journal also writes a checkpoint, the whole inventory at
+that time, and notes its timestamp and file offset in a small index file next to the
+journal.
+
+The checkpoints are written by a background thread, so the order that makes one due
+does not wait for the whole inventory to be copied while its products are locked. The
+records written while the inventory is copied come before the checkpoint in the
+journal, the checkpoint notes the offset of the first of them in "from" and the index
+points at that offset. At every checkpoint the journal and the index are fsynced.
+
+The inventory as of any timestamp is rebuilt by seeking to the latest checkpoint taken
+at or before that timestamp and replaying only the records written after it, so the
+replay time is bounded by the checkpoint interval rather than by the journal length.
+The records hold absolute values, replaying a change the checkpoint already reflects is
+harmless.
+
+Journal records are JSON lines with a "type" ("checkpoint", "order", "stock", "price",
+"promotion", "add" or "remove") and a "ts" (seconds since the epoch, never decreasing
+along the journal).
+
+Classes:
+    OrderJournal: A store listener writing the orders and inventory changes to a journal.
+
+Functions:
+    read_index: Reads the checkpoint index of a journal.
+    iter_orders: Reads the order records of a journal in a time range.
+    replay: Rebuilds the inventory of a store as of a timestamp.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from products import Product
+from store import Store
+from persistence import apply_record, product_from_record, product_to_record
+
+INDEX_SUFFIX = ".idx"
+
+
+def _read_records(file, end_ts: Optional[float] = None) -> Iterator[Tuple[int, dict]]:
+    """
+    Reads the records of a journal from the current position of the file. A torn record
+    at the end of the journal ends the reading.
+
+    :param file: The journal, opened in binary mode.
+    :param end_ts: (float) The reading stops at the first record after that time.
+    :return: An iterator over the (offset, record) pairs.
+    """
+    offset = file.tell()
+    for line in file:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        if end_ts is not None and record["ts"] > end_ts:
+            return
+        yield offset, record
+        offset += len(line)
+
+
+def read_index(path: str) -> List[Tuple[float, int]]:
+    """
+    Reads the checkpoint index of a journal. The index is rebuilt from the journal when it
+    is missing.
+
+    :param path: (str) The path of the journal.
+    :return: (List[Tuple[float, int]]) The timestamp of every checkpoint and the offset
+             its replay starts from, in journal order.
+    """
+    index = []
+    if os.path.exists(path + INDEX_SUFFIX):
+        with open(path + INDEX_SUFFIX, encoding="utf-8") as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) == 2:
+                    index.append((float(fields[0]), int(fields[1])))
+        return index
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            for offset, record in _read_records(file):
+                if record["type"] == "checkpoint":
+                    index.append((record["ts"], record.get("from", offset)))
+    return index
+
+
+def iter_orders(path: str, start_ts: float = 0.0,
+                end_ts: Optional[float] = None) -> Iterator[dict]:
+    """
+    Reads the order records of a journal in a time range.
+
+    :param path: (str) The path of the journal.
+    :param start_ts: (float) The earliest timestamp of the orders.
+    :param end_ts: (float) The latest timestamp of the orders, no bound if not given.
+    :return: An iterator over the order records.
+    """
+    index = read_index(path)
+    # the checkpoint before start_ts is the nearest known offset before the first order
+    position = bisect_right(index, (start_ts, -1)) - 1
+    with open(path, "rb") as file:
+        if position >= 0:
+            file.seek(index[position][1])
+        for _, record in _read_records(file, end_ts):
+            if record["type"] == "order" and record["ts"] >= start_ts:
+                yield record
+
+
+def replay(path: str, timestamp: float, promotions: Dict[str, object],
+           create_store: Callable[[List[Product]], Store] = Store) -> Store:
+    """
+    Rebuilds the inventory of a store as of a timestamp.
+
+    :param path: (str) The path of the journal.
+    :param timestamp: (float) The time of the inventory, the records written at that
+                      time are included.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    :param create_store: Creates the store from the products of the checkpoint.
+    :return: (Store) A new store holding the inventory as it was at that time.
+
+    Raises:
+        ValueError: If the journal has no checkpoint taken at or before that time.
+    """
+    index = read_index(path)
+    position = bisect_right(index, (timestamp, float("inf"))) - 1
+    if position < 0:
+        raise ValueError(f"The journal has no checkpoint before {timestamp}")
+    with open(path, "rb") as file:
+        file.seek(index[position][1])
+        records = _read_records(file, timestamp)
+        # the records written while the checkpoint was taken come first, they are
+        # replayed on top of it
+        written_meanwhile = []
+        for _, record in records:
+            if record["type"] == "checkpoint":
+                checkpoint = record
+                break
+            written_meanwhile.append(record)
+        else:
+            raise ValueError(f"The checkpoint at offset {index[position][1]} is missing")
+        store = create_store([product_from_record(record, promotions)
+                              for record in checkpoint["products"]])
+        for record in written_meanwhile:
+            apply_record(store, dict(record, op=record["type"]), promotions)
+        for _, record in records:
+            if record["type"] != "checkpoint":
+                apply_record(store, dict(record, op=record["type"]), promotions)
+    return store
+
+
+class OrderJournal:
+    """
+    A store listener writing the orders and inventory changes of a store to a journal.
+
+    Attributes:
+        store (Store): The journaled store.
+        path (str): The path of the journal, the index is kept in path + ".idx".
+        checkpoint_every (int): The number of records written between two checkpoints.
+    """
+    def __init__(self, store: Store, path: str, checkpoint_every: int = 1000,
+                 clock: Callable[[], float] = time.time):
+        """
+        Starts journaling a store, a checkpoint of the current inventory is written first.
+
+        :param store: (Store) The store to journal.
+        :param path: (str) The path of the journal, an existing journal is appended to.
+        :param checkpoint_every: (int) The number of records written between two checkpoints.
+        :param clock: Returns the current time in seconds since the epoch.
+        """
+        self.store = store
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self._clock = clock
+        # _lock guards the journal file, _checkpoint_lock lets one checkpoint run at a time
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        rebuilt = not os.path.exists(path + INDEX_SUFFIX)
+        index = read_index(path)
+        self._last_ts = self._recover_tail(index[-1][1] if index else 0)
+        self._records_since_checkpoint = 0
+        self._file = open(path, "ab")
+        self._index_file = open(path + INDEX_SUFFIX, "a", encoding="utf-8")
+        if rebuilt:
+            # a rebuilt index is saved before new checkpoints are added to it
+            for checkpoint_ts, offset in index:
+                self._index_file.write(f"{checkpoint_ts!r} {offset}\n")
+        self.checkpoint()
+        store.add_listener(self)
+
+    def _recover_tail(self, offset: int) -> float:
+        """
+        Cuts a torn record off the end of the journal, so that the new records follow the
+        last complete one.
+
+        :param offset: (int) The offset of the last checkpoint, the records before it are
+                       known to be complete.
+        :return: (float) The timestamp of the last record, 0.0 if the journal is empty.
+        """
+        if not os.path.exists(self.path):
+            return 0.0
+        last_ts = 0.0
+        end = offset
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    last_ts = json.loads(line)["ts"]
+                except ValueError:
+                    break
+                end += len(line)
+        if os.path.getsize(self.path) > end:
+            os.truncate(self.path, end)
+        return last_ts
+
+    def _now(self) -> float:
+        """
+        Returns the timestamp of the next record, the caller holds _lock.
+        """
+        self._last_ts = max(self._last_ts, self._clock())
+        return self._last_ts
+
+    def _write(self, record: dict):
+        """
+        Writes a record, the caller holds _lock.
+        """
+        self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+    def _append(self, record_type: str, **fields):
+        """
+        Writes a record and starts a background checkpoint when one is due.
+        """
+        with self._lock:
+            self._write({"type": record_type, "ts": self._now(), **fields})
+            self._file.flush()
+            self._records_since_checkpoint += 1
+            due = self._records_since_checkpoint >= self.checkpoint_every
+        # a checkpoint already running covers this one
+        if due and self._checkpoint_lock.acquire(blocking=False):
+            threading.Thread(target=self._background_checkpoint, daemon=True).start()
+
+    def _background_checkpoint(self):
+        """
+        Writes a checkpoint from the background thread started by _append.
+        """
+        try:
+            self._checkpoint()
+        finally:
+            self._checkpoint_lock.release()
+
+    def checkpoint(self):
+        """
+        Writes a checkpoint of the current inventory.
+        """
+        with self._checkpoint_lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """
+        Writes a checkpoint, the caller holds _checkpoint_lock.
+        """
+        with self._lock:
+            start = self._file.tell()
+            self._records_since_checkpoint = 0
+        # the records written from start on are replayed on top of the checkpoint, the
+        # inventory is copied and serialized without holding up the writers
+        products = [product_to_record(product) for product in list(self.store.products_list)]
+        serialized = json.dumps(products, separators=(",", ":")).encode()
+        with self._lock:
+            timestamp = self._now()
+            self._file.write(b'{"type":"checkpoint","ts":%s,"from":%d,"products":%s}\n'
+                             % (repr(timestamp).encode(), start, serialized))
+            self._file.flush()
+        os.fsync(self._file.fileno())
+        self._index_file.write(f"{timestamp!r} {start}\n")
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+
+    def on_stock_changed(self, product: Product):
+        self._append("stock", name=product.name, quantity=product.quantity,
+                     active=product.is_active())
+
+    def on_price_changed(self, product: Product):
+        self._append("price", name=product.name, price=product.price)
+
+    def on_promotion_changed(self, product: Product):
+        # also called when the per order limit of a LimitedProduct changes
+        self._append("promotion", name=product.name,
+                     promotion=getattr(product.promotion, "name", None),
+                     limit=getattr(product, "limit", None))
+
+    def on_product_added(self, product: Product):
+        self._append("add", product=product_to_record(product))
+
+    def on_product_removed(self, product: Product):
+        self._append("remove", name=product.name)
+
+    def on_order_confirmed(self, receipt):
+        self._append("order", order_id=receipt.order_id, total=receipt.total,
+                     lines=[[line.product_name, line.quantity, line.unit_price,
+                             line.promotion_name, line.line_total]
+                            for line in receipt.lines])
+
+    def close(self):
+        """
+        Stops journaling the store and closes the journal.
+        """
+        self.store.remove_listener(self)
+        # the checkpoint being written, if any, is finished first
+        with self._checkpoint_lock:
+            pass
+        with self._lock:
+            self._file.close()
+            self._index_file.close()
@@ -0,0 +1,520 @@
+"""
+persistence.py - Module file containing the durable inventory layer
+
+This module makes the inventory of a store survive restarts. Every inventory mutation
+(stock, price and promotion changes, added and removed products) and every confirmed
+order is appended to a write-ahead log, and a compact snapshot of the whole catalog is
+written periodically.
+
+The log is written by a background thread that gathers the records appended in the
+meantime and makes them durable with a single fsync (group commit). The log is split in
+segments, a snapshot starts a new segment and the segments it covers are deleted, so
+recovery loads the latest snapshot and replays only the log tail. The log records hold
+the absolute state of a product, replaying a record that the snapshot already reflects
+is harmless.
+
+Classes:
+    WriteAheadLog: A segmented append-only log with group commit.
+    Persistence: A store listener writing the changes of a store to the log.
+
+Functions:
+    open_store: Recovers a store from its snapshot and log and keeps it persisted.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from products import Product, NonStockedProduct, LimitedProduct
+from store import Store
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PREFIX = "wal-"
+SEGMENT_SUFFIX = ".log"
+
+
+def product_to_record(product: Product) -> dict:
+    """
+    Converts a product to a JSON serializable record.
+
+    :param product: (Product) The product.
+    :return: (dict) The record of the product, the promotion is referenced by name.
+    """
+    if isinstance(product, NonStockedProduct):
+        kind = "non_stocked"
+    elif isinstance(product, LimitedProduct):
+        kind = "limited"
+    else:
+        kind = "product"
+    return {"kind": kind, "name": product.name, "price": product.price,
+            "quantity": product.quantity, "active": product.is_active(),
+            "limit": getattr(product, "limit", None),
+            "promotion": getattr(product.promotion, "name", None)}
+
+
+def product_from_record(record: dict, promotions: Dict[str, object]) -> Product:
+    """
+    Creates a product from its record.
+
+    :param record: (dict) The record of the product, as made by product_to_record.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    :return: (Product) The product.
+
+    Raises:
+        ValueError: If the record describes an invalid product.
+    """
+    kind = record.get("kind", "product")
+    if kind == "non_stocked":
+        product = NonStockedProduct(record["name"], record["price"])
+    elif kind == "limited":
+        product = LimitedProduct(record["name"], record["price"], record["quantity"],
+                                 record["limit"])
+    elif kind == "product":
+        product = Product(record["name"], record["price"], record["quantity"])
+    else:
+        raise ValueError(f"Unknown product kind {kind!r}")
+    if "active" in record:
+        product.active = record["active"]
+    if record.get("promotion"):
+        product.set_promotion(promotions.get(record["promotion"]))
+    return product
+
+
+def _fsync_directory(directory: str):
+    """
+    Makes the creation, renaming or deletion of the files of a directory durable.
+    """
+    if hasattr(os, "O_DIRECTORY"):
+        descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+class WriteAheadLog:
+    """
+    A segmented append-only log with group commit.
+
+    Every record gets a sequence number, records are JSON lines. Appending only queues the
+    record, a background thread writes the queued records and fsyncs them together, at
+    most flush_interval seconds after the first of them was queued, as soon as batch_size
+    records are queued, or when a caller waits for a record to be durable. The thread
+    sleeps while nothing is queued.
+
+    Attributes:
+        directory (str): The directory of the segments.
+        batch_size (int): The number of queued records that triggers a write.
+        flush_interval (float): The longest time a record waits before it is written.
+    """
+    def __init__(self, directory: str, next_seq: int = 1, batch_size: int = 256,
+                 flush_interval: float = 0.01):
+        """
+        Opens the log, the records are appended to a new segment.
+
+        :param directory: (str) The directory of the segments.
+        :param next_seq: (int) The sequence number of the next record.
+        :param batch_size: (int) The number of queued records that triggers a write.
+        :param flush_interval: (float) The longest time a record waits before it is written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # _io_lock orders the writes and segment switches, it is always taken before _lock
+        self._io_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._pending: List[bytes] = []
+        # set by wait_durable, the queued records are written without waiting for more
+        self._sync_requested = False
+        self._next_seq = next_seq
+        self._durable_seq = next_seq - 1
+        self._closed = False
+        self._file = self._open_segment(next_seq)
+        self._writer = threading.Thread(target=self._run, name="wal-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def segments(directory: str) -> List[Tuple[int, str]]:
+        """
+        Lists the segments of a log directory.
+
+        :param directory: (str) The directory of the segments.
+        :return: (List[Tuple[int, str]]) The first sequence number and path of every
+                 segment, in sequence order.
+        """
+        if not os.path.isdir(directory):
+            return []
+        segments = []
+        for file_name in os.listdir(directory):
+            if file_name.startswith(SEGMENT_PREFIX) and file_name.endswith(SEGMENT_SUFFIX):
+                first_seq = int(file_name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                segments.append((first_seq, os.path.join(directory, file_name)))
+        return sorted(segments)
+
+    @staticmethod
+    def read_records(directory: str, after_seq: int = 0) -> Iterator[dict]:
+        """
+        Reads the records of a log directory, in sequence order.
+
+        A torn record at the end of a segment (a crash in the middle of a write) ends the
+        reading of that segment.
+
+        :param directory: (str) The directory of the segments.
+        :param after_seq: (int) Only the records with a greater sequence number are read.
+        :return: An iterator over the records.
+        """
+        segments = WriteAheadLog.segments(directory)
+        for index, (_, path) in enumerate(segments):
+            if index + 1 < len(segments) and segments[index + 1][0] <= after_seq + 1:
+                continue
+            with open(path, "rb") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record["seq"] > after_seq:
+                        yield record
+
+    def _open_segment(self, first_seq: int):
+        """
+        Creates the segment starting at a sequence number. A segment of that name can only
+        hold a torn record (its records would be part of the recovered state otherwise),
+        it is overwritten.
+        """
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:020d}{SEGMENT_SUFFIX}")
+        segment = open(path, "wb")
+        _fsync_directory(self.directory)
+        return segment
+
+    def append(self, record: dict) -> int:
+        """
+        Queues a record.
+
+        :param record: (dict) The record, its "seq" field is set to its sequence number.
+        :return: (int) The sequence number of the record.
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError("The log is closed.")
+            seq = self._next_seq
+            self._next_seq += 1
+            record["seq"] = seq
+            self._pending.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            # the writer waits for the first record of a batch and for a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        return seq
+
+    def wait_durable(self, seq: int):
+        """
+        Blocks until a record has been written and fsynced.
+
+        :param seq: (int) The sequence number of the record.
+        """
+        with self._lock:
+            while self._durable_seq < seq and not self._closed:
+                self._sync_requested = True
+                self._wakeup.notify()
+                self._flushed.wait()
+
+    def sync(self):
+        """
+        Writes and fsyncs all the queued records.
+        """
+        with self._lock:
+            seq = self._next_seq - 1
+        self.wait_durable(seq)
+
+    def _write_pending(self):
+        """
+        Writes and fsyncs the queued records, the caller holds _io_lock.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+            last_seq = self._next_seq - 1
+        if batch:
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        with self._lock:
+            self._durable_seq = max(self._durable_seq, last_seq)
+            self._flushed.notify_all()
+
+    def _run(self):
+        """
+        The loop of the background writer thread.
+        """
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.batch_size and not self._sync_requested \
+                        and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                self._sync_requested = False
+            with self._io_lock:
+                self._write_pending()
+
+    def rotate(self) -> int:
+        """
+        Seals the current segment, the next records go to a new segment.
+
+        :return: (int) The sequence number of the last record of the sealed segments.
+        """
+        with self._io_lock:
+            self._write_pending()
+            with self._lock:
+                last_seq = self._next_seq - 1
+                self._file.close()
+                self._file = self._open_segment(last_seq + 1)
+        return last_seq
+
+    def discard_through(self, seq: int):
+        """
+        Deletes the sealed segments whose records all have a sequence number up to seq.
+
+        :param seq: (int) The sequence number covered by a snapshot.
+        """
+        segments = WriteAheadLog.segments(self.directory)
+        for (_, path), (next_first_seq, _) in zip(segments, segments[1:]):
+            if next_first_seq - 1 <= seq:
+                os.remove(path)
+        _fsync_directory(self.directory)
+
+    def close(self):
+        """
+        Writes the queued records and closes the log.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+
+
+def write_snapshot(directory: str, seq: int, products: List[dict]):
+    """
+    Writes a snapshot atomically, it replaces the previous one only once it is durable.
+
+    :param directory: (str) The directory of the snapshot.
+    :param seq: (int) The sequence number of the last log record the snapshot covers.
+    :param products: (List[dict]) The records of all the products.
+    """
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump({"seq": seq, "products": products}, file, separators=(",", ":"))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+    _fsync_directory(directory)
+
+
+def read_snapshot(directory: str) -> Optional[dict]:
+    """
+    Reads the snapshot of a directory.
+
+    :param directory: (str) The directory of the snapshot.
+    :return: (dict) The snapshot, with its "seq" and "products", None if there is none.
+    """
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def apply_record(store: Store, record: dict, promotions: Dict[str, object]):
+    """
+    Replays a log record on a store.
+
+    :param store: (Store) The store.
+    :param record: (dict) The log record.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    """
+    operation = record["op"]
+    if operation == "stock":
+        product = store.find_product_by_name(record["name"])
+        if product is not None:
+            product.quantity = record["quantity"]
+            product.active = record["active"]
+    elif operation == "add":
+        if store.find_product_by_name(record["product"]["name"]) is None:
+            store.add_product(product_from_record(record["product"], promotions))
+    elif operation == "remove":
+        product = store.find_product_by_name(record["name"])
+        if product is not None:
+            store.remove_product(product)
+    elif operation == "price":
+        product = store.find_product_by_name(record["name"])
+        if product is not None:
+            product.price = record["price"]
+    elif operation == "promotion":
+        product = store.find_product_by_name(record["name"])
+        if product is not None:
+            product.set_promotion(promotions.get(record["promotion"])
+                                  if record["promotion"] else None)
+            if record.get("limit") is not None and isinstance(product, LimitedProduct):
+                product.limit = record["limit"]
+    # the "order" records are kept for the audit, their stock changes have their own records
+
+
+class Persistence:
+    """
+    A store listener writing the changes of a store to a write-ahead log and taking
+    periodic snapshots.
+
+    Attributes:
+        store (Store): The persisted store.
+        directory (str): The directory of the snapshot and of the log.
+        log (WriteAheadLog): The log.
+        snapshot_every (int): The number of log records that triggers a new snapshot.
+        durable_orders (bool): Whether a checkout waits for its order record to be fsynced.
+    """
+    def __init__(self, store: Store, directory: str, next_seq: int = 1,
+                 snapshot_every: int = 10000, durable_orders: bool = True, **log_options):
+        """
+        Starts persisting a store.
+
+        :param store: (Store) The store to persist.
+        :param directory: (str) The directory of the snapshot and of the log.
+        :param next_seq: (int) The sequence number of the next log record.
+        :param snapshot_every: (int) The number of log records that triggers a new snapshot.
+        :param durable_orders: (bool) Whether a checkout waits for its order record to be
+                               fsynced before it returns.
+        :param log_options: The batch_size and flush_interval of the WriteAheadLog.
+        """
+        self.store = store
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.durable_orders = durable_orders
+        self.log = WriteAheadLog(directory, next_seq, **log_options)
+        # _count_lock guards the count of the records, the listeners run on many threads
+        self._records_since_snapshot = 0
+        self._count_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        store.add_listener(self)
+
+    def _append(self, record: dict) -> int:
+        """
+        Appends a record to the log and starts a background snapshot when it is due.
+        """
+        seq = self.log.append(record)
+        with self._count_lock:
+            self._records_since_snapshot += 1
+            due = self._records_since_snapshot >= self.snapshot_every
+        if due and self._snapshot_lock.acquire(blocking=False):
+            threading.Thread(target=self._background_snapshot, daemon=True).start()
+        return seq
+
+    def on_stock_changed(self, product: Product):
+        self._append({"op": "stock", "name": product.name, "quantity": product.quantity,
+                      "active": product.is_active()})
+
+    def on_price_changed(self, product: Product):
+        self._append({"op": "price", "name": product.name, "price": product.price})
+
+    def on_promotion_changed(self, product: Product):
+        # also called when the per order limit of a LimitedProduct changes
+        self._append({"op": "promotion", "name": product.name,
+                      "promotion": getattr(product.promotion, "name", None),
+                      "limit": getattr(product, "limit", None)})
+
+    def on_product_added(self, product: Product):
+        self._append({"op": "add", "product": product_to_record(product)})
+
+    def on_product_removed(self, product: Product):
+        self._append({"op": "remove", "name": product.name})
+
+    def on_order_confirmed(self, receipt):
+        seq = self._append({"op": "order", "order_id": receipt.order_id, "total": receipt.total,
+                            "lines": [[line.product_name, line.quantity, line.line_total]
+                                      for line in receipt.lines]})
+        if self.durable_orders:
+            self.log.wait_durable(seq)
+
+    def _background_snapshot(self):
+        """
+        Takes a snapshot from the background thread started by _append.
+        """
+        try:
+            self._take_snapshot()
+        finally:
+            self._snapshot_lock.release()
+
+    def snapshot(self):
+        """
+        Takes a snapshot of the store and deletes the log segments it covers.
+        """
+        with self._snapshot_lock:
+            self._take_snapshot()
+
+    def _take_snapshot(self):
+        """
+        Takes a snapshot, the caller holds _snapshot_lock.
+        """
+        with self._count_lock:
+            self._records_since_snapshot = 0
+        # the changes made while the products are copied get records after last_seq,
+        # they are replayed on top of the snapshot
+        last_seq = self.log.rotate()
+        products = [product_to_record(product) for product in list(self.store.products_list)]
+        write_snapshot(self.directory, last_seq, products)
+        self.log.discard_through(last_seq)
+
+    def close(self):
+        """
+        Stops persisting the store and closes the log.
+        """
+        self.store.remove_listener(self)
+        self.log.close()
+
+
+def open_store(directory: str, promotions: Dict[str, object],
+               create_store: Optional[Callable[[], Store]] = None,
+               **options) -> Tuple[Store, Persistence]:
+    """
+    Recovers a store from the snapshot and the log of a directory, and keeps it persisted.
+
+    :param directory: (str) The directory of the snapshot and of the log.
+    :param promotions: (Dict[str, Promotion]) The promotions by name.
+    :param create_store: The function creating the initial store when the directory
+                         has no snapshot yet, an empty store is created otherwise.
+    :param options: The options of Persistence.
+    :return: (Tuple[Store, Persistence]) The recovered store and its persistence,
+             close the persistence when the store is no longer used.
+    """
+    snapshot = read_snapshot(directory)
+    if snapshot is not None:
+        store = Store([product_from_record(record, promotions)
+                       for record in snapshot["products"]])
+        last_seq = snapshot["seq"]
+    else:
+        store = create_store() if create_store else Store([])
+        last_seq = 0
+
+    replayed = 0
+    for record in WriteAheadLog.read_records(directory, last_seq):
+        apply_record(store, record, promotions)
+        last_seq = record["seq"]
+        replayed += 1
+
+    persistence = Persistence(store, directory, next_seq=last_seq + 1, **options)
+    if snapshot is None or replayed:
+        persistence.snapshot()
+    return store, persistence
@@ -0,0 +1,140 @@
+"""
+price_index.py - Module file containing the PriceIndex class
+
+This module defines the PriceIndex class, a sorted container of products ordered by
+price. The entries are kept in a list of sorted buckets of bounded size: a lookup
+bisects the list of bucket maxima and then the bucket, an insertion or removal only
+shifts the entries of one bucket, so both stay fast with millions of products.
+
+Classes:
+    PriceIndex: A container of products sorted by price.
+"""
+
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+from products import Product
+
+# The number of entries of a bucket, a bucket twice as large is split in two
+BUCKET_SIZE = 512
+
+# An entry is (price, tie breaker, product), the tie breakers are unique so the
+# products themselves are never compared
+Entry = Tuple[float, int, Product]
+
+
+class PriceIndex:
+    """
+    A container of products sorted by price, products of the same price are sorted by
+    their tie breaker.
+    """
+    def __init__(self, entries: Iterable[Entry] = ()):
+        """
+        Initializes the index.
+
+        :param entries: The (price, tie breaker, product) entries of the initial products.
+        """
+        entries = sorted(entries, key=lambda entry: entry[:2])
+        self._buckets: List[List[Entry]] = [entries[start:start + BUCKET_SIZE]
+                                            for start in range(0, len(entries), BUCKET_SIZE)]
+        self._maxima: List[Entry] = [bucket[-1] for bucket in self._buckets]
+        self._entries: Dict[int, Entry] = {id(entry[2]): entry for entry in entries}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, product: Product) -> bool:
+        return id(product) in self._entries
+
+    def add(self, price: float, tie_breaker: int, product: Product):
+        """
+        Adds a product, or moves it to its new price if it is already in the index.
+
+        :param price: (float) The price of the product.
+        :param tie_breaker: (int) A number unique to the product.
+        :param product: (Product) The product.
+        """
+        self.discard(product)
+        entry = (price, tie_breaker, product)
+        self._entries[id(product)] = entry
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxima.append(entry)
+            return
+        index = min(bisect_left(self._maxima, entry), len(self._buckets) - 1)
+        bucket = self._buckets[index]
+        insort(bucket, entry)
+        self._maxima[index] = bucket[-1]
+        if len(bucket) > 2 * BUCKET_SIZE:
+            self._buckets[index:index + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+            self._maxima[index:index + 1] = [bucket[BUCKET_SIZE - 1], bucket[-1]]
+
+    def discard(self, product: Product):
+        """
+        Removes a product, if it is in the index.
+
+        :param product: (Product) The product.
+        """
+        entry = self._entries.pop(id(product), None)
+        if entry is None:
+            return
+        index = bisect_left(self._maxima, entry)
+        bucket = self._buckets[index]
+        del bucket[bisect_left(bucket, entry)]
+        if bucket:
+            self._maxima[index] = bucket[-1]
+        else:
+            del self._buckets[index]
+            del self._maxima[index]
+
+    def _iterate_from(self, entry: Tuple) -> Iterator[Entry]:
+        """
+        Iterates over the entries from the first one not below the given key.
+        """
+        index = bisect_left(self._maxima, entry)
+        if index == len(self._buckets):
+            return
+        yield from islice(self._buckets[index], bisect_left(self._buckets[index], entry), None)
+        for bucket in islice(self._buckets, index + 1, None):
+            yield from bucket
+
+    def price_range(self, min_price: float, max_price: float) -> Iterator[Product]:
+        """
+        :param min_price: (float) The lowest price, included.
+        :param max_price: (float) The highest price, included.
+        :return: An iterator over the products priced between the two, cheapest first.
+        """
+        for price, _, product in self._iterate_from((min_price, -1)):
+            if price > max_price:
+                return
+            yield product
+
+    def cheapest(self, count: int) -> List[Product]:
+        """
+        :param count: (int) The number of products.
+        :return: (List[Product]) The count cheapest products, cheapest first.
+        """
+        return self.slice(0, count)
+
+    def slice(self, start: int, stop: int) -> List[Product]:
+        """
+        :param start: (int) The rank of the first product, 0 for the cheapest.
+        :param stop: (int) The rank after the last product.
+        :return: (List[Product]) The products ranked from start to stop, cheapest first.
+        """
+        products = []
+        offset = 0
+        for bucket in self._buckets:
+            if offset + len(bucket) > start:
+                first = max(start - offset, 0)
+                products.extend(entry[2] for entry in bucket[first:stop - offset])
+                if offset + len(bucket) >= stop:
+                    break
+            offset += len(bucket)
+        return products
+
+    def __iter__(self) -> Iterator[Product]:
+        for bucket in self._buckets:
+            for entry in bucket:
+                yield entry[2]
+
@@ -0,0 +1,575 @@
+"""
+product_table.py - Module file containing the columnar product catalog
+
+This module defines the ProductTable class, a catalog that keeps the products of a
+store column by column (names, prices, quantities, active flags, kinds, limits and
+promotion ids) in typed arrays instead of one Product object per product, and the
+ColumnarStore class, a Store backed by such a table.
+
+The aggregates and filters of the store (total quantity, active products) run over
+the columns, and Product compatible views are handed out on demand: a view behaves
+like the Product, NonStockedProduct or LimitedProduct it stands for, but reads and
+writes its row of the table.
+
+Classes:
+    ProductTable: A columnar catalog of products.
+    ProductView: A view of a regular product row.
+    NonStockedProductView: A view of a non-stocked product row.
+    LimitedProductView: A view of a limited product row.
+    ColumnarStore: A store backed by a ProductTable.
+"""
+
+import heapq
+from array import array
+from itertools import compress, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from products import Product, NonStockedProduct, LimitedProduct
+from money import to_cents, to_amount
+from store import Store
+from search_index import SearchIndex
+
+# Values of the kind column
+KIND_PRODUCT = 0
+KIND_NON_STOCKED = 1
+KIND_LIMITED = 2
+
+# Value of the promotion id column for products without a promotion
+NO_PROMOTION = -1
+
+
+def kind_of(product: Product) -> int:
+    """
+    Returns the kind of product as stored in the kind column.
+
+    :param product: (Product) The product.
+    :return: (int) KIND_NON_STOCKED, KIND_LIMITED or KIND_PRODUCT.
+    """
+    if isinstance(product, NonStockedProduct):
+        return KIND_NON_STOCKED
+    if isinstance(product, LimitedProduct):
+        return KIND_LIMITED
+    return KIND_PRODUCT
+
+
+class ProductTable:
+    """
+    A columnar catalog of products.
+
+    Attributes:
+        prices (array): The price of every row.
+        quantities (array): The quantity of every row.
+        active (array): The active flag of every row (1 or 0).
+        kinds (array): The kind of every row (KIND_PRODUCT, KIND_NON_STOCKED, KIND_LIMITED).
+        limits (array): The per order limit of every row, 0 for unlimited products.
+        promotion_ids (array): The index in promotions of the promotion of every row,
+                               NO_PROMOTION if the row has none.
+        promotions (List[Promotion]): The promotions referenced by the rows.
+    """
+    def __init__(self):
+        """
+        Initializes an empty table.
+        """
+        self._names: List[str] = []
+        self.prices = array("d")
+        self.quantities = array("q")
+        self.active = array("b")
+        self.kinds = array("b")
+        self.limits = array("q")
+        self.promotion_ids = array("l")
+        self.promotions = []
+        self._promotion_ids: Dict[int, int] = {}
+        self._rows: Dict[str, int] = {}
+        self._removed: Set[int] = set()
+
+    @classmethod
+    def from_products(cls, products: Iterable[Product]) -> "ProductTable":
+        """
+        Creates a table holding a copy of the given products.
+
+        :param products: (Iterable[Product]) The products to copy into the table.
+        :return: (ProductTable) The new table.
+        """
+        table = cls()
+        for product in products:
+            table.append_product(product)
+        return table
+
+    def __len__(self) -> int:
+        """
+        :return: (int) The number of products in the table, removed rows excluded.
+        """
+        return len(self._names) - len(self._removed)
+
+    def rows(self) -> Iterator[int]:
+        """
+        :return: An iterator over the rows of the products in the table.
+        """
+        removed = self._removed
+        return (row for row in range(len(self._names)) if row not in removed)
+
+    def name_at(self, row: int) -> str:
+        """
+        :param row: (int) The row.
+        :return: (str) The product name of the row.
+        """
+        return self._names[row]
+
+    def row_of(self, name: str) -> Optional[int]:
+        """
+        :param name: (str) The product name.
+        :return: (int) The row of the product, None if the table has no such product.
+        """
+        return self._rows.get(name)
+
+    def promotion_at(self, row: int):
+        """
+        :param row: (int) The row.
+        :return: The promotion of the row, None if the row has none.
+        """
+        promotion_id = self.promotion_ids[row]
+        return None if promotion_id == NO_PROMOTION else self.promotions[promotion_id]
+
+    def promotion_id(self, promotion) -> int:
+        """
+        Returns the id of a promotion, registering the promotion if it is new.
+
+        :param promotion: The promotion, or None.
+        :return: (int) The id of the promotion, NO_PROMOTION for None.
+        """
+        if promotion is None:
+            return NO_PROMOTION
+        promotion_id = self._promotion_ids.get(id(promotion))
+        if promotion_id is None:
+            promotion_id = len(self.promotions)
+            self.promotions.append(promotion)
+            self._promotion_ids[id(promotion)] = promotion_id
+        return promotion_id
+
+    def append(self, name: str, price: float, quantity: int, kind: int = KIND_PRODUCT,
+               limit: int = 0, promotion=None) -> int:
+        """
+        Appends a product to the table.
+
+        :param name: (str) The name of the product.
+        :param price: (float) The price of the product.
+        :param quantity: (int) The quantity of the product, ignored for non-stocked products.
+        :param kind: (int) The kind of the product.
+        :param limit: (int) The per order limit of a limited product.
+        :param promotion: The promotion of the product, or None.
+        :return: (int) The row of the new product.
+
+        Raises:
+            ValueError: If the name is empty or if the price or quantity is negative.
+        """
+        if kind == KIND_NON_STOCKED:
+            quantity = 0
+        if not name or price <= 0.0 or quantity < 0:
+            raise ValueError("Invalid input!"
+                             "Name cannot be empty, and price/quantity cannot be negative!")
+        row = len(self._names)
+        self._names.append(name)
+        self.prices.append(price)
+        self.quantities.append(quantity)
+        self.active.append(1 if quantity > 0 or kind == KIND_NON_STOCKED else 0)
+        self.kinds.append(kind)
+        self.limits.append(limit if kind == KIND_LIMITED else 0)
+        self.promotion_ids.append(self.promotion_id(promotion))
+        self._rows.setdefault(name, row)
+        return row
+
+    def append_product(self, product: Product) -> int:
+        """
+        Appends a copy of a product to the table.
+
+        :param product: (Product) The product to copy.
+        :return: (int) The row of the new product.
+        """
+        row = self.append(product.name, product.price, product.quantity, kind_of(product),
+                          getattr(product, "limit", 0), product.promotion)
+        self.active[row] = 1 if product.is_active() else 0
+        return row
+
+    def remove(self, row: int):
+        """
+        Removes the product of a row from the table. The row is kept but it no longer
+        counts in the aggregates and can't be found by name.
+
+        :param row: (int) The row to remove.
+        """
+        if row in self._removed:
+            return
+        self._removed.add(row)
+        self.quantities[row] = 0
+        self.active[row] = 0
+        name = self._names[row]
+        if self._rows.get(name) == row:
+            del self._rows[name]
+            for other in self.rows():
+                if self._names[other] == name:
+                    self._rows[name] = other
+                    break
+
+    def total_quantity(self) -> int:
+        """
+        :return: (int) The total quantity of all the products in the table.
+        """
+        return sum(self.quantities)
+
+    def active_count(self) -> int:
+        """
+        :return: (int) The number of active products in the table.
+        """
+        return self.active.count(1)
+
+    def active_rows(self) -> List[int]:
+        """
+        :return: (List[int]) The rows of the active products, in table order.
+        """
+        return list(compress(range(len(self.active)), self.active))
+
+    def iter_active_rows(self, start: int = 0) -> Iterator[int]:
+        """
+        :param start: (int) The first row to consider.
+        :return: (Iterator[int]) The rows of the active products from the start row on,
+                 in table order, read lazily.
+        """
+        return compress(range(start, len(self.active)), islice(self.active, start, None))
+
+    def view(self, row: int) -> Product:
+        """
+        Returns a Product compatible view of a row.
+
+        :param row: (int) The row.
+        :return: (Product) A ProductView, NonStockedProductView or LimitedProductView.
+        """
+        return _VIEW_CLASSES[self.kinds[row]](self, row)
+
+
+class _RowView:
+    """
+    Mixin that maps the attributes of a Product onto a row of a ProductTable.
+    """
+    __slots__ = ()
+    def __init__(self, table: ProductTable, row: int):
+        """
+        Initializes a view of a row, the Product initializer is not run since the
+        values live in the table.
+
+        :param table: (ProductTable) The table.
+        :param row: (int) The row.
+        """
+        self._table = table
+        self._row = row
+
+    def __eq__(self, other):
+        if isinstance(other, _RowView):
+            return self._table is other._table and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._table), self._row))
+
+    @property
+    def _store(self):
+        return None
+
+    @property
+    def name(self):
+        return self._table.name_at(self._row)
+
+    @property
+    def _price(self):
+        return self._table.prices[self._row]
+
+    @_price.setter
+    def _price(self, value):
+        self._table.prices[self._row] = value
+
+    @property
+    def _price_cents(self):
+        # the price column is the reference, the cents are worked out from it
+        return to_cents(self._table.prices[self._row])
+
+    @_price_cents.setter
+    def _price_cents(self, value):
+        # the price setter writes both, the column only changes for a price in cents
+        if value != to_cents(self._table.prices[self._row]):
+            self._table.prices[self._row] = to_amount(value)
+
+    @property
+    def quantity(self):
+        return self._table.quantities[self._row]
+
+    @quantity.setter
+    def quantity(self, value):
+        self._table.quantities[self._row] = value
+
+    @property
+    def active(self):
+        return self._table.active[self._row] == 1
+
+    @active.setter
+    def active(self, value):
+        self._table.active[self._row] = 1 if value else 0
+
+    @property
+    def promotion(self):
+        return self._table.promotion_at(self._row)
+
+    @promotion.setter
+    def promotion(self, value):
+        self._table.promotion_ids[self._row] = self._table.promotion_id(value)
+
+    @property
+    def limit(self):
+        return self._table.limits[self._row]
+
+    @limit.setter
+    def limit(self, value):
+        self._table.limits[self._row] = value
+
+
+class ProductView(_RowView, Product):
+    """
+    A view of a regular product row of a ProductTable.
+    """
+    __slots__ = ("_table", "_row")
+
+
+class NonStockedProductView(_RowView, NonStockedProduct):
+    """
+    A view of a non-stocked product row of a ProductTable.
+    """
+    __slots__ = ("_table", "_row")
+
+
+class LimitedProductView(_RowView, LimitedProduct):
+    """
+    A view of a limited product row of a ProductTable.
+    """
+    __slots__ = ("_table", "_row")
+
+
+_VIEW_CLASSES = {
+    KIND_PRODUCT: ProductView,
+    KIND_NON_STOCKED: NonStockedProductView,
+    KIND_LIMITED: LimitedProductView,
+}
+
+
+class ColumnarStore(Store):
+    """
+    A store backed by a ProductTable.
+
+    The products handed out by the store (get_products, find_product_by_name) are views
+    of the table, and products given to add_product are copied into the table.
+
+    Attributes:
+        table (ProductTable): The catalog of the store.
+    """
+    def __init__(self, table: ProductTable):
+        """
+        Initialize the ColumnarStore object.
+
+        :param table: (ProductTable): The catalog of the store.
+        """
+        self.table = table
+        super().__init__([])
+
+    @property
+    def products_list(self) -> List[Product]:
+        """
+        :return: (List[Product]) Views of all the products of the store.
+        """
+        return [self.table.view(row) for row in self.table.rows()]
+
+    @products_list.setter
+    def products_list(self, products: List[Product]):
+        for product in products:
+            self.table.append_product(product)
+
+    def __contains__(self, product):
+        """
+        Checks if a product exists in the store, only views of the table do.
+
+        :param product: (Product) The product to check.
+        :return: (bool) True if the product exists in the store, False otherwise
+        """
+        if not isinstance(product, _RowView) or product._table is not self.table:
+            return False
+        return self.table.row_of(product.name) == product._row
+
+    def get_products(self, display_flag: bool = False) -> Tuple[List[Product], int]:
+        """
+		Get a list of active products available in the store.
+
+		:display_flag:	(bool, optional): specifies whether to display the available items.
+						defaults to False.
+		Returns:
+			List[Product]: A list of views of the active products available in the store.
+		"""
+        active_products = [self.table.view(row) for row in self.table.active_rows()]
+        if display_flag:
+            self.display_products(active_products)
+        return active_products, len(active_products)
+
+    def get_products_page(self, page: int = 1, page_size: int = 20) -> List[Product]:
+        """
+		Get a page of the active products, in table order. The active column is read
+		up to the end of the page.
+
+		:param page: (int) The number of the page, starting at 1.
+		:param page_size: (int) The number of products per page.
+		:return: (List[Product]) Views of the products of the page.
+
+		Raises:
+			ValueError: If the page or the page size is not positive.
+		"""
+        if page < 1 or page_size < 1:
+            raise ValueError("The page and the page size must be positive.")
+        rows = islice(self.table.iter_active_rows(), (page - 1) * page_size, page * page_size)
+        return [self.table.view(row) for row in rows]
+
+    def _iter_pages(self, page_size: int) -> Iterator[List[Product]]:
+        """
+        Yields the pages of iter_products, each page resumes after the row of the last
+        product of the previous one.
+        """
+        start = 0
+        while True:
+            rows = list(islice(self.table.iter_active_rows(start), page_size))
+            if not rows:
+                return
+            start = rows[-1] + 1
+            yield [self.table.view(row) for row in rows]
+
+    def render_products(self, page: Optional[int] = None, page_size: int = 20) -> str:
+        """
+		Get the text of the listing of the active products. The views write straight
+		to the table, behind the back of the store, so the listing is not cached.
+
+		:param page: (int, optional) The number of the page to render, starting at 1.
+		             The whole listing is rendered if not given.
+		:param page_size: (int) The number of products per page.
+		:return: (str) The listing.
+
+		Raises:
+			ValueError: If the page or the page size is not positive.
+		"""
+        if page is None:
+            return Store.format_products(self.get_products()[0])
+        return Store.format_products(self.get_products_page(page, page_size),
+                                     (page - 1) * page_size + 1, self.get_active_count())
+
+    def add_product(self, product):
+        """
+		Add a copy of a product to the store.
+
+		:param: product (Product): The product instance to be copied into the store.
+		"""
+        row = self.table.append_product(product)
+        with self._search_lock:
+            if self._search_index is not None:
+                self._search_index.add(row, self.table.view(row))
+
+    def add_products(self, products: List[Product]):
+        """
+		Add copies of many products to the store at once.
+
+		:param: products (List[Product]): The product instances to be copied into the store.
+		"""
+        for product in products:
+            self.table.append_product(product)
+        with self._search_lock:
+            self._search_index = None
+
+    def remove_product(self, product):
+        """
+		Remove a product from the store.
+
+		:param: product (Product): The product, or a product with the same name, to remove.
+		"""
+        row = self.table.row_of(product.name)
+        if row is not None:
+            self.table.remove(row)
+            with self._search_lock:
+                if self._search_index is not None:
+                    self._search_index.discard(row)
+
+    def get_total_quantity(self) -> int:
+        """
+		Returns the total number of all products in the store.
+
+		:return: (int) The total quantity of all products in the store
+		"""
+        return self.table.total_quantity()
+
+    def get_active_count(self) -> int:
+        """
+		Returns the number of active products in the store.
+
+		:return: (int) The number of active products in the store
+		"""
+        return self.table.active_count()
+
+    def find_product_by_name(self, product_name: str) -> Optional[Product]:
+        """
+		Finds a product by its name
+
+		:return: (Product) Return a view of the product if found; otherwise, return None
+		"""
+        row = self.table.row_of(product_name)
+        return None if row is None else self.table.view(row)
+
+    def get_products_in_price_range(self, min_price: float, max_price: float) -> List[Product]:
+        """
+		Get the active products priced between two prices, cheapest first. The price
+		column is scanned, the table keeps no price index.
+
+		:param min_price: (float) The lowest price, included.
+		:param max_price: (float) The highest price, included.
+		:return: (List[Product]) Views of the products within the price range.
+		"""
+        prices = self.table.prices
+        rows = [row for row in self.table.active_rows() if min_price <= prices[row] <= max_price]
+        rows.sort(key=prices.__getitem__)
+        return [self.table.view(row) for row in rows]
+
+    def get_cheapest_products(self, count: int) -> List[Product]:
+        """
+		Get the cheapest active products.
+
+		:param count: (int) The number of products.
+		:return: (List[Product]) Views of the count cheapest products, cheapest first.
+		"""
+        rows = heapq.nsmallest(count, self.table.active_rows(), key=self.table.prices.__getitem__)
+        return [self.table.view(row) for row in rows]
+
+    def get_products_by_price(self, page: int = 1, page_size: int = 20) -> List[Product]:
+        """
+		Get a page of the active products sorted by price, cheapest first.
+
+		:param page: (int) The number of the page, starting at 1.
+		:param page_size: (int) The number of products per page.
+		:return: (List[Product]) Views of the products of the page.
+
+		Raises:
+			ValueError: If the page or the page size is not positive.
+		"""
+        if page < 1 or page_size < 1:
+            raise ValueError("The page and the page size must be positive.")
+        rows = heapq.nsmallest(page * page_size, self.table.active_rows(),
+                               key=self.table.prices.__getitem__)
+        return [self.table.view(row) for row in rows[(page - 1) * page_size:]]
+
+    def _get_search_index(self) -> SearchIndex:
+        """
+        Returns the search index of the product names, the views are indexed under
+        their row. The caller holds _search_lock.
+
+        :return: (SearchIndex) The index.
+        """
+        if self._search_index is None:
+            self._search_index = SearchIndex((row, self.table.view(row))
+                                             for row in self.table.rows())
+        return self._search_index
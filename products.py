@@ -18,6 +18,9 @@ Date:
     2023-Jun-05
 """
 
+import math
+from money import to_cents, to_amount
+
 
 class Product:
     """
@@ -26,9 +29,14 @@ class Product:
 	Attributes:
 		name (str): The name of the product.
 		price (float): The price of the product.
+		price_cents (int): The price of the product in cents.
 		quantity (int): The quantity of the product.
 		active (bool): The active status of the product.
 	"""
+    # Products are kept in __slots__ rather than a per-instance __dict__, a catalog holds
+    # a great number of them and the slots are smaller and faster to access.
+    __slots__ = ("name", "_price", "_price_cents", "_quantity", "_promotion", "_active",
+                 "_store")
 
     def __init__(self, name, price, quantity):
         """
@@ -49,14 +57,63 @@ class Product:
             raise ValueError("Invalid input!"
                              "Name cannot be empty, and price/quantity cannot be negative!")
 
+        # The store that owns the product, it is told about every stock or status change
+        # so it can keep its totals up to date without scanning the catalog.
+        self._store = None
+
         self.name = name
         self.price = price
-        self.quantity = quantity
+        self._quantity = quantity
         self.promotion = None
 
         # The active status of the product. It is set to True if the quantity is > 0,
         # otherwise it is set to False
-        self.active = self.quantity > 0
+        self._active = self._quantity > 0
+
+    @property
+    def quantity(self):
+        """
+        Getter method for retrieving the quantity of the product.
+
+        :return: (int) The quantity of the product.
+        """
+        return self._quantity
+
+    @quantity.setter
+    def quantity(self, value):
+        """
+        Setter method for updating the quantity of the product, the owning store is
+        notified of the change.
+
+        :param value: (int): The new quantity value to be set
+        """
+        delta = value - self._quantity
+        self._quantity = value
+        if delta and self._store is not None:
+            self._store.on_quantity_changed(self, delta)
+
+    @property
+    def active(self):
+        """
+        Getter method for retrieving the active status of the product.
+
+        :return: (bool) The active status of the product.
+        """
+        return self._active
+
+    @active.setter
+    def active(self, value):
+        """
+        Setter method for updating the active status of the product, the owning store
+        is notified of the change.
+
+        :param value: (bool): The new active status to be set
+        """
+        value = bool(value)
+        if value != self._active:
+            self._active = value
+            if self._store is not None:
+                self._store.on_active_changed(self)
 
     def get_quantity(self):
         """
@@ -78,6 +135,27 @@ class Product:
         if self.quantity > 0:
             self.activate()
 
+    @property
+    def promotion(self):
+        """
+        Getter method for retrieving the promotion of the product.
+
+        :return: The promotion of the product, None if it has none.
+        """
+        return self._promotion
+
+    @promotion.setter
+    def promotion(self, value):
+        """
+        Setter method for updating the promotion of the product, the owning store is
+        notified of the change.
+
+        :param value: The new promotion, None for no promotion.
+        """
+        self._promotion = value
+        if self._store is not None:
+            self._store.on_promotion_changed(self)
+
     def get_promotion(self):
         """
         Retrieves the promotion associated with the product.
@@ -122,11 +200,36 @@ class Product:
         :param value:  (float): The new price value to be set
 
         Raises:
-            ValueError: If the provided value is negative.
+            ValueError: If the provided value is negative or not a finite number.
         """
         if value < 0:
             raise ValueError("Price cannot be negative")
+        if not math.isfinite(value):
+            raise ValueError("Price must be a finite number")
+        cents = to_cents(value)
         self._price = value
+        self._price_cents = cents
+        if self._store is not None:
+            self._store.on_price_changed(self)
+
+    @property
+    def price_cents(self):
+        """
+        Getter method for retrieving the price of the product in cents, worked out from
+        the price when it is set.
+
+        :return: (int) The price of the product in cents.
+        """
+        return self._price_cents
+
+    @price_cents.setter
+    def price_cents(self, value):
+        """
+        Setter method for updating the price of the product in cents.
+
+        :param value: (int) The new price in cents.
+        """
+        self.price = to_amount(value)
 
     def activate(self):
         """
@@ -185,22 +288,56 @@ class Product:
     		Note: 	If an error occurs during the purchase process, None is returned
     				and an error message is printed
     	"""
-        total_price = 0.0
+        message, purchased = self.deduct_stock(quantity_to_purchase)
+        total_price = self.quote(quantity_to_purchase) if purchased else 0.0
+        return message, total_price
+
+    def deduct_stock(self, quantity_to_purchase):
+        """
+        Takes a quantity of the product out of stock without pricing it, this is the
+        stock half of buy, the pricing half is quote.
+
+        param: quantity_to_purchase (int): The quantity of the product to be purchased.
+
+        :return: (tuple) A tuple containing the purchase message and whether the
+                    quantity was purchased (False if the product is not active).
+
+        Raises:
+            ValueError: If the purchase quantity exceeds the available quantity.
+        """
         if self.active:
             if quantity_to_purchase > self.quantity:
                 raise ValueError(f"The {self.name} has insufficient quantity available.")
 
             self.quantity -= quantity_to_purchase
-            if self.promotion:
-                total_price = self.promotion.apply_promotion(self, quantity_to_purchase)
-            else:
-                total_price = self.price * quantity_to_purchase
             if self.quantity == 0:
                 self.deactivate()
                 return f"Purchased {quantity_to_purchase} units of {self.name}. {self.name} is" \
-                       " out of stock.", total_price
-            return f"Purchased {quantity_to_purchase} units of {self.name}.", total_price
-        return f"{self.name} is out of stock.", total_price
+                       " out of stock.", True
+            return f"Purchased {quantity_to_purchase} units of {self.name}.", True
+        return f"{self.name} is out of stock.", False
+
+    def quote(self, quantity):
+        """
+        Calculates the price of a quantity of the product, promotion included,
+        without buying it.
+
+        :param quantity: (int) The quantity of the product.
+        :return: (float) The price of the quantity.
+        """
+        return to_amount(self.quote_cents(quantity))
+
+    def quote_cents(self, quantity):
+        """
+        Calculates the price of a quantity of the product in cents, promotion included,
+        without buying it.
+
+        :param quantity: (int) The quantity of the product.
+        :return: (int) The price of the quantity in cents.
+        """
+        if self.promotion:
+            return self.promotion.apply_promotion_cents(self.price_cents, quantity)
+        return self.price_cents * quantity
 
 
 class NonStockedProduct(Product):
@@ -215,6 +352,8 @@ class NonStockedProduct(Product):
     Customers can purchase the non-stocked product up to the maximum allowed quantity specified
     by the policy.
     """
+    __slots__ = ()
+
     def __init__(self, name, price):
         super().__init__(name, price, quantity=0)
         self.activate()
@@ -261,15 +400,24 @@ class NonStockedProduct(Product):
         Please note that the quantity of the purchase is subject to the maximum allowed quantity
         specified by the store policy.
     	"""
-        total_price = 0.0
+        message, purchased = self.deduct_stock(quantity_to_purchase)
+        total_price = self.quote(quantity_to_purchase) if purchased else 0.0
+        return message, total_price
+
+    def deduct_stock(self, quantity_to_purchase):
+        """
+        Non-stocked products have no stock to take the quantity out of, the purchase
+        only requires the product to be active.
+
+        param: quantity_to_purchase (int): The quantity of the product to be purchased.
+
+        :return: (tuple) A tuple containing the purchase message and whether the
+                    quantity was purchased (False if the product is disabled).
+        """
         if self.active:
-            if self.promotion:
-                total_price = self.promotion.apply_promotion(self, quantity_to_purchase)
-            else:
-                total_price = self.price * quantity_to_purchase
-            return f"Purchased {quantity_to_purchase} units of {self.name}.", total_price
+            return f"Purchased {quantity_to_purchase} units of {self.name}.", True
         return f"{self.name} is disabled right now, call the customer services to activate it.", \
-            total_price
+            False
 
 
 class LimitedProduct(Product):
@@ -278,10 +426,33 @@ class LimitedProduct(Product):
 
     limit (int): The maximum allowed quantity for this product.
     """
+    __slots__ = ("_limit",)
+
     def __init__(self, name, price, quantity, limit):
         super().__init__(name, price, quantity)
         self.limit = limit
 
+    @property
+    def limit(self):
+        """
+        Getter method for retrieving the per order limit of the product.
+
+        :return: (int) The maximum quantity allowed per order.
+        """
+        return self._limit
+
+    @limit.setter
+    def limit(self, value):
+        """
+        Setter method for updating the per order limit of the product, the owning store
+        is notified of the change.
+
+        :param value: (int) The new maximum quantity allowed per order.
+        """
+        self._limit = value
+        if self._store is not None:
+            self._store.on_promotion_changed(self)
+
     def __str__(self):
         """
 		Return a string representation of the product.
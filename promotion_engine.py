@@ -0,0 +1,435 @@
+"""
+promotion_engine.py - Module file containing the promotion rule engine
+
+This module lets several promotion rules apply to the same product. Every rule works out
+the number of units paid for a quantity, as the discount factor of a Promotion does, and
+the rules of a product are stacked by multiplying their discount ratios: 30% off on top
+of "second item at half price" makes two items cost 2 * 0.75 * 0.7 units.
+
+The rules of a product are tried from the highest priority down, a rule marked stop
+ends the stack whenever it discounts the quantity. Every distinct stack of rules is
+compiled once into a CompiledPromotion, a Promotion that prices the small quantities
+from a precomputed table of exact fractions, so the pricing of an order line is a list
+lookup and one integer division. The products
+sharing a stack share its CompiledPromotion, so price_lines still prices them in one batch.
+
+When a rule is changed, attached or detached, only the stacks holding the rule are
+compiled again and only the products whose stack changed are given a new promotion.
+
+Classes:
+    Rule: The base class of the promotion rules.
+    PercentOff: A percentage off every item.
+    BuyNGetM: Buy some items, get some more for free.
+    NthItemDiscount: A percentage off every nth item.
+    QuantityTiers: A percentage off depending on the quantity bought.
+    CompiledPromotion: A Promotion applying a stack of rules.
+    PromotionEngine: Assigns rules to products and keeps their promotions compiled.
+
+Functions:
+    evaluate_rules: Stacks rules for a quantity.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from products import Product
+from promotions import Promotion
+from money import ROUND_HALF_UP, as_fraction
+
+# The quantities priced from the table of a CompiledPromotion, larger quantities are
+# priced by evaluating the rules
+TABLE_SIZE = 64
+
+
+class Rule(ABC):
+    """
+    The base class of the promotion rules.
+
+    Attributes:
+        name (str): The name of the rule.
+        priority (int): The rules of a product apply from the highest priority down.
+        stop (bool): Whether the lower priority rules are skipped when this rule
+                     discounts the quantity.
+    """
+    def __init__(self, name: str, priority: int = 0, stop: bool = False):
+        """
+        Initializes a rule.
+
+        :param name: (str) The name of the rule.
+        :param priority: (int) The priority of the rule.
+        :param stop: (bool) Whether the rule ends the stack when it applies.
+        """
+        self.name = name
+        self.priority = priority
+        self.stop = stop
+
+    def validate(self):
+        """
+        Checks the parameters of the rule, it is called on creation and by
+        PromotionEngine.update_rule.
+
+        Raises:
+            ValueError: If a parameter of the rule is out of range.
+        """
+
+    @abstractmethod
+    def calculate_discount_factor(self, quantity: int) -> float:
+        """
+        :param quantity: (int) The quantity bought.
+        :return: (float) The number of units paid for the quantity.
+        """
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class PercentOff(Rule):
+    """
+    A percentage off every item.
+
+    Attributes:
+        percent (float): The percentage of discount.
+    """
+    def __init__(self, name: str, percent: float, priority: int = 0, stop: bool = False):
+        """
+        Initializes the rule.
+
+        :param name: (str) The name of the rule.
+        :param percent: (float) The percentage of discount.
+        :param priority: (int) The priority of the rule.
+        :param stop: (bool) Whether the rule ends the stack when it applies.
+
+        Raises:
+            ValueError: If percent is not between 0 and 100.
+        """
+        super().__init__(name, priority, stop)
+        self.percent = percent
+        self.validate()
+
+    def validate(self):
+        if not 0 <= self.percent <= 100:
+            raise ValueError("A PercentOff rule needs a percent between 0 and 100.")
+
+    def calculate_discount_factor(self, quantity: int) -> float:
+        return (100 - self.percent) / 100.0 * quantity
+
+
+class BuyNGetM(Rule):
+    """
+    Buy some items, get some more for free: of every group of buy + free items, only
+    buy items are paid.
+
+    Attributes:
+        buy (int): The number of items paid in a group.
+        free (int): The number of free items in a group.
+    """
+    def __init__(self, name: str, buy: int, free: int, priority: int = 0, stop: bool = False):
+        """
+        Initializes the rule.
+
+        :param name: (str) The name of the rule.
+        :param buy: (int) The number of items paid in a group.
+        :param free: (int) The number of free items in a group.
+        :param priority: (int) The priority of the rule.
+        :param stop: (bool) Whether the rule ends the stack when it applies.
+
+        Raises:
+            ValueError: If buy is not positive or free is negative.
+        """
+        super().__init__(name, priority, stop)
+        self.buy = buy
+        self.free = free
+        self.validate()
+
+    def validate(self):
+        if self.buy < 1 or self.free < 0:
+            raise ValueError("A BuyNGetM rule needs a positive buy and a non-negative free.")
+
+    def calculate_discount_factor(self, quantity: int) -> float:
+        return quantity - quantity // (self.buy + self.free) * self.free
+
+
+class NthItemDiscount(Rule):
+    """
+    A percentage off every nth item, such as every second item at half price.
+
+    Attributes:
+        nth (int): The rank of the discounted items.
+        percent (float): The percentage of discount of the discounted items.
+    """
+    def __init__(self, name: str, nth: int = 2, percent: float = 50, priority: int = 0,
+                 stop: bool = False):
+        """
+        Initializes the rule.
+
+        :param name: (str) The name of the rule.
+        :param nth: (int) The rank of the discounted items.
+        :param percent: (float) The percentage of discount of the discounted items.
+        :param priority: (int) The priority of the rule.
+        :param stop: (bool) Whether the rule ends the stack when it applies.
+
+        Raises:
+            ValueError: If nth is not positive or percent is not between 0 and 100.
+        """
+        super().__init__(name, priority, stop)
+        self.nth = nth
+        self.percent = percent
+        self.validate()
+
+    def validate(self):
+        if self.nth < 1:
+            raise ValueError("An NthItemDiscount rule needs a positive nth.")
+        if not 0 <= self.percent <= 100:
+            raise ValueError("An NthItemDiscount rule needs a percent between 0 and 100.")
+
+    def calculate_discount_factor(self, quantity: int) -> float:
+        return quantity - quantity // self.nth * self.percent / 100.0
+
+
+class QuantityTiers(Rule):
+    """
+    A percentage off every item depending on the quantity bought, the highest tier
+    reached applies.
+
+    Attributes:
+        tiers (Dict[int, float]): The percentage of discount by minimum quantity.
+    """
+    def __init__(self, name: str, tiers: Dict[int, float], priority: int = 0,
+                 stop: bool = False):
+        """
+        Initializes the rule.
+
+        :param name: (str) The name of the rule.
+        :param tiers: (Dict[int, float]) The percentage of discount by minimum quantity,
+                      such as {10: 5, 50: 10}.
+        :param priority: (int) The priority of the rule.
+        :param stop: (bool) Whether the rule ends the stack when it applies.
+
+        Raises:
+            ValueError: If a percentage is not between 0 and 100.
+        """
+        super().__init__(name, priority, stop)
+        self.tiers = dict(tiers)
+        self.validate()
+
+    def validate(self):
+        if not all(0 <= percent <= 100 for percent in self.tiers.values()):
+            raise ValueError("A QuantityTiers rule needs percentages between 0 and 100.")
+
+    def calculate_discount_factor(self, quantity: int) -> float:
+        percent = max((percent for minimum, percent in self.tiers.items() if quantity >= minimum),
+                      default=0)
+        return (100 - percent) / 100.0 * quantity
+
+
+def evaluate_rules(rules: Sequence[Rule], quantity: int) -> float:
+    """
+    Stacks rules for a quantity.
+
+    :param rules: (Sequence[Rule]) The rules, highest priority first.
+    :param quantity: (int) The quantity bought.
+    :return: (float) The number of units paid for the quantity.
+    """
+    if quantity <= 0:
+        return 0
+    paid = quantity
+    for rule in rules:
+        factor = rule.calculate_discount_factor(quantity)
+        paid = paid * factor / quantity
+        if rule.stop and factor < quantity:
+            break
+    return paid
+
+
+class CompiledPromotion(Promotion):
+    """
+    A Promotion applying a stack of rules.
+
+    Attributes:
+        name (str): The names of the rules, highest priority first.
+        rules (Tuple[Rule, ...]): The rules, highest priority first.
+    """
+    def __init__(self, rules: Sequence[Rule], rounding: str = ROUND_HALF_UP):
+        """
+        Compiles a stack of rules.
+
+        :param rules: (Sequence[Rule]) The rules, in any order.
+        :param rounding: (str) The rule rounding the price of a line to a cent.
+        """
+        super().__init__("", rounding)
+        self.rules: Tuple[Rule, ...] = ()
+        self._table: List[float] = []
+        self._fractions: List[Tuple[int, int]] = []
+        self.compile(rules)
+
+    def compile(self, rules: Sequence[Rule]):
+        """
+        Compiles the promotion again, after its rules or their parameters changed.
+
+        :param rules: (Sequence[Rule]) The rules, in any order.
+        """
+        # sorted is stable, the rules of the same priority keep the given order
+        self.rules = tuple(sorted(rules, key=lambda rule: -rule.priority))
+        self.name = " + ".join(rule.name for rule in self.rules)
+        self._table = [evaluate_rules(self.rules, quantity) for quantity in range(TABLE_SIZE)]
+        self._fractions = [as_fraction(factor) for factor in self._table]
+
+    def calculate_discount_factor(self, product, quantity):
+        """
+        Calculates the number of units paid for a quantity of a product.
+
+        :param product: (Product): The product to apply the promotion to, not used.
+        :param quantity: (int): The quantity of the product.
+        :return: float: The discount factor to apply to the product.
+        """
+        if 0 <= quantity < TABLE_SIZE:
+            return self._table[quantity]
+        return evaluate_rules(self.rules, quantity)
+
+    def calculate_discount_factors(self, quantities: Sequence[int]) -> List[float]:
+        """
+        Calculates the numbers of units paid for many quantities.
+
+        :param quantities: (Sequence[int]): The quantities.
+        :return: List[float]: The discount factor of every quantity.
+        """
+        table = self._table
+        return [table[quantity] if 0 <= quantity < TABLE_SIZE
+                else evaluate_rules(self.rules, quantity) for quantity in quantities]
+
+    def calculate_discount_fraction(self, quantity: int) -> Tuple[int, int]:
+        """
+        Calculates the number of units paid for a quantity as an exact fraction.
+
+        :param quantity: (int): The quantity of the product.
+        :return: Tuple[int, int]: The numerator and the denominator of the factor.
+        """
+        if 0 <= quantity < TABLE_SIZE:
+            return self._fractions[quantity]
+        return as_fraction(evaluate_rules(self.rules, quantity))
+
+    def __reduce__(self):
+        # the table is compiled again rather than copied
+        return CompiledPromotion, (self.rules, self.rounding)
+
+
+class PromotionEngine:
+    """
+    Assigns rules to products and keeps the promotions of the products compiled.
+
+    The products are given a CompiledPromotion through set_promotion, so they are priced
+    by the usual Product.buy, Product.quote and price_lines. The products with the same
+    rules share the same CompiledPromotion.
+    """
+    def __init__(self):
+        """
+        Initializes an engine without rules.
+        """
+        # id(product) -> (product, rules in attachment order)
+        self._products: Dict[int, Tuple[Product, List[Rule]]] = {}
+        # rule ids of a stack -> its promotion, its rules in attachment order and its
+        # products by id
+        self._stacks: Dict[Tuple[int, ...],
+                           Tuple[CompiledPromotion, List[Rule], Dict[int, Product]]] = {}
+
+    @property
+    def promotions(self) -> Dict[str, CompiledPromotion]:
+        """
+        :return: (Dict[str, CompiledPromotion]) The compiled promotions by name, as
+                 expected by persistence and sharding.
+        """
+        return {promotion.name: promotion for promotion, _, _ in self._stacks.values()}
+
+    def rules_of(self, product: Product) -> List[Rule]:
+        """
+        :param product: (Product) A product.
+        :return: (List[Rule]) The rules attached to the product, in attachment order.
+        """
+        entry = self._products.get(id(product))
+        return list(entry[1]) if entry is not None else []
+
+    def attach(self, rule: Rule, products: Iterable[Product]):
+        """
+        Attaches a rule to products, the rule is stacked with their other rules.
+
+        :param rule: (Rule) The rule.
+        :param products: (Iterable[Product]) The products.
+        """
+        for product in products:
+            _, rules = self._products.get(id(product), (product, []))
+            if not any(attached is rule for attached in rules):
+                self._assign(product, rules + [rule])
+
+    def detach(self, rule: Rule, products: Optional[Iterable[Product]] = None):
+        """
+        Detaches a rule from products.
+
+        :param rule: (Rule) The rule.
+        :param products: (Iterable[Product], optional) The products, all the products of
+                         the rule if not given.
+        """
+        if products is None:
+            products = [product for product, rules in self._products.values()
+                        if any(attached is rule for attached in rules)]
+        for product in products:
+            entry = self._products.get(id(product))
+            if entry is not None:
+                self._assign(product, [attached for attached in entry[1] if attached is not rule])
+
+    def update_rule(self, rule: Rule, **attributes):
+        """
+        Changes the parameters of a rule, such as its percent or its priority, and
+        compiles again the promotions of the products holding it.
+
+        :param rule: (Rule) The rule.
+        :param attributes: The new values of the attributes of the rule.
+
+        Raises:
+            ValueError: If the rule has no such attribute, or a new value is out of range,
+                        the rule is then left unchanged.
+        """
+        for attribute in attributes:
+            if not hasattr(rule, attribute):
+                raise ValueError(f"{type(rule).__name__} has no attribute {attribute!r}")
+        previous = {attribute: getattr(rule, attribute) for attribute in attributes}
+        for attribute, value in attributes.items():
+            setattr(rule, attribute, value)
+        try:
+            rule.validate()
+        except ValueError:
+            for attribute, value in previous.items():
+                setattr(rule, attribute, value)
+            raise
+        for key, (promotion, rules, products) in self._stacks.items():
+            if id(rule) in key:
+                name = promotion.name
+                promotion.compile(rules)
+                if promotion.name != name:
+                    # the listings of the stores show the promotion names
+                    for product in products.values():
+                        product.set_promotion(promotion)
+
+    def _assign(self, product: Product, rules: List[Rule]):
+        """
+        Moves a product to the stack of its new rules.
+
+        :param product: (Product) The product.
+        :param rules: (List[Rule]) Its rules, in attachment order.
+        """
+        entry = self._products.get(id(product))
+        if entry is not None:
+            old_key = tuple(id(rule) for rule in entry[1])
+            _, _, members = self._stacks[old_key]
+            del members[id(product)]
+            if not members:
+                del self._stacks[old_key]
+        if not rules:
+            del self._products[id(product)]
+            product.set_promotion(None)
+            return
+        self._products[id(product)] = (product, rules)
+        key = tuple(id(rule) for rule in rules)
+        if key not in self._stacks:
+            self._stacks[key] = (CompiledPromotion(rules), rules, {})
+        promotion, _, members = self._stacks[key]
+        members[id(product)] = product
+        product.set_promotion(promotion)
@@ -8,6 +8,11 @@ Module Contents:
     - SecondHalfPrice: A promotion that offers a "buy one, get the second at half price" discount.
     - ThirdOneFree: A promotion that offers a "buy two, get one free" discount.
     - PercentDiscount: A promotion that applies a percentage discount.
+    - price_lines: Prices many order lines at once, one batch per promotion.
+    - price_lines_cents: Prices many order lines at once in cents.
+
+The promotions price in integer cents: every promotion gives the number of units paid as
+an exact fraction, and rounds the price of a line once, to a cent, with its rounding rule.
 
 Author:
     Salman Farhat
@@ -17,7 +22,10 @@ Date:
 """
 
 from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence, Tuple
 from products import Product
+from money import (ROUND_HALF_UP, ROUNDING_RULES, to_cents, to_amount, divide, divide_all,
+                   as_fraction)
 
 
 class Promotion(ABC):
@@ -26,19 +34,33 @@ class Promotion(ABC):
 
       Attributes:
         name (str): The name of the promotion.
+        rounding (str): The rule rounding the price of a line to a cent, see money.
 
     Methods:
         apply_promotion(product, quantity): Applies the promotion to a product with the given quantity.
         calculate_discount_factor(product, quantity): Abstract method to calculate the
         discount factor for the promotion.
+        calculate_discount_factors(quantities): Calculates the discount factors of many quantities.
+        calculate_discount_fraction(quantity): Calculates the exact discount factor.
+        apply_promotion_batch(prices, quantities): Applies the promotion to many lines at once.
+        apply_promotion_cents(price_cents, quantity): Applies the promotion in cents.
+        apply_promotion_batch_cents(prices_cents, quantities): Applies the promotion to many
+        lines at once in cents.
     """
-    def __init__(self, name):
+    def __init__(self, name, rounding=ROUND_HALF_UP):
         """
         Initializes a new instance of the Promotion class.
 
         :param name: (str): The name of the promotion.
+        :param rounding: (str): The rule rounding the price of a line to a cent.
+
+        Raises:
+            ValueError: If the rounding rule is unknown.
         """
+        if rounding not in ROUNDING_RULES:
+            raise ValueError(f"Unknown rounding rule {rounding!r}")
         self.name = name
+        self.rounding = rounding
 
     @abstractmethod
     def calculate_discount_factor(self, product, quantity):
@@ -61,10 +83,69 @@ class Promotion(ABC):
 
         :return: float: The discounted price after applying the promotion.
         """
-        items_to_pay_factor = self.calculate_discount_factor(product, quantity)
-        discounted_price = product.price * items_to_pay_factor  # (1 - discount)
+        return to_amount(self.apply_promotion_cents(product.price_cents, quantity))
+
+    def calculate_discount_fraction(self, quantity: int) -> Tuple[int, int]:
+        """
+        Calculates the discount factor of a quantity as an exact fraction.
+
+        The subclasses override it with their exact discount, this default takes the
+        fraction of calculate_discount_factor.
+
+        :param quantity: (int): The quantity of the product.
+        :return: Tuple[int, int]: The numerator and the denominator of the factor.
+        """
+        return as_fraction(self.calculate_discount_factor(None, quantity))
+
+    def apply_promotion_cents(self, price_cents: int, quantity: int) -> int:
+        """
+        Applies the promotion to a quantity of a product priced in cents.
 
-        return discounted_price
+        :param price_cents: (int): The unit price in cents.
+        :param quantity: (int): The quantity of the product.
+        :return: int: The discounted price in cents, rounded with the rounding rule.
+        """
+        numerator, denominator = self.calculate_discount_fraction(quantity)
+        return divide(price_cents * numerator, denominator, self.rounding)
+
+    def apply_promotion_batch_cents(self, prices_cents: Sequence[int],
+                                    quantities: Sequence[int]) -> List[int]:
+        """
+        Applies the promotion to many lines priced in cents at once.
+
+        :param prices_cents: (Sequence[int]): The unit price of every line in cents.
+        :param quantities: (Sequence[int]): The quantity of every line.
+        :return: List[int]: The discounted price of every line in cents.
+        """
+        rounding = self.rounding
+        fractions = map(self.calculate_discount_fraction, quantities)
+        return [divide(price * numerator, denominator, rounding)
+                for price, (numerator, denominator) in zip(prices_cents, fractions)]
+
+    def calculate_discount_factors(self, quantities: Sequence[int]) -> List[float]:
+        """
+        Calculates the discount factors of many quantities in one pass.
+
+        The subclasses override it with the closed form of their discount, this default
+        falls back to calculate_discount_factor for every quantity.
+
+        :param quantities: (Sequence[int]): The quantities.
+        :return: List[float]: The discount factor of every quantity.
+        """
+        return [self.calculate_discount_factor(None, quantity) for quantity in quantities]
+
+    def apply_promotion_batch(self, prices: Sequence[float],
+                              quantities: Sequence[int]) -> List[float]:
+        """
+        Applies the promotion to many lines at once.
+
+        :param prices: (Sequence[float]): The unit price of every line.
+        :param quantities: (Sequence[int]): The quantity of every line.
+
+        :return: List[float]: The discounted price of every line.
+        """
+        return [total / 100 for total in
+                self.apply_promotion_batch_cents(list(map(to_cents, prices)), quantities)]
 
 
 class SecondHalfPrice(Promotion):
@@ -76,13 +157,14 @@ class SecondHalfPrice(Promotion):
     Methods:
         calculate_discount_factor(product, quantity): Calculates the discount factor for the promotion.
     """
-    def __init__(self, name):
+    def __init__(self, name, rounding=ROUND_HALF_UP):
         """
         Initializes a new instance of the SecondHalfPrice class.
 
         :param name: (str): The name of the promotion.
+        :param rounding: (str): The rule rounding the price of a line to a cent.
         """
-        super().__init__(name)
+        super().__init__(name, rounding)
 
     def calculate_discount_factor(self, product, quantity):
         """
@@ -98,6 +180,36 @@ class SecondHalfPrice(Promotion):
         items_to_pay_factor = (items_to_pay_full_price + (items_to_pay_half_price * 0.5)) # / quantity
         return items_to_pay_factor
 
+    def calculate_discount_factors(self, quantities: Sequence[int]) -> List[float]:
+        """
+        Calculates the discount factors of many quantities for the SecondHalfPrice promotion.
+
+        :param quantities: (Sequence[int]): The quantities.
+        :return: List[float]: The discount factor of every quantity.
+        """
+        return [(quantity - quantity // 2) + (quantity // 2) * 0.5 for quantity in quantities]
+
+    def calculate_discount_fraction(self, quantity: int) -> Tuple[int, int]:
+        """
+        Calculates the exact discount factor for the SecondHalfPrice promotion, in halves.
+
+        :param quantity: (int): The quantity of the product.
+        :return: Tuple[int, int]: The numerator and the denominator of the factor.
+        """
+        return 2 * quantity - quantity // 2, 2
+
+    def apply_promotion_batch_cents(self, prices_cents: Sequence[int],
+                                    quantities: Sequence[int]) -> List[int]:
+        """
+        Applies the SecondHalfPrice promotion to many lines priced in cents at once.
+
+        :param prices_cents: (Sequence[int]): The unit price of every line in cents.
+        :param quantities: (Sequence[int]): The quantity of every line.
+        :return: List[int]: The discounted price of every line in cents.
+        """
+        return divide_all([price * (2 * quantity - quantity // 2)
+                           for price, quantity in zip(prices_cents, quantities)], 2, self.rounding)
+
 
 class ThirdOneFree(Promotion):
     """
@@ -109,13 +221,14 @@ class ThirdOneFree(Promotion):
     Methods:
         calculate_discount_factor(product, quantity): Calculates the discount factor for the promotion.
     """
-    def __init__(self, name):
+    def __init__(self, name, rounding=ROUND_HALF_UP):
         """
         Initializes a new instance of the ThirdOneFree class.
 
         :param name: (str): The name of the promotion.
+        :param rounding: (str): The rule rounding the price of a line to a cent.
         """
-        super().__init__(name)
+        super().__init__(name, rounding)
 
     def calculate_discount_factor(self, product, quantity):
         """
@@ -129,6 +242,38 @@ class ThirdOneFree(Promotion):
         items_to_pay = quantity - (quantity // 3)
         return items_to_pay
 
+    def calculate_discount_factors(self, quantities: Sequence[int]) -> List[float]:
+        """
+        Calculates the discount factors of many quantities for the ThirdOneFree promotion.
+
+        :param quantities: (Sequence[int]): The quantities.
+        :return: List[float]: The discount factor of every quantity.
+        """
+        return [quantity - quantity // 3 for quantity in quantities]
+
+    def calculate_discount_fraction(self, quantity: int) -> Tuple[int, int]:
+        """
+        Calculates the exact discount factor for the ThirdOneFree promotion, a whole
+        number of items.
+
+        :param quantity: (int): The quantity of the product.
+        :return: Tuple[int, int]: The numerator and the denominator of the factor.
+        """
+        return quantity - quantity // 3, 1
+
+    def apply_promotion_batch_cents(self, prices_cents: Sequence[int],
+                                    quantities: Sequence[int]) -> List[int]:
+        """
+        Applies the ThirdOneFree promotion to many lines priced in cents at once, no
+        rounding is needed.
+
+        :param prices_cents: (Sequence[int]): The unit price of every line in cents.
+        :param quantities: (Sequence[int]): The quantity of every line.
+        :return: List[int]: The discounted price of every line in cents.
+        """
+        return [price * (quantity - quantity // 3)
+                for price, quantity in zip(prices_cents, quantities)]
+
 class PercentDiscount(Promotion):
     """
     A class representing a promotion that applies a percentage discount.
@@ -140,15 +285,29 @@ class PercentDiscount(Promotion):
     Methods:
         calculate_discount_factor(product, quantity): Calculates the discount factor for the promotion.
     """
-    def __init__(self, name, percent):
+    def __init__(self, name, percent, rounding=ROUND_HALF_UP):
         """
         Initializes a new instance of the ThirdOneFree class.
 
         :param name: (str): The name of the promotion.
         :param percent: (float): The percentage of discount to apply.
+        :param rounding: (str): The rule rounding the price of a line to a cent.
         """
-        super().__init__(name)
+        super().__init__(name, rounding)
         self.percent = percent
+        # the exact fraction of the price paid, worked out again when percent changes
+        self._paid = (None, 1, 1)
+
+    def _paid_fraction(self) -> Tuple[int, int]:
+        """
+        :return: Tuple[int, int]: The exact fraction of the price paid, (100 - percent) / 100.
+        """
+        percent, numerator, denominator = self._paid
+        if percent != self.percent:
+            numerator, denominator = as_fraction(self.percent)
+            numerator, denominator = 100 * denominator - numerator, 100 * denominator
+            self._paid = (self.percent, numerator, denominator)
+        return numerator, denominator
 
     def calculate_discount_factor(self, product, quantity):
         """
@@ -163,3 +322,73 @@ class PercentDiscount(Promotion):
         items_to_pay_factor = (100 - self.percent) / 100.0 * quantity
         return items_to_pay_factor
 
+    def calculate_discount_factors(self, quantities: Sequence[int]) -> List[float]:
+        """
+        Calculates the discount factors of many quantities for the PercentDiscount promotion.
+
+        :param quantities: (Sequence[int]): The quantities.
+        :return: List[float]: The discount factor of every quantity.
+        """
+        factor = (100 - self.percent) / 100.0
+        return [factor * quantity for quantity in quantities]
+
+    def calculate_discount_fraction(self, quantity: int) -> Tuple[int, int]:
+        """
+        Calculates the exact discount factor for the PercentDiscount promotion.
+
+        :param quantity: (int): The quantity of the product.
+        :return: Tuple[int, int]: The numerator and the denominator of the factor.
+        """
+        numerator, denominator = self._paid_fraction()
+        return numerator * quantity, denominator
+
+    def apply_promotion_batch_cents(self, prices_cents: Sequence[int],
+                                    quantities: Sequence[int]) -> List[int]:
+        """
+        Applies the PercentDiscount promotion to many lines priced in cents at once.
+
+        :param prices_cents: (Sequence[int]): The unit price of every line in cents.
+        :param quantities: (Sequence[int]): The quantity of every line.
+        :return: List[int]: The discounted price of every line in cents.
+        """
+        numerator, denominator = self._paid_fraction()
+        return divide_all([price * quantity * numerator
+                           for price, quantity in zip(prices_cents, quantities)],
+                          denominator, self.rounding)
+
+
+def price_lines(lines: Sequence[Tuple[Product, int]]) -> List[float]:
+    """
+    Prices many order lines at once.
+
+    :param lines: (Sequence[Tuple[Product, int]]): The (product, quantity) lines to price.
+    :return: List[float]: The price of every line, in the order of the lines.
+    """
+    return [to_amount(total) for total in price_lines_cents(lines)]
+
+
+def price_lines_cents(lines: Sequence[Tuple[Product, int]]) -> List[int]:
+    """
+    Prices many order lines at once, in cents.
+
+    The lines are grouped by promotion and every group is priced in a single
+    apply_promotion_batch_cents call, the lines without a promotion are priced at full price.
+
+    :param lines: (Sequence[Tuple[Product, int]]): The (product, quantity) lines to price.
+    :return: List[int]: The price of every line in cents, in the order of the lines.
+    """
+    totals = [0] * len(lines)
+    groups: Dict[int, Tuple[Promotion, List[int]]] = {}
+    for index, (product, quantity) in enumerate(lines):
+        promotion = product.promotion
+        if promotion is None:
+            totals[index] = product.price_cents * quantity
+        else:
+            groups.setdefault(id(promotion), (promotion, []))[1].append(index)
+
+    for promotion, indexes in groups.values():
+        prices = [lines[index][0].price_cents for index in indexes]
+        quantities = [lines[index][1] for index in indexes]
+        for index, total in zip(indexes, promotion.apply_promotion_batch_cents(prices, quantities)):
+            totals[index] = total
+    return totals
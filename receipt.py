@@ -0,0 +1,77 @@
+"""
+receipt.py - Module file containing the Receipt class
+
+This module defines the Receipt class, the structured result of a confirmed order:
+the order ID, the purchased lines with their prices and the total price. The prices are
+float amounts worked out from integer cents, their cents are exact.
+
+Classes:
+    ReceiptLine: A purchased line of an order.
+    Receipt: A class representing the receipt of a confirmed order.
+"""
+
+from typing import Iterator, List, Optional, Tuple
+from money import to_cents
+
+
+class ReceiptLine:
+    """
+    A purchased line of an order.
+
+    Attributes:
+        product_name (str): The name of the purchased product.
+        quantity (int): The purchased quantity.
+        unit_price (float): The unit price of the product at the time of the order.
+        promotion_name (str): The name of the promotion applied, None if there was none.
+        line_total (float): The price of the line, promotion included.
+    """
+    def __init__(self, product_name: str, quantity: int, unit_price: float,
+                 promotion_name: Optional[str], line_total: float):
+        self.product_name = product_name
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.promotion_name = promotion_name
+        self.line_total = line_total
+
+    @property
+    def line_total_cents(self) -> int:
+        return to_cents(self.line_total)
+
+    def __repr__(self):
+        return f"ReceiptLine({self.product_name!r}, {self.quantity}, {self.unit_price}, " \
+               f"{self.promotion_name!r}, {self.line_total})"
+
+
+class Receipt:
+    """
+    A class representing the receipt of a confirmed order.
+
+    Attributes:
+        order_id (str): The ID of the order.
+        lines (List[ReceiptLine]): The purchased lines.
+        total (float): The total price of the order.
+    """
+    def __init__(self, order_id: str, lines: List[ReceiptLine], total: float):
+        self.order_id = order_id
+        self.lines = lines
+        self.total = total
+
+    @property
+    def total_cents(self) -> int:
+        return to_cents(self.total)
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        """
+        Iterates over the receipt as (product name, quantity) tuples, like an order list.
+        """
+        for line in self.lines:
+            yield line.product_name, line.quantity
+
+    def __len__(self) -> int:
+        """
+        :return: (int) The number of purchased lines.
+        """
+        return len(self.lines)
+
+    def __repr__(self):
+        return f"Receipt({self.order_id!r}, {self.lines!r}, {self.total})"
@@ -0,0 +1,197 @@
+"""
+reservations.py - Module file containing the stock reservations of the carts
+
+This module defines the ReservationBook class, which holds stock for the carts being
+filled. Adding a product to a cart places a hold on the quantity of its line, the holds
+of the other carts are not available to a cart or to an order, and checkout turns the
+holds of the cart into a sale.
+
+The holds of a cart expire together, a given time after the cart was last touched. The
+carts are kept in a heap ordered by expiry time, so reclaiming the expired holds only
+pops the expired carts and never scans the live ones. A cart touched again is pushed
+again, its outdated entry is skipped when it reaches the top of the heap.
+
+Classes:
+    ReservationBook: The holds of the carts of a store.
+"""
+
+import heapq
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from products import Product, NonStockedProduct
+
+
+class ReservationBook:
+    """
+    The holds of the carts of a store.
+
+    Attributes:
+        ttl (float): The seconds a cart keeps its holds after it was last touched.
+    """
+    def __init__(self, store, ttl: float = 900.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Initializes the reservations of a store, the store checks them from then on.
+
+        :param store: (Store) The store.
+        :param ttl: (float) The seconds a cart keeps its holds after it was last touched.
+        :param clock: Returns the current time in seconds.
+
+        Raises:
+            ValueError: If the ttl is not positive.
+        """
+        if ttl <= 0:
+            raise ValueError("The ttl of the reservations must be positive.")
+        self.ttl = ttl
+        self._store = store
+        self._clock = clock
+        self._lock = threading.Lock()
+        # cart id -> product name -> (product, held quantity)
+        self._holds: Dict[int, Dict[str, Tuple[Product, int]]] = {}
+        # product name -> quantity held by all the carts
+        self._held: Dict[str, int] = {}
+        # cart id -> expiry time, and the (expiry time, cart id) heap of the carts
+        self._expiry: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+        store.reservations = self
+
+    def reserve(self, cart_id: int, product: Product, quantity: int) -> int:
+        """
+        Sets the quantity of a product held by a cart, and restarts the ttl of the cart.
+
+        :param cart_id: (int) The ID of the cart.
+        :param product: (Product) The product.
+        :param quantity: (int) The quantity the cart holds from now on, 0 to release it.
+        :return: (int) The quantity missing, 0 if the hold was placed. The previous
+                 hold is kept when a quantity is missing.
+        """
+        with self._store.locked_products([product]):
+            with self._lock:
+                self._expire(self._clock())
+                if not isinstance(product, NonStockedProduct):
+                    missing = quantity - self._available(product, cart_id)
+                    if missing > 0:
+                        return missing
+                self._set_hold(cart_id, product, quantity)
+                if cart_id in self._holds:
+                    self._touch(cart_id)
+        return 0
+
+    def release(self, cart_id: int):
+        """
+        Releases all the holds of a cart.
+
+        :param cart_id: (int) The ID of the cart.
+        """
+        with self._lock:
+            self._release(cart_id)
+
+    def held(self, product: Product) -> int:
+        """
+        :param product: (Product) A product.
+        :return: (int) The quantity of the product held by the live carts.
+        """
+        with self._lock:
+            self._expire(self._clock())
+            return self._held.get(product.name, 0)
+
+    def held_by(self, cart_id: int) -> Dict[str, int]:
+        """
+        :param cart_id: (int) The ID of a cart.
+        :return: (Dict[str, int]) The quantities held by the cart by product name, empty
+                 once the holds expired.
+        """
+        with self._lock:
+            self._expire(self._clock())
+            return {product.name: quantity
+                    for product, quantity in self._holds.get(cart_id, {}).values()}
+
+    def available(self, product: Product, cart_id: Optional[int] = None) -> int:
+        """
+        :param product: (Product) A product.
+        :param cart_id: (int, optional) The ID of the cart asking, its own holds count as
+                        available to it.
+        :return: (int) The quantity on hand minus the quantity held by the other carts.
+        """
+        with self._lock:
+            self._expire(self._clock())
+            return self._available(product, cart_id)
+
+    def expire(self) -> int:
+        """
+        Releases the holds of the carts whose ttl ran out. The reservations do it on
+        every call, a timer may call it too so the stock comes back to the listings.
+
+        :return: (int) The number of carts released.
+        """
+        with self._lock:
+            return self._expire(self._clock())
+
+    def __len__(self) -> int:
+        """
+        :return: (int) The number of carts holding stock.
+        """
+        return len(self._holds)
+
+    def _available(self, product: Product, cart_id: Optional[int]) -> int:
+        """
+        The quantity of a product available to a cart, the lock must be held.
+        """
+        held = self._held.get(product.name, 0)
+        if cart_id is not None:
+            held -= self._holds.get(cart_id, {}).get(product.name, (None, 0))[1]
+        return max(product.quantity - held, 0)
+
+    def _set_hold(self, cart_id: int, product: Product, quantity: int):
+        """
+        Sets the quantity of a product held by a cart, the lock must be held.
+        """
+        holds = self._holds.setdefault(cart_id, {})
+        _, previous = holds.pop(product.name, (None, 0))
+        if quantity > 0:
+            holds[product.name] = (product, quantity)
+        if not holds:
+            del self._holds[cart_id]
+            self._expiry.pop(cart_id, None)
+        total = self._held.get(product.name, 0) + quantity - previous
+        if total:
+            self._held[product.name] = total
+        else:
+            self._held.pop(product.name, None)
+
+    def _release(self, cart_id: int):
+        """
+        Releases all the holds of a cart, the lock must be held.
+        """
+        for product, quantity in self._holds.pop(cart_id, {}).values():
+            total = self._held[product.name] - quantity
+            if total:
+                self._held[product.name] = total
+            else:
+                del self._held[product.name]
+        self._expiry.pop(cart_id, None)
+
+    def _touch(self, cart_id: int):
+        """
+        Restarts the ttl of a cart, the lock must be held.
+        """
+        expires_at = self._clock() + self.ttl
+        self._expiry[cart_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, cart_id))
+        # drop the outdated entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._expiry) + 64:
+            self._heap = [(expiry, cart) for cart, expiry in self._expiry.items()]
+            heapq.heapify(self._heap)
+
+    def _expire(self, now: float) -> int:
+        """
+        Releases the carts whose ttl ran out, the lock must be held.
+        """
+        released = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, cart_id = heapq.heappop(heap)
+            if self._expiry.get(cart_id) == expires_at:
+                self._release(cart_id)
+                released += 1
+        return released
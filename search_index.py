@@ -0,0 +1,411 @@
+"""
+search_index.py - Module file containing the product name search index
+
+This module defines the SearchIndex class, which finds products from partial or
+misspelled names. The names are split into lower case words (tokens) and the index
+keeps:
+    - the sorted vocabulary of all the tokens, so the tokens starting with a prefix are a
+      contiguous range found by bisection (the sorted list plays the role of a trie);
+    - the products of every token (postings);
+    - the tokens of every trigram of the vocabulary, so the tokens close to a misspelled
+      word are found without comparing it to the whole vocabulary.
+
+A query matches a product when every query token is a prefix of one of the product's
+tokens (search), or is within a small edit distance of one of them (fuzzy_search). The
+products whose whole name starts with the query rank first, they are found by bisecting
+the sorted list of the names. The others rank by fewest typos, then shortest name, then
+catalog order. The postings are kept sorted in that static order, so a query walks the
+postings of its most selective token best first, checks the other tokens on the way and
+stops as soon as it holds enough results that nothing further can outrank.
+
+Classes:
+    SearchIndex: An index of product names for prefix and fuzzy search.
+
+Functions:
+    tokenize: Splits a product name or a query into tokens.
+    edit_distance: Computes the edit distance between two words, up to a bound.
+"""
+
+import heapq
+import re
+import string
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from products import Product
+
+# The trigrams shared by more tokens than this are skipped by the fuzzy search, they
+# are too common to narrow the candidates down
+MAX_GRAM_TOKENS = 20000
+# The number of closest vocabulary tokens checked for every misspelled query token
+MAX_FUZZY_TOKENS = 200
+# The query tokens up to this length share too few trigrams with their misspellings, their
+# single typo variants are looked up instead
+SHORT_TOKEN = 4
+_ALPHABET = string.ascii_lowercase + string.digits
+# A posting is the rank key of a product: the length of its name above the bits of its
+# document number, so the postings sort shortest name first, then by document number
+_NUMBER_BITS = 40
+_NUMBER_MASK = (1 << _NUMBER_BITS) - 1
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a product name or a query into lower case words.
+
+    :param text: (str) The text.
+    :return: (List[str]) The words of the text, in order.
+    """
+    return _WORD.findall(text.lower())
+
+
+def _trigrams(token: str) -> Set[str]:
+    """
+    :return: (Set[str]) The trigrams of a token, padded so that short tokens have some.
+    """
+    padded = f"^{token}$"
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def _single_edits(token: str) -> Set[str]:
+    """
+    :return: (Set[str]) The words one deletion, transposition, substitution or insertion
+             away from a token.
+    """
+    splits = [(token[:index], token[index:]) for index in range(len(token) + 1)]
+    edits = {left + right[1:] for left, right in splits if right}
+    edits.update(left + right[1] + right[0] + right[2:] for left, right in splits
+                 if len(right) > 1)
+    edits.update(left + char + right[1:] for left, right in splits if right for char in _ALPHABET)
+    edits.update(left + char + right for left, right in splits for char in _ALPHABET)
+    edits.discard(token)
+    return edits
+
+
+def edit_distance(first: str, second: str, bound: int) -> int:
+    """
+    Computes the edit distance between two words, up to a bound. The edits are the
+    insertion, deletion or substitution of a character and the transposition of two
+    adjacent characters.
+
+    :param first: (str) A word.
+    :param second: (str) Another word.
+    :param bound: (int) The largest distance of interest.
+    :return: (int) The distance, or bound + 1 if it is larger than the bound.
+    """
+    if abs(len(first) - len(second)) > bound:
+        return bound + 1
+    before_previous = None
+    previous = list(range(len(second) + 1))
+    for row in range(1, len(first) + 1):
+        current = [row]
+        for column in range(1, len(second) + 1):
+            distance = min(previous[column] + 1, current[column - 1] + 1,
+                           previous[column - 1] + (first[row - 1] != second[column - 1]))
+            if row > 1 and column > 1 and first[row - 1] == second[column - 2] \
+                    and first[row - 2] == second[column - 1]:
+                distance = min(distance, before_previous[column - 2] + 1)
+            current.append(distance)
+        if min(current) > bound:
+            return bound + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], bound + 1)
+
+
+class SearchIndex:
+    """
+    An index of product names for prefix and fuzzy search.
+
+    Every product is indexed under a document number, unique among the indexed products
+    and below 2 ** 40, which also orders the products of the same name length.
+    """
+    def __init__(self, documents: Iterable[Tuple[int, Product]] = ()):
+        """
+        Initializes the index.
+
+        :param documents: The (document number, product) pairs of the initial products.
+        """
+        self._documents: Dict[int, Tuple[Product, Tuple[str, ...], int]] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._names: List[Tuple[str, int]] = []
+        for number, product in documents:
+            self._index(number, product, append=True)
+        for postings in self._postings.values():
+            postings.sort()
+        self._names.sort()
+        self._vocabulary: List[str] = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, number: int) -> bool:
+        return number in self._documents
+
+    def _index(self, number: int, product: Product, append: bool = False) -> List[str]:
+        """
+        Indexes a product, without updating the vocabulary.
+
+        :param append: (bool) Whether the postings and names are appended, to be sorted
+                       by the caller, rather than inserted in order.
+        :return: (List[str]) The tokens new to the index.
+        """
+        tokens = tuple(tokenize(product.name))
+        name = " ".join(tokens)
+        key = (len(name) << _NUMBER_BITS) | number
+        self._documents[number] = (product, tokens, key)
+        new_tokens = []
+        for token in set(tokens):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = []
+                new_tokens.append(token)
+                for gram in _trigrams(token):
+                    self._grams.setdefault(gram, set()).add(token)
+            if append:
+                postings.append(key)
+            else:
+                insort(postings, key)
+        if append:
+            self._names.append((name, number))
+        else:
+            insort(self._names, (name, number))
+        return new_tokens
+
+    def add(self, number: int, product: Product):
+        """
+        Adds a product to the index, it replaces the product indexed under the same
+        document number.
+
+        :param number: (int) The document number of the product.
+        :param product: (Product) The product.
+        """
+        self.discard(number)
+        for token in self._index(number, product):
+            insort(self._vocabulary, token)
+
+    def discard(self, number: int):
+        """
+        Removes a product from the index, if it is indexed.
+
+        :param number: (int) The document number of the product.
+        """
+        document = self._documents.pop(number, None)
+        if document is None:
+            return
+        _, tokens, key = document
+        del self._names[bisect_left(self._names, (" ".join(tokens), number))]
+        for token in set(tokens):
+            postings = self._postings[token]
+            del postings[bisect_left(postings, key)]
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+                for gram in _trigrams(token):
+                    gram_tokens = self._grams[gram]
+                    gram_tokens.discard(token)
+                    if not gram_tokens:
+                        del self._grams[gram]
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        """
+        :return: (List[str]) The tokens of the vocabulary starting with a prefix.
+        """
+        start = bisect_left(self._vocabulary, prefix)
+        return self._vocabulary[start:bisect_left(self._vocabulary, prefix + "\U0010ffff", start)]
+
+    def _posting_count(self, tokens: Iterable[str], bound: int) -> int:
+        """
+        :return: (int) The number of postings of the tokens, counted up to a bound.
+        """
+        count = 0
+        for token in tokens:
+            count += len(self._postings[token])
+            if count > bound:
+                break
+        return count
+
+    def _walk(self, tokens: Iterable[str]) -> Iterator[int]:
+        """
+        Iterates over the documents of the tokens in rank order, without duplicates.
+
+        :return: An iterator over the document numbers.
+        """
+        last = None
+        for key in heapq.merge(*(self._postings[token] for token in tokens)):
+            if key != last:
+                last = key
+                yield key & _NUMBER_MASK
+
+    def _close_tokens(self, token: str, max_distance: int) -> Dict[str, int]:
+        """
+        Finds the vocabulary tokens within an edit distance of a token.
+
+        :return: (Dict[str, int]) The distance of every close token.
+        """
+        if len(token) <= SHORT_TOKEN or max_distance == 0:
+            close = {}
+            if max_distance > 0:
+                close = {variant: 1 for variant in _single_edits(token)
+                         if variant in self._postings}
+            if token in self._postings:
+                close[token] = 0
+            return close
+        grams = sorted(_trigrams(token), key=lambda gram: len(self._grams.get(gram, ())))
+        grams = [gram for gram in grams if gram in self._grams]
+        if not grams:
+            return {}
+        selective = [gram for gram in grams if len(self._grams[gram]) <= MAX_GRAM_TOKENS]
+        shared: Dict[str, int] = {}
+        for gram in selective or grams[:1]:
+            for candidate in self._grams[gram]:
+                shared[candidate] = shared.get(candidate, 0) + 1
+        candidates = heapq.nlargest(MAX_FUZZY_TOKENS, shared, key=shared.__getitem__)
+        close = {}
+        for candidate in candidates:
+            distance = edit_distance(token, candidate, max_distance)
+            if distance <= max_distance:
+                close[candidate] = distance
+        return close
+
+    def _starting_with(self, query: str, limit: int, active_only: bool) -> List[int]:
+        """
+        :return: (List[int]) The first documents, in name order, whose name starts with
+                 the query.
+        """
+        numbers = []
+        documents = self._documents
+        names = self._names
+        for position in range(bisect_left(names, (query,)), len(names)):
+            name, number = names[position]
+            if len(numbers) == limit or not name.startswith(query):
+                break
+            if not active_only or documents[number][0].is_active():
+                numbers.append(number)
+        return numbers
+
+    def search(self, query: str, limit: int = 10, active_only: bool = False) -> List[Product]:
+        """
+        Finds the products whose name has a word starting with every word of the query.
+
+        :param query: (str) The query, such as "macbook air" or "pix".
+        :param limit: (int) The largest number of results.
+        :param active_only: (bool) Whether inactive products are left out.
+        :return: (List[Product]) The best matching products, best first.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens or limit < 1:
+            return []
+        documents = self._documents
+        numbers = self._starting_with(" ".join(query_tokens), limit, active_only)
+        found = set(numbers)
+
+        # the walk follows the query token with the fewest postings
+        matching = [self._prefix_tokens(token) for token in query_tokens]
+        counts: List[int] = []
+        for tokens in matching:
+            counts.append(self._posting_count(tokens, min(counts, default=len(documents))))
+        driver = counts.index(min(counts))
+        # the other query tokens are checked against the sets of their vocabulary matches,
+        # or by prefix when they match too many tokens for a set
+        others = [set(matching[index]) if len(matching[index]) <= MAX_FUZZY_TOKENS else token
+                  for index, token in enumerate(query_tokens) if index != driver]
+
+        def has(tokens: Tuple[str, ...], other) -> bool:
+            if isinstance(other, set):
+                return not other.isdisjoint(tokens)
+            return any(token.startswith(other) for token in tokens)
+
+        if len(numbers) < limit:
+            for number in self._walk(matching[driver]):
+                product, tokens, _ = documents[number]
+                if number in found or (active_only and not product.is_active()):
+                    continue
+                if all(has(tokens, other) for other in others):
+                    numbers.append(number)
+                    if len(numbers) == limit:
+                        break
+        return [documents[number][0] for number in numbers]
+
+    def fuzzy_search(self, query: str, limit: int = 10, max_distance: int = 2,
+                     active_only: bool = False) -> List[Product]:
+        """
+        Finds the products whose name has, for every word of the query, a word starting
+        with it or a word within max_distance typos (insertions, deletions, substitutions,
+        transpositions) of it, a single typo for the words of up to SHORT_TOKEN characters.
+        The results with fewer typos rank first.
+
+        :param query: (str) The query, such as "mackbook ari".
+        :param limit: (int) The largest number of results.
+        :param max_distance: (int) The largest number of typos per word.
+        :param active_only: (bool) Whether inactive products are left out.
+        :return: (List[Product]) The best matching products, best first.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens or limit < 1:
+            return []
+        close = [self._close_tokens(token, max_distance) for token in query_tokens]
+        # the query tokens starting too many vocabulary tokens are matched by prefix
+        prefixes: List[Optional[str]] = []
+        for token, token_close in zip(query_tokens, close):
+            prefixed = self._prefix_tokens(token)
+            if len(prefixed) <= MAX_FUZZY_TOKENS:
+                token_close.update(dict.fromkeys(prefixed, 0))
+                prefixes.append(None)
+            else:
+                prefixes.append(token)
+        counts: List[int] = []
+        for token_close in close:
+            counts.append(self._posting_count(token_close, min(counts, default=len(self))))
+        driver = counts.index(min(counts))
+        documents = self._documents
+        if not all(close):
+            return []
+        # the fewest typos the other query tokens can add to a result
+        floor = sum(min(token_close.values()) for index, token_close in enumerate(close)
+                    if index != driver)
+
+        others = [(close[index], prefixes[index]) for index in range(len(query_tokens))
+                  if index != driver]
+
+        def other_typos(tokens: Tuple[str, ...]) -> Optional[int]:
+            total = 0
+            for token_close, prefix in others:
+                best = max_distance + 1
+                for token in tokens:
+                    typos = token_close.get(token)
+                    if typos is not None and typos < best:
+                        best = typos
+                if best and prefix is not None and \
+                        any(token.startswith(prefix) for token in tokens):
+                    best = 0
+                if best > max_distance:
+                    return None
+                total += best
+            return total
+
+        # the driver's tokens are walked by number of typos: a walk can stop once it holds
+        # limit results with the fewest typos it can find, the later ones can't outrank them
+        distances = sorted(set(close[driver].values()))
+        scored: List[Tuple[int, int, int]] = []
+        seen: Set[int] = set()
+        for position, distance in enumerate(distances):
+            best = 0
+            tokens = [token for token, typos in close[driver].items() if typos == distance]
+            for number in self._walk(tokens):
+                if best == limit:
+                    break
+                product, product_tokens, key = documents[number]
+                if number in seen or (active_only and not product.is_active()):
+                    continue
+                seen.add(number)
+                typos = other_typos(product_tokens)
+                if typos is not None:
+                    scored.append((distance + typos, key, number))
+                    best += typos == floor
+            next_distance = distances[position + 1] if position + 1 < len(distances) else None
+            if next_distance is None or \
+                    sum(1 for total, _, _ in scored if total < next_distance + floor) >= limit:
+                break
+        return [documents[number][0] for _, _, number in heapq.nsmallest(limit, scored)]
@@ -0,0 +1,243 @@
+"""
+server.py
+This module provides a network front-end for the store.
+
+The server speaks JSON lines over TCP using asyncio streams: every request is one JSON
+object on its own line, and every response is one JSON object on its own line.
+
+Requests:
+    {"op": "list"}                                  -> the active products
+    {"op": "list", "page": 2, "page_size": 50}      -> a page of the active products
+    {"op": "total"}                                 -> the total quantity in store
+    {"op": "order", "lines": [["name", qty], ...]}  -> the receipt of the order
+
+Every response has an "ok" field, failed requests carry an "error" message instead of
+a result. A request line longer than the limit of the stream reader (64 KiB) is skipped
+and answered with an error, and an unexpected error of a request is logged and answered
+with an error, the connection is kept in both cases. The listing and the checkout run in
+a thread pool so they never block the event loop, the store itself takes care of the
+concurrent checkouts.
+
+Usage:
+    python3 server.py --port 8765
+
+Classes:
+    StoreServer: The asyncio server exposing a Store.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from store import Store, OrderRejected
+from receipt import Receipt
+from main import create_store
+
+logger = logging.getLogger(__name__)
+
+
+def product_to_dict(product) -> dict:
+    """
+    Converts a product to its JSON representation.
+
+    :param product: (Product) The product.
+    :return: (dict) The JSON representation of the product.
+    """
+    return {
+        "name": product.name,
+        "price": product.price,
+        "quantity": product.quantity,
+        "limit": getattr(product, "limit", None),
+        "promotion": getattr(product.promotion, "name", None),
+    }
+
+
+def receipt_to_dict(receipt: Receipt) -> dict:
+    """
+    Converts a receipt to its JSON representation.
+
+    :param receipt: (Receipt) The receipt.
+    :return: (dict) The JSON representation of the receipt.
+    """
+    return {
+        "order_id": receipt.order_id,
+        "lines": [{"name": line.product_name, "quantity": line.quantity,
+                   "unit_price": line.unit_price, "promotion": line.promotion_name,
+                   "line_total": line.line_total} for line in receipt.lines],
+        "total": receipt.total,
+    }
+
+
+class StoreServer:
+    """
+    The asyncio server exposing a Store.
+
+    Attributes:
+        store (Store): The store served.
+        host (str): The address the server listens on.
+        port (int): The port the server listens on, 0 picks a free port.
+    """
+    def __init__(self, store: Store, host: str = "127.0.0.1", port: int = 8765,
+                 workers: Optional[int] = None):
+        """
+        Initializes the server, call start to start listening.
+
+        :param store: (Store) The store to serve.
+        :param host: (str) The address to listen on.
+        :param port: (int) The port to listen on, 0 picks a free port.
+        :param workers: (int) The number of threads running the listings and checkouts.
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """
+        Starts listening, the port attribute is updated with the actual port.
+        """
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """
+        Starts listening if needed and serves the clients until cancelled.
+        """
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """
+        Stops listening and shuts the worker threads down.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of one client until it disconnects.
+        """
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as error:
+                    # the last request of the client, without a line break
+                    line = error.partial
+                except asyncio.LimitOverrunError as error:
+                    await self._skip_line(reader, error.consumed)
+                    line = None
+                if line is None:
+                    response = {"ok": False, "error": "Request too long."}
+                elif not line:
+                    break
+                else:
+                    try:
+                        response = await self.handle_request(line)
+                    except Exception:
+                        logger.exception("Failed to handle the request %r", line[:200])
+                        response = {"ok": False, "error": "Internal error."}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _skip_line(reader: asyncio.StreamReader, consumed: int):
+        """
+        Drops the rest of a request line over the limit of the reader, up to and
+        including its line break.
+
+        :param reader: (asyncio.StreamReader) The stream of the client.
+        :param consumed: (int) The bytes of the line in the buffer of the reader.
+        """
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b"\n")
+                return
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+
+    async def handle_request(self, line: bytes) -> dict:
+        """
+        Handles one request.
+
+        :param line: (bytes) The JSON encoded request.
+        :return: (dict) The response.
+        """
+        try:
+            request = json.loads(line)
+            operation = request.get("op")
+        except (ValueError, AttributeError):
+            return {"ok": False, "error": "Invalid request."}
+
+        loop = asyncio.get_running_loop()
+        if operation == "total":
+            return {"ok": True, "total_quantity": self.store.get_total_quantity()}
+        if operation == "list":
+            page, page_size = request.get("page"), request.get("page_size", 20)
+            if page is not None and not (isinstance(page, int) and isinstance(page_size, int)
+                                         and page > 0 and page_size > 0):
+                return {"ok": False, "error": "Invalid page."}
+            products = await loop.run_in_executor(self._executor, self._list_products,
+                                                  page, page_size)
+            return {"ok": True, "products": products}
+        if operation == "order":
+            try:
+                lines = [(str(name), quantity) for name, quantity in request.get("lines", [])]
+            except (TypeError, ValueError):
+                return {"ok": False, "error": "Invalid order lines."}
+            try:
+                receipt = await loop.run_in_executor(self._executor, self.store.submit_order, lines)
+            except OrderRejected as error:
+                return {"ok": False, "error": str(error)}
+            return {"ok": True, "receipt": receipt_to_dict(receipt)}
+        return {"ok": False, "error": f"Unknown operation {operation!r}."}
+
+    def _list_products(self, page: Optional[int] = None, page_size: int = 20) -> list:
+        """
+        :param page: (int, optional) The number of the page, all the products if not given.
+        :param page_size: (int) The number of products per page.
+        :return: (list) The JSON representation of the active products.
+        """
+        if page is None:
+            active_products, _ = self.store.get_products()
+        else:
+            active_products = self.store.get_products_page(page, page_size)
+        return [product_to_dict(product) for product in active_products]
+
+
+def main():
+    """
+    Serves the store of the main module over the network.
+    """
+    parser = argparse.ArgumentParser(description="Serve the store over JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    server = StoreServer(create_store(), args.host, args.port, args.workers)
+
+    async def serve():
+        await server.start()
+        print(f"Serving the store on {server.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
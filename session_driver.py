@@ -0,0 +1,211 @@
+"""
+session_driver.py
+This module replays customer sessions through the interactive ordering flow of the store.
+
+A session is the script of the lines a customer types into Store.place_order: product
+numbers, quantities, and an empty line to check out or 0 to cancel. The sessions are
+fed to the real place_order through an in-memory I/O, so the whole state machine runs,
+validation and messages included, without a terminal. The sessions are recorded in a
+JSON lines file, one list of lines per session, or generated with a seed.
+
+Usage:
+    python3 session_driver.py --sessions 5000
+    python3 session_driver.py --sessions 5000 --record sessions.jsonl
+    python3 session_driver.py --replay sessions.jsonl
+
+Functions:
+    synthetic_sessions: Generates random customer sessions.
+    save_sessions: Writes sessions to a JSON lines file.
+    load_sessions: Reads sessions from a JSON lines file.
+    replay: Replays sessions through place_order and returns the statistics of the run.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Iterable, List
+from products import NonStockedProduct
+from store import Store
+from store_io import MemoryIO
+from load_test import percentile
+from main import create_store
+
+
+def synthetic_sessions(count: int, product_count: int, seed: int = 0, max_lines: int = 4,
+                       max_quantity: int = 3, cancel_share: float = 0.1,
+                       typo_share: float = 0.05) -> List[List[str]]:
+    """
+    Generates random customer sessions.
+
+    :param count: (int) The number of sessions.
+    :param product_count: (int) The number of products listed, the numbers typed are
+                          between 1 and product_count.
+    :param seed: (int) The seed of the random generator, the same seed gives the same
+                 sessions.
+    :param max_lines: (int) The maximum number of products ordered in a session.
+    :param max_quantity: (int) The maximum quantity typed for a product.
+    :param cancel_share: (float) The share of the sessions cancelled rather than checked out.
+    :param typo_share: (float) The share of the answers preceded by an invalid answer.
+    :return: (List[List[str]]) The lines typed in every session.
+
+    Raises:
+        ValueError: If there are no products to order.
+    """
+    if product_count <= 0:
+        raise ValueError("The sessions need at least one product to order.")
+    rand = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        session = []
+        for _ in range(rand.randint(1, max_lines)):
+            for answer in (str(rand.randint(1, product_count)),
+                           str(rand.randint(1, max_quantity))):
+                if rand.random() < typo_share:
+                    session.append("x")
+                session.append(answer)
+        session.append("0" if rand.random() < cancel_share else "")
+        sessions.append(session)
+    return sessions
+
+
+def save_sessions(path: str, sessions: Iterable[List[str]]):
+    """
+    Writes sessions to a JSON lines file, one list of lines per session.
+
+    :param path: (str) The path of the file.
+    :param sessions: (Iterable[List[str]]) The sessions.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        for session in sessions:
+            file.write(json.dumps(session) + "\n")
+
+
+def load_sessions(path: str) -> List[List[str]]:
+    """
+    Reads sessions from a JSON lines file.
+
+    :param path: (str) The path of the file.
+    :return: (List[List[str]]) The sessions.
+
+    Raises:
+        ValueError: If a line of the file is not a list of strings.
+    """
+    sessions = []
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            session = json.loads(line)
+            if not isinstance(session, list) or \
+                    not all(isinstance(answer, str) for answer in session):
+                raise ValueError(f"Line {number} of {path} is not a list of strings.")
+            sessions.append(session)
+    return sessions
+
+
+class _OrderCounter:
+    """
+    Counts the orders confirmed by a store.
+    """
+    def __init__(self):
+        self.orders = 0
+
+    def on_order_confirmed(self, receipt):
+        self.orders += 1
+
+
+def replay(store: Store, sessions: Iterable[List[str]], capture: bool = False) -> dict:
+    """
+    Replays sessions through place_order, one after the other. A session that runs out
+    of lines before place_order returns is abandoned, as a customer closing the
+    terminal would, its cart is released.
+
+    :param store: (Store) The store, its I/O is restored after the run.
+    :param sessions: (Iterable[List[str]]) The sessions.
+    :param capture: (bool) Whether to keep the output of the sessions, it is then
+                    returned under "transcripts".
+    :return: (dict) The statistics of the run: sessions, orders, abandoned, seconds,
+             sessions_per_second, p50_ms and p99_ms, and transcripts with capture.
+    """
+    counter = _OrderCounter()
+    store.add_listener(counter)
+    had_own_io = "io" in vars(store)
+    previous_io = store.io
+    latencies: List[float] = []
+    transcripts: List[str] = []
+    abandoned = 0
+    clock = time.perf_counter
+    started = clock()
+    try:
+        for session in sessions:
+            store.io = MemoryIO(session, capture)
+            session_started = clock()
+            try:
+                store.place_order()
+            except EOFError:
+                abandoned += 1
+                cart_id = getattr(store.purchased_list, "cart_id", None)
+                if store.reservations is not None and cart_id is not None:
+                    store.reservations.release(cart_id)
+            latencies.append(clock() - session_started)
+            if capture:
+                transcripts.append(store.io.output)
+    finally:
+        elapsed = clock() - started
+        store.remove_listener(counter)
+        if had_own_io:
+            store.io = previous_io
+        else:
+            # no session may have run, in which case the store has no io of its own
+            vars(store).pop("io", None)
+
+    latencies.sort()
+    stats = {
+        "sessions": len(latencies),
+        "orders": counter.orders,
+        "abandoned": abandoned,
+        "seconds": elapsed,
+        "sessions_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+    if capture:
+        stats["transcripts"] = transcripts
+    return stats
+
+
+def main():
+    """
+    Replays the sessions and prints the statistics of the run.
+    """
+    parser = argparse.ArgumentParser(description="Replay customer sessions through the store.")
+    parser.add_argument("--sessions", type=int, default=5000,
+                        help="number of synthetic sessions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stock", type=int, default=10 ** 6,
+                        help="quantity of every stocked product before the run")
+    parser.add_argument("--replay", help="JSON lines file of the sessions to replay")
+    parser.add_argument("--record", help="JSON lines file to write the sessions to")
+    args = parser.parse_args()
+
+    store = create_store()
+    for product in store.products_list:
+        if not isinstance(product, NonStockedProduct):
+            product.set_quantity(args.stock)
+    if args.replay:
+        sessions = load_sessions(args.replay)
+    else:
+        sessions = synthetic_sessions(args.sessions, store.get_active_count(), args.seed)
+    if args.record:
+        save_sessions(args.record, sessions)
+
+    stats = replay(store, sessions)
+    print(f"{stats['sessions']} sessions ({stats['orders']} orders, "
+          f"{stats['abandoned']} abandoned) in {stats['seconds']:.2f}s")
+    print(f"  {stats['sessions_per_second']:.0f} sessions/sec")
+    print(f"  p50 latency: {stats['p50_ms']:.3f} ms")
+    print(f"  p99 latency: {stats['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+sharding.py - Module file containing the sharded store
+
+This module runs a store as several worker processes, each owning the products whose
+name hashes to its shard, so the orders of different shards are served in parallel
+instead of taking turns on one interpreter lock.
+
+The ShardedStore object is the router: it splits every order by shard and commits it
+with a two-phase protocol. Every shard of the order first prepares its lines (checks them
+against its rules, takes the stock out and prices them), and the order is only committed
+once all the shards have prepared; if any shard rejects its lines, the shards that had
+prepared are told to abort and give their stock back, so an order spanning shards buys
+every line or nothing. An order held by a single shard skips the second phase. Catalog
+wide queries such as get_total_quantity are sent to all the shards at once and their
+answers combined.
+
+Classes:
+    ShardedStore: A store partitioned across worker processes.
+
+Functions:
+    shard_of: Returns the shard of a product name.
+"""
+
+import itertools
+import multiprocessing
+import os
+import threading
+import zlib
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from products import Product, NonStockedProduct
+from promotions import price_lines
+from money import to_amount
+from receipt import Receipt, ReceiptLine
+from store import OrderRejected, Store
+from persistence import product_from_record, product_to_record
+
+
+def shard_of(product_name: str, shard_count: int) -> int:
+    """
+    Returns the shard of a product name. The hash is stable across processes and runs,
+    unlike the built-in hash of a string.
+
+    :param product_name: (str) The product name.
+    :param shard_count: (int) The number of shards.
+    :return: (int) The shard, between 0 and shard_count - 1.
+    """
+    return zlib.crc32(product_name.encode("utf-8")) % shard_count
+
+
+class _ShardWorker:
+    """
+    The store of one shard and the orders it has prepared, it runs in the worker process.
+    """
+    def __init__(self, records: List[dict], promotions: Dict[str, object]):
+        self.store = Store([product_from_record(record, promotions) for record in records])
+        self.promotions = promotions
+        self.prepared: Dict[int, List[Tuple[Product, int]]] = {}
+
+    def prepare(self, transaction: int, shopping_list: List[Tuple[str, int]]) \
+            -> List[ReceiptLine]:
+        """
+        Takes the lines of an order out of stock and prices them, until the order
+        is committed or aborted.
+        """
+        lines = self.store.validate_order(shopping_list)
+        for product, quantity in lines:
+            product.deduct_stock(quantity)
+        self.prepared[transaction] = lines
+        return [ReceiptLine(product.name, quantity, product.price,
+                            getattr(product.promotion, "name", None), line_total)
+                for (product, quantity), line_total in zip(lines, price_lines(lines))]
+
+    def commit(self, transaction: int):
+        """
+        Makes a prepared order final.
+        """
+        self.prepared.pop(transaction, None)
+
+    def abort(self, transaction: int):
+        """
+        Gives the stock of a prepared order back.
+        """
+        for product, quantity in self.prepared.pop(transaction, []):
+            if not isinstance(product, NonStockedProduct):
+                product.quantity += quantity
+                product.activate()
+
+    def order(self, shopping_list: List[Tuple[str, int]]) -> List[ReceiptLine]:
+        """
+        Prepares and commits an order at once.
+        """
+        lines = self.prepare(-1, shopping_list)
+        self.commit(-1)
+        return lines
+
+    def orders(self, shopping_lists: List[List[Tuple[str, int]]]) -> List[Tuple[bool, object]]:
+        """
+        Places orders one after the other, the result of every order is an (ok, result)
+        pair like the reply to a single request.
+        """
+        results = []
+        for shopping_list in shopping_lists:
+            try:
+                results.append((True, self.order(shopping_list)))
+            except Exception as error:
+                results.append((False, str(error)))
+        return results
+
+    def total_quantity(self) -> int:
+        return self.store.get_total_quantity()
+
+    def active_count(self) -> int:
+        return self.store.get_active_count()
+
+    def products(self) -> List[dict]:
+        return [product_to_record(product) for product in self.store.get_products()[0]]
+
+    def find(self, product_name: str) -> Optional[dict]:
+        product = self.store.find_product_by_name(product_name)
+        return None if product is None else product_to_record(product)
+
+    def add(self, record: dict):
+        self.store.add_product(product_from_record(record, self.promotions))
+
+    def remove(self, product_name: str):
+        product = self.store.find_product_by_name(product_name)
+        if product is not None:
+            self.store.remove_product(product)
+
+
+def _serve_shard(connection, records: List[dict], promotions: Dict[str, object]):
+    """
+    The main loop of a worker process: it answers the requests of the router one at a
+    time, a request is an (operation, arguments) pair and the reply an (ok, result) pair.
+    """
+    worker = _ShardWorker(records, promotions)
+    while True:
+        try:
+            operation, arguments = connection.recv()
+        except EOFError:
+            return
+        if operation == "stop":
+            connection.close()
+            return
+        # any error is sent back, an error leaving the loop would leave the router
+        # waiting for a reply forever
+        try:
+            reply = (True, getattr(worker, operation)(*arguments))
+        except Exception as error:
+            reply = (False, str(error) or type(error).__name__)
+        connection.send(reply)
+
+
+class ShardedStore:
+    """
+    A store partitioned across worker processes by the hash of the product names.
+
+    It offers the order and query methods of a Store: submit_order, submit_orders, order,
+    get_total_quantity, get_active_count, get_products, find_product_by_name,
+    add_product, remove_product and get_receipt. The products it returns are copies,
+    the products live in the worker processes.
+
+    Attributes:
+        shard_count (int): The number of shards.
+    """
+    def __init__(self, products: Sequence[Product], promotions: Dict[str, object],
+                 shard_count: Optional[int] = None, start_method: Optional[str] = None):
+        """
+        Starts the worker processes and hands them their products.
+
+        :param products: (Sequence[Product]) The products of the store.
+        :param promotions: (Dict[str, Promotion]) The promotions by name, the products
+                           reference their promotion by name.
+        :param shard_count: (int) The number of shards, the number of CPUs if not given.
+        :param start_method: (str) The multiprocessing start method of the workers.
+        """
+        self.shard_count = shard_count or os.cpu_count() or 1
+        context = multiprocessing.get_context(start_method)
+        partitions: List[List[dict]] = [[] for _ in range(self.shard_count)]
+        for product in products:
+            partitions[shard_of(product.name, self.shard_count)].append(
+                product_to_record(product))
+
+        self._connections = []
+        self._processes = []
+        for records in partitions:
+            router_end, worker_end = context.Pipe()
+            process = context.Process(target=_serve_shard, args=(worker_end, records, promotions),
+                                      daemon=True)
+            process.start()
+            worker_end.close()
+            self._connections.append(router_end)
+            self._processes.append(process)
+        # one lock per shard connection, always taken in shard order
+        self._locks = [threading.Lock() for _ in range(self.shard_count)]
+        self._transactions = itertools.count()
+        self._receipts: Dict[str, Receipt] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _call(self, requests: Dict[int, Tuple[str, tuple]]) -> Dict[int, Tuple[bool, object]]:
+        """
+        Sends requests to shards and waits for all the replies, the shards work on them
+        in parallel. A shard whose worker process is gone replies with a failure.
+
+        :param requests: The (operation, arguments) request of every shard.
+        :return: The (ok, result) reply of every shard.
+        """
+        shards = sorted(requests)
+        replies: Dict[int, Tuple[bool, object]] = {}
+        with ExitStack() as stack:
+            for shard in shards:
+                stack.enter_context(self._locks[shard])
+            for shard in shards:
+                try:
+                    self._connections[shard].send(requests[shard])
+                except OSError:
+                    replies[shard] = (False, f"The shard {shard} is unavailable.")
+            for shard in shards:
+                if shard not in replies:
+                    try:
+                        replies[shard] = self._connections[shard].recv()
+                    except (EOFError, OSError):
+                        replies[shard] = (False, f"The shard {shard} is unavailable.")
+        return replies
+
+    @staticmethod
+    def _result(reply: Tuple[bool, object]):
+        """
+        :return: The result of a successful reply.
+
+        Raises:
+            ValueError: If the shard failed the request.
+        """
+        ok, result = reply
+        if not ok:
+            raise ValueError(result)
+        return result
+
+    def _broadcast(self, operation: str, *arguments) -> List:
+        """
+        Sends a request to every shard.
+
+        :return: (List) The results of the shards, in shard order.
+        """
+        replies = self._call({shard: (operation, arguments) for shard in range(self.shard_count)})
+        return [self._result(replies[shard]) for shard in range(self.shard_count)]
+
+    def _call_one(self, product_name: str, operation: str, *arguments):
+        """
+        Sends a request to the shard of a product.
+
+        :return: The result of the shard.
+
+        Raises:
+            ValueError: If the shard failed the request.
+        """
+        shard = shard_of(product_name, self.shard_count)
+        return self._result(self._call({shard: (operation, arguments)})[shard])
+
+    def submit_order(self, shopping_list: Sequence[Tuple[str, int]]) -> Receipt:
+        """
+        Places an order, all-or-nothing across the shards.
+
+        :param shopping_list: (Sequence[Tuple[str, int]]) The product names and quantities.
+        :return: (Receipt) The receipt of the order.
+
+        Raises:
+            OrderRejected: If the order breaks the rules of the store, see
+                           Store.validate_order.
+        """
+        by_shard = self._split(shopping_list)
+        if not by_shard:
+            raise OrderRejected("The order is empty.")
+
+        if len(by_shard) == 1:
+            ((shard, lines),) = by_shard.items()
+            replies = self._call({shard: ("order", (lines,))})
+        else:
+            transaction = next(self._transactions)
+            replies = self._call({shard: ("prepare", (transaction, lines))
+                                  for shard, lines in by_shard.items()})
+            prepared = [shard for shard, (ok, _) in replies.items() if ok]
+            decision = "commit" if len(prepared) == len(replies) else "abort"
+            if prepared:
+                self._call({shard: (decision, (transaction,)) for shard in prepared})
+
+        for ok, result in replies.values():
+            if not ok:
+                raise OrderRejected(result)
+        return self._make_receipt(shopping_list,
+                                  [line for _, lines in replies.values() for line in lines])
+
+    def submit_orders(self, shopping_lists: Sequence[Sequence[Tuple[str, int]]]) \
+            -> List[Union[Receipt, OrderRejected]]:
+        """
+        Places many orders with one request per shard for all the orders held by a single
+        shard, which saves most of the inter-process round trips. The orders spanning
+        shards are then placed one by one with the two-phase protocol.
+
+        :param shopping_lists: The shopping lists of the orders.
+        :return: (List[Union[Receipt, OrderRejected]]) For every order, its receipt or
+                  the error that rejected it.
+        """
+        results: List[Union[Receipt, OrderRejected, None]] = [None] * len(shopping_lists)
+        batches: Dict[int, List[Tuple[int, List[Tuple[str, int]]]]] = {}
+        spanning = []
+        for index, shopping_list in enumerate(shopping_lists):
+            by_shard = self._split(shopping_list)
+            if len(by_shard) == 1:
+                ((shard, lines),) = by_shard.items()
+                batches.setdefault(shard, []).append((index, lines))
+            else:
+                spanning.append(index)
+
+        if batches:
+            replies = self._call({shard: ("orders", ([lines for _, lines in batch],))
+                                  for shard, batch in batches.items()})
+            for shard, batch in batches.items():
+                ok, shard_results = replies[shard]
+                if not ok:
+                    # the shard failed the whole batch
+                    shard_results = [(False, shard_results)] * len(batch)
+                for (index, _), (ok, result) in zip(batch, shard_results):
+                    results[index] = self._make_receipt(shopping_lists[index], result) \
+                        if ok else OrderRejected(result)
+        for index in spanning:
+            try:
+                results[index] = self.submit_order(shopping_lists[index])
+            except OrderRejected as error:
+                results[index] = error
+        return results
+
+    def _split(self, shopping_list: Sequence[Tuple[str, int]]) \
+            -> Dict[int, List[Tuple[str, int]]]:
+        """
+        Splits a shopping list by shard.
+        """
+        by_shard: Dict[int, List[Tuple[str, int]]] = {}
+        for name, quantity in shopping_list:
+            by_shard.setdefault(shard_of(name, self.shard_count), []).append((name, quantity))
+        return by_shard
+
+    def _make_receipt(self, shopping_list: Sequence[Tuple[str, int]],
+                      receipt_lines: List[ReceiptLine]) -> Receipt:
+        """
+        Makes and keeps the receipt of an order from the lines priced by its shards, the
+        receipt lists the products in the order of the shopping list.
+        """
+        first_line: Dict[str, int] = {}
+        for index, (name, _) in enumerate(shopping_list):
+            first_line.setdefault(name, index)
+        receipt_lines = sorted(receipt_lines, key=lambda line: first_line[line.product_name])
+        receipt = Receipt(Store.generate_order_id(), receipt_lines,
+                          to_amount(sum(line.line_total_cents for line in receipt_lines)))
+        self._receipts[receipt.order_id] = receipt
+        return receipt
+
+    def order(self, shopping_list: Sequence[Tuple[str, int]]) -> float:
+        """
+        Places an order and returns its total price.
+
+        Raises:
+            OrderRejected: If the order breaks the rules of the store.
+        """
+        return self.submit_order(shopping_list).total
+
+    def get_receipt(self, order_id: str) -> Optional[Receipt]:
+        """
+        :param order_id: (str) The ID of the order.
+        :return: (Receipt) The receipt of the order, None if the store has no such order.
+        """
+        return self._receipts.get(order_id)
+
+    def get_total_quantity(self) -> int:
+        """
+        :return: (int) The total quantity of all the products of all the shards.
+        """
+        return sum(self._broadcast("total_quantity"))
+
+    def get_active_count(self) -> int:
+        """
+        :return: (int) The number of active products of all the shards.
+        """
+        return sum(self._broadcast("active_count"))
+
+    def get_products(self, promotions: Optional[Dict[str, object]] = None) \
+            -> Tuple[List[Product], int]:
+        """
+        :param promotions: (Dict[str, Promotion]) The promotions by name, to set on the
+                           returned copies.
+        :return: (Tuple[List[Product], int]) Copies of the active products of all the
+                 shards, and their number.
+        """
+        products = [product_from_record(record, promotions or {})
+                    for records in self._broadcast("products") for record in records]
+        return products, len(products)
+
+    def find_product_by_name(self, product_name: str,
+                             promotions: Optional[Dict[str, object]] = None) \
+            -> Optional[Product]:
+        """
+        :param product_name: (str) The product name.
+        :param promotions: (Dict[str, Promotion]) The promotions by name, to set on the
+                           returned copy.
+        :return: (Product) A copy of the product, None if the store has no such product.
+        """
+        record = self._call_one(product_name, "find", product_name)
+        return None if record is None else product_from_record(record, promotions or {})
+
+    def add_product(self, product: Product):
+        """
+        Adds a product to its shard, its promotion is referenced by name.
+
+        :param product: (Product) The product to add.
+        """
+        self._call_one(product.name, "add", product_to_record(product))
+
+    def remove_product(self, product: Union[Product, str]):
+        """
+        Removes a product from its shard.
+
+        :param product: (Product or str) The product or its name.
+        """
+        name = product if isinstance(product, str) else product.name
+        self._call_one(name, "remove", name)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        for lock, connection in zip(self._locks, self._connections):
+            with lock:
+                if not connection.closed:
+                    try:
+                        connection.send(("stop", ()))
+                    except OSError:
+                        pass
+                    connection.close()
+        for process in self._processes:
+            process.join()
@@ -9,6 +9,7 @@ find a product by name, generate an order ID, display the order summary,
 validate user input, and more.
 
 Classes:
+    OrderRejected: The error raised when an order breaks the rules of the store.
     Store: A class representing a store.
 
 Author:
@@ -18,10 +19,26 @@ Date:
     2023-Jun-06
 """
 
-import random
-import string
-from typing import List, Tuple, Optional
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional, Union
 from products import Product, NonStockedProduct, LimitedProduct
+from cart import Cart
+from promotions import price_lines_cents
+from money import to_cents, to_amount, format_cents
+from receipt import Receipt, ReceiptLine
+from order_ids import OrderIdAllocator
+from store_io import StoreIO, ConsoleIO
+from price_index import PriceIndex
+from search_index import SearchIndex
+
+
+class OrderRejected(ValueError):
+    """
+    The error raised when an order breaks the rules of the store, such as an unknown
+    product, a quantity above a limit or an insufficient stock.
+    """
 
 
 class Store:
@@ -30,28 +47,43 @@ class Store:
 
 	Attributes:
 		products_list (List[Product]): A list of Product instances available in the store.
+		io (StoreIO): The I/O of the interactive flows, the console by default.
 
 	Methods:
 		__init__: Initialize the Store object.
 		display_store_menu: Displays a list of available items and
 							allows the customer to select an item by number.
 		get_products: Get a list of active products available in the store.
+		get_products_page: Get a page of the active products.
+		iter_products: Iterate over the active products page by page.
+		render_products: Get the text of the product listing, cached until the next change.
 		add_product: Add a product to the store.
 		remove_product: Remove a product from the store.
 		order: Place an order for a given shopping list and calculate the total price.
+		submit_order: Place an order without any console I/O and return its receipt.
+		get_receipt: Finds the receipt of a past order by its ID.
+		get_products_in_price_range: Get the active products within a price range.
+		get_cheapest_products: Get the k cheapest active products.
+		get_products_by_price: Get a page of the active products sorted by price.
+		search_products: Find products by partial or misspelled names.
 	"""
     # The maximum number of items allowed as per the policy
     OUR_POLICY_MAX_ALLOWED_ITEMS = 10000
 
-    @classmethod
-    def order_intro(cls):
+    # The allocator of the order IDs, shared by all the stores of the process
+    order_ids = OrderIdAllocator()
+
+    # The I/O of the interactive flows, see store_io, a store may be given its own
+    io: StoreIO = ConsoleIO()
+
+    def order_intro(self):
         """
     	Provides an introduction to the ordering process.
     	"""
         # start the shopping
-        print("\nEnter the number of the item you want to order (or 0 to cancel)")
+        self.io.print("\nEnter the number of the item you want to order (or 0 to cancel)")
         # When you want to finish order, enter empty text.
-        print("To proceed with the checkout, simply input an empty text.")
+        self.io.print("To proceed with the checkout, simply input an empty text.")
 
     @classmethod
     def make_option_list(cls, start: int, end: int) -> List[str]:
@@ -75,18 +107,20 @@ class Store:
         """
         Search for a specific product by its name and returns the quantity that has been ordered
 
-        :param lst: (list) The order list, a list of tuples containing product name and its quantity.
+        :param lst: (Cart) The order cart, or a list of tuples containing product name
+                    and its quantity.
         :param product_name: (str) The name of the product to search for in the list.
 
         :return: int: The quantity of the product that has been ordered if found, -1 otherwise.
         """
+        if isinstance(lst, Cart):
+            return lst.quantity_of(product_name) if product_name in lst else -1
         for name, items_count in lst:
             if name == product_name:
                 return items_count
         return -1
 
-    @classmethod
-    def display_limit_message(cls, product_limit, product_name):
+    def display_limit_message(self, product_limit, product_name):
         """
         Displays a limit message indicating the maximum allowed quantity for a product.
 
@@ -95,20 +129,80 @@ class Store:
         :return: None
         """
         if product_limit == 1:
-            print(f"Sorry, Only {product_limit} unit is allowed from {product_name} per order.")
+            self.io.print(f"Sorry, Only {product_limit} unit is allowed from {product_name}"
+                          " per order.")
         else:
-            print(f"Sorry, Only {product_limit} units are allowed from {product_name} per order.")
+            self.io.print(f"Sorry, Only {product_limit} units are allowed from {product_name}"
+                          " per order.")
 
-    def __init__(self, products):
+    def __init__(self, products, io: Optional[StoreIO] = None):
         """
 		Initialize the Store object.
 
 		:param products: (list): A list of Product instances to be added to the store.
+		:param io: (StoreIO, optional): The I/O of the interactive flows, the console
+				   if not given.
+
+		Raises:
+			ValueError: If a product already belongs to a store, or is given twice.
 		"""
+        if io is not None:
+            self.io = io
         self.products_list: List[Product] = products
         self.purchased_list = []
         self.order_list = []
 
+        # name -> product index, so that lookups don't walk the whole catalog.
+        # The first product registered under a name wins, as the linear search did.
+        self._products_by_name: Dict[str, Product] = {}
+
+        # Aggregates kept up to date by the products themselves (see on_quantity_changed
+        # and on_active_changed), so the dashboards can read them in O(1).
+        self._total_quantity = 0
+        self._positions: Dict[int, int] = {}
+        self._next_position = 0
+        self._active_products: Dict[int, Product] = {}
+        # the active products sorted by position and their positions, kept sorted with
+        # bisect so a page of the listing is a slice
+        self._active_sorted: List[Product] = []
+        self._active_positions: List[int] = []
+        # a copy of _active_sorted handed out by get_products until the next change
+        self._active_list: Optional[List[Product]] = None
+        # the active products sorted by price, built by the first price query and
+        # kept up to date from then on
+        self._price_index: Optional[PriceIndex] = None
+        # the names of all the products, built by the first search, the products are
+        # indexed under their position
+        self._search_index: Optional[SearchIndex] = None
+        self._aggregate_lock = threading.Lock()
+        # guards the search index, so a search does not hold up the stock updates of the
+        # checkouts, it is always taken before _aggregate_lock
+        self._search_lock = threading.Lock()
+
+        # bumped by every change of the catalog, the rendered listings are cached
+        # under the version they were rendered at
+        self._version = 0
+        self._render_version = 0
+        self._render_cache: Dict[Tuple, str] = {}
+
+        # one lock per product name, checkout takes the locks of its products in name
+        # order so that concurrent orders can never deadlock.
+        self._product_locks: Dict[str, threading.Lock] = {}
+
+        # the objects told about the changes of the store, see add_listener
+        self._listeners: List = []
+
+        # order ID -> receipt of every order confirmed by the store
+        self._receipts: Dict[str, Receipt] = {}
+
+        # the stock held by the carts being filled, see reservations.ReservationBook
+        self.reservations = None
+
+        # checked up front, so a rejected catalog leaves its products free
+        self._check_unowned(products)
+        for product in products:
+            self._register_product(product)
+
     def __contains__(self, product):
         """
          The __contains__ method checks if a product exists in the store.
@@ -116,19 +210,32 @@ class Store:
         :param product: (Product) The product to check.
         :return: (bool) True if the product exists in the store, False otherwise
         """
+        indexed = self._products_by_name.get(getattr(product, "name", None))
+        if indexed is None or indexed is product:
+            return indexed is not None
+        # a different product owns the name, this one can only be a duplicate
         return product in self.products_list
 
-    @classmethod
-    def display_store_menu(cls):
+    def display_store_menu(self):
         """
 		Displays the store menu.
 		"""
-        print("\n   Store Menu")
-        print("   ----------")
-        print(" 1. List all products in store")
-        print(" 2. Show total amount in store")
-        print(" 3. Make an order")
-        print(" 4. Quit")
+        self.io.print("\n   Store Menu")
+        self.io.print("   ----------")
+        self.io.print(" 1. List all products in store")
+        self.io.print(" 2. Show total amount in store")
+        self.io.print(" 3. Make an order")
+        self.io.print(" 4. Quit")
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the catalog, it changes whenever a product is added, removed,
+        activated, deactivated, restocked, sold, repriced or given another promotion.
+
+        :return: (int) The version.
+        """
+        return self._version
 
     def get_products(self, display_flag: bool = False) -> Tuple[List[Product], int]:
         """
@@ -137,28 +244,139 @@ class Store:
 		:display_flag:	(bool, optional): specifies whether to display the available items.
 						defaults to False.
 		Returns:
-			List[Product]: A list of active products available in the store.
+			List[Product]: A list of active products available in the store. The list is
+			shared with the store until the next change, it must not be modified.
 		"""
-        active_products: List[Product] = []
-        for product in self.products_list:
-            if product.is_active():
-                active_products.append(product)
+        # the active products are kept in order, the list is only copied after a
+        # product has been added, removed, activated or deactivated.
+        with self._aggregate_lock:
+            if self._active_list is None:
+                self._active_list = list(self._active_sorted)
+            active_products: List[Product] = self._active_list
 
         if display_flag:
-            print("\n------- Available Items -------")
-            for index, product in enumerate(active_products, start=1):
-                # print(f"{index}. {product.name}, Price: ${product.price}, "
-                #       f"Quantity: {product.quantity}")
-                print(f"{index}.", product)
-            if len(active_products) == 1:
-                print(f"--- {len(active_products)} category was found! ---")
-            elif len(active_products) > 1:
-                print(f"--- {len(active_products)} categories were found! ---")
-            else:
-                print("--- No categories were found! ---")
+            self.io.print(self.render_products())
 
         return active_products, len(active_products)
 
+    def get_products_page(self, page: int = 1, page_size: int = 20) -> List[Product]:
+        """
+		Get a page of the active products, in the order of get_products. Only the
+		products of the page are visited.
+
+		:param page: (int) The number of the page, starting at 1.
+		:param page_size: (int) The number of products per page.
+		:return: (List[Product]) The products of the page, empty past the last page.
+
+		Raises:
+			ValueError: If the page or the page size is not positive.
+		"""
+        if page < 1 or page_size < 1:
+            raise ValueError("The page and the page size must be positive.")
+        with self._aggregate_lock:
+            return self._active_sorted[(page - 1) * page_size:page * page_size]
+
+    def iter_products(self, page_size: int = 20) -> Iterator[List[Product]]:
+        """
+		Iterate over the active products page by page, in the order of get_products.
+
+		The pages are taken one at a time, a page resumes after the last product of the
+		previous one, so changes of the store between two pages neither repeat nor skip
+		the products still active.
+
+		:param page_size: (int) The number of products per page.
+		:return: (Iterator[List[Product]]) The pages, the last one may be shorter.
+
+		Raises:
+			ValueError: If the page size is not positive.
+		"""
+        if page_size < 1:
+            raise ValueError("The page size must be positive.")
+        return self._iter_pages(page_size)
+
+    def _iter_pages(self, page_size: int) -> Iterator[List[Product]]:
+        """
+        Yields the pages of iter_products.
+        """
+        last_position = -1
+        while True:
+            with self._aggregate_lock:
+                start = bisect_right(self._active_positions, last_position)
+                page = self._active_sorted[start:start + page_size]
+                if page:
+                    last_position = self._active_positions[start + len(page) - 1]
+            if not page:
+                return
+            yield page
+
+    def render_products(self, page: Optional[int] = None, page_size: int = 20) -> str:
+        """
+		Get the text of the listing of the active products, as displayed by
+		display_products_list. The text is cached until the next change of the store.
+
+		:param page: (int, optional) The number of the page to render, starting at 1.
+		             The whole listing is rendered if not given.
+		:param page_size: (int) The number of products per page.
+		:return: (str) The listing.
+
+		Raises:
+			ValueError: If the page or the page size is not positive.
+		"""
+        key = (page, page_size)
+        with self._aggregate_lock:
+            version = self._version
+            if self._render_version != version:
+                self._render_cache.clear()
+                self._render_version = version
+            text = self._render_cache.get(key)
+        if text is not None:
+            return text
+
+        if page is None:
+            text = Store.format_products(self.get_products()[0])
+        else:
+            products = self.get_products_page(page, page_size)
+            text = Store.format_products(products, (page - 1) * page_size + 1,
+                                         self.get_active_count())
+        with self._aggregate_lock:
+            # a listing rendered across a change is not kept
+            if self._render_version == version == self._version:
+                self._render_cache[key] = text
+        return text
+
+    @staticmethod
+    def format_products(products: List[Product], start: int = 1,
+                        total: Optional[int] = None) -> str:
+        """
+		Formats a numbered list of products.
+
+		:param products: (List[Product]) The products to list.
+		:param start: (int) The number of the first product.
+		:param total: (int, optional) The number of products of the whole listing when
+		              the products are a page of it.
+		:return: (str) The listing.
+		"""
+        lines = ["\n------- Available Items -------"]
+        lines.extend(f"{index}. {product}" for index, product in enumerate(products, start=start))
+        count = len(products) if total is None else total
+        if total is not None and products:
+            lines.append(f"--- {start}-{start + len(products) - 1} of {count} categories ---")
+        elif count == 1:
+            lines.append(f"--- {count} category was found! ---")
+        elif count > 1:
+            lines.append(f"--- {count} categories were found! ---")
+        else:
+            lines.append("--- No categories were found! ---")
+        return "\n".join(lines)
+
+    def display_products(self, active_products: List[Product]):
+        """
+		Displays a numbered list of the given products.
+
+		:param active_products: (List[Product]) The products to display.
+		"""
+        self.io.print(self.format_products(active_products))
+
     def display_products_list(self):
         """
 		Displays a list of available items and allows the user to select
@@ -171,8 +389,52 @@ class Store:
 		Add a product to the store.
 
 		:param: product (Product): The product instance to be added to the store.
+
+		Raises:
+			ValueError: If the product already belongs to a store.
 		"""
+        self._register_product(product)
         self.products_list.append(product)
+        if self._listeners:
+            self._notify("on_product_added", product)
+
+    def add_products(self, products: List[Product]):
+        """
+		Add many products to the store at once.
+
+		The products are appended to the catalog in a single extend and registered
+		in a single pass.
+
+		:param: products (List[Product]): The product instances to be added to the store.
+
+		Raises:
+			ValueError: If a product already belongs to a store, or is given twice, no
+			            product is then added.
+		"""
+        with self._search_lock, self._aggregate_lock:
+            self._check_unowned(products)
+            self.products_list.extend(products)
+            position = self._next_position
+            for product in products:
+                self._products_by_name.setdefault(product.name, product)
+                product._store = self
+                self._positions[id(product)] = position
+                if product.is_active():
+                    self._active_products[id(product)] = product
+                    self._active_sorted.append(product)
+                    self._active_positions.append(position)
+                position += 1
+            self._next_position = position
+            self._total_quantity += sum(product.quantity for product in products)
+            self._active_list = None
+            self._version += 1
+            # rebuilt by the next query, in one sort rather than one insertion
+            # per product
+            self._price_index = None
+            self._search_index = None
+        if self._listeners:
+            for product in products:
+                self._notify("on_product_added", product)
 
     def remove_product(self, product):
         """
@@ -182,6 +444,16 @@ class Store:
 		"""
         if product in self.products_list:
             self.products_list.remove(product)
+            self._unregister_product(product)
+            if self._listeners:
+                self._notify("on_product_removed", product)
+            if self._products_by_name.get(product.name) is product:
+                del self._products_by_name[product.name]
+                # another product may share the name, keep it reachable
+                for other in self.products_list:
+                    if other.name == product.name:
+                        self._products_by_name[other.name] = other
+                        break
 
     def get_total_quantity(self) -> int:
         """
@@ -189,30 +461,302 @@ class Store:
 
 		:return: (int) The total quantity of all products in the store
 		"""
-        total_quantity: int = 0
-        for product in self.products_list:
-            total_quantity += product.quantity
-        return total_quantity
+        return self._total_quantity
+
+    def get_active_count(self) -> int:
+        """
+		Returns the number of active products in the store.
+
+		:return: (int) The number of active products in the store
+		"""
+        return len(self._active_products)
+
+    def _register_product(self, product: Product):
+        """
+        Starts tracking a product that has been added to the store.
+
+        :param product: (Product) The product that has been added.
+
+        Raises:
+            ValueError: If the product already belongs to a store.
+        """
+        with self._search_lock, self._aggregate_lock:
+            self._check_unowned([product])
+            self._products_by_name.setdefault(product.name, product)
+            product._store = self
+            self._positions[id(product)] = self._next_position
+            self._next_position += 1
+            if self._search_index is not None:
+                self._search_index.add(self._positions[id(product)], product)
+            self._total_quantity += product.quantity
+            self._version += 1
+            if product.is_active():
+                self._active_products[id(product)] = product
+                # the newest product has the highest position
+                self._active_sorted.append(product)
+                self._active_positions.append(self._positions[id(product)])
+                self._active_list = None
+                if self._price_index is not None:
+                    self._price_index.add(product.price, self._positions[id(product)], product)
+
+    @staticmethod
+    def _check_unowned(products: List[Product]):
+        """
+        Checks that products can be added to the store. A product tells a single store
+        about its changes, so it belongs to one store at a time, and only once.
+
+        :param products: (List[Product]) The products to add.
+
+        Raises:
+            ValueError: If a product already belongs to a store, or is given twice.
+        """
+        if len({id(product) for product in products}) < len(products):
+            raise ValueError("A product can't be added twice to a store.")
+        for product in products:
+            if product._store is not None:
+                raise ValueError(f"The product {product.name} already belongs to a store, "
+                                 "remove it from that store first.")
+
+    def _unregister_product(self, product: Product):
+        """
+        Stops tracking a product that has been removed from the store.
+
+        :param product: (Product) The product that has been removed.
+        """
+        with self._search_lock, self._aggregate_lock:
+            if product._store is self:
+                product._store = None
+            position = self._positions.pop(id(product))
+            if self._search_index is not None:
+                self._search_index.discard(position)
+            self._total_quantity -= product.quantity
+            self._version += 1
+            if self._active_products.pop(id(product), None) is not None:
+                self._remove_active(position)
+            if self._price_index is not None:
+                self._price_index.discard(product)
+
+    def on_quantity_changed(self, product: Product, delta: int):
+        """
+        Called by a product of the store when its quantity changes.
+
+        :param product: (Product) The product whose quantity changed.
+        :param delta: (int) The change of the quantity.
+        """
+        with self._aggregate_lock:
+            self._total_quantity += delta
+            self._version += 1
+        if self._listeners:
+            self._notify("on_stock_changed", product)
+
+    def on_active_changed(self, product: Product):
+        """
+        Called by a product of the store when it is activated or deactivated.
+
+        :param product: (Product) The product whose status changed.
+        """
+        with self._aggregate_lock:
+            position = self._positions[id(product)]
+            if product.is_active():
+                if id(product) not in self._active_products:
+                    self._active_products[id(product)] = product
+                    index = bisect_left(self._active_positions, position)
+                    self._active_positions.insert(index, position)
+                    self._active_sorted.insert(index, product)
+                    self._active_list = None
+                if self._price_index is not None:
+                    self._price_index.add(product.price, position, product)
+            else:
+                if self._active_products.pop(id(product), None) is not None:
+                    self._remove_active(position)
+                if self._price_index is not None:
+                    self._price_index.discard(product)
+            self._version += 1
+        if self._listeners:
+            self._notify("on_stock_changed", product)
+
+    def on_price_changed(self, product: Product):
+        """
+        Called by a product of the store when its price changes.
+
+        :param product: (Product) The product whose price changed.
+        """
+        with self._aggregate_lock:
+            self._version += 1
+            if self._price_index is not None and product in self._price_index:
+                self._price_index.add(product.price, self._positions[id(product)], product)
+        if self._listeners:
+            self._notify("on_price_changed", product)
+
+    def on_promotion_changed(self, product: Product):
+        """
+        Called by a product of the store when its promotion, or its per order limit,
+        changes.
+
+        :param product: (Product) The product whose promotion changed.
+        """
+        with self._aggregate_lock:
+            self._version += 1
+        if self._listeners:
+            self._notify("on_promotion_changed", product)
+
+    def _remove_active(self, position: int):
+        """
+        Removes a product from the sorted active products, the aggregate lock must be held.
+
+        :param position: (int) The position of the product.
+        """
+        index = bisect_left(self._active_positions, position)
+        del self._active_positions[index]
+        del self._active_sorted[index]
+        self._active_list = None
+
+    def _get_price_index(self) -> PriceIndex:
+        """
+        Returns the price index of the active products, it is built on first use.
+
+        :return: (PriceIndex) The index.
+        """
+        with self._aggregate_lock:
+            if self._price_index is None:
+                self._price_index = PriceIndex(
+                    (product.price, self._positions[id(product)], product)
+                    for product in self._active_products.values())
+            return self._price_index
+
+    def _get_search_index(self) -> SearchIndex:
+        """
+        Returns the search index of the product names, it is built on first use. The
+        caller holds _search_lock.
+
+        :return: (SearchIndex) The index.
+        """
+        if self._search_index is None:
+            with self._aggregate_lock:
+                documents = [(self._positions[id(product)], product)
+                             for product in self.products_list]
+            # the catalog can't change while _search_lock is held, the checkouts go on
+            self._search_index = SearchIndex(documents)
+        return self._search_index
+
+    def search_products(self, query: str, limit: int = 10, fuzzy: bool = True,
+                        active_only: bool = False) -> List[Product]:
+        """
+		Find products by partial names, such as "pixel" or "macbook air", every word of
+		the query must start a word of the product name.
+
+		:param query: (str) The query.
+		:param limit: (int) The largest number of results.
+		:param fuzzy: (bool) Whether the results are completed with names matching the
+		              query despite a few typos, when there are less than limit results.
+		:param active_only: (bool) Whether inactive products are left out.
+		:return: (List[Product]) The best matching products, best first.
+		"""
+        with self._search_lock:
+            index = self._get_search_index()
+            results = index.search(query, limit, active_only)
+            if fuzzy and len(results) < limit:
+                found = {id(product) for product in results}
+                results.extend([product for product in
+                                index.fuzzy_search(query, limit, active_only=active_only)
+                                if id(product) not in found][:limit - len(results)])
+        return results
+
+    def get_products_in_price_range(self, min_price: float, max_price: float) -> List[Product]:
+        """
+		Get the active products priced between two prices, cheapest first.
+
+		:param min_price: (float) The lowest price, included.
+		:param max_price: (float) The highest price, included.
+		:return: (List[Product]) The products within the price range.
+		"""
+        index = self._get_price_index()
+        with self._aggregate_lock:
+            return list(index.price_range(min_price, max_price))
+
+    def get_cheapest_products(self, count: int) -> List[Product]:
+        """
+		Get the cheapest active products.
+
+		:param count: (int) The number of products.
+		:return: (List[Product]) The count cheapest products, cheapest first.
+		"""
+        index = self._get_price_index()
+        with self._aggregate_lock:
+            return index.cheapest(count)
+
+    def get_products_by_price(self, page: int = 1, page_size: int = 20) -> List[Product]:
+        """
+		Get a page of the active products sorted by price, cheapest first.
+
+		:param page: (int) The number of the page, starting at 1.
+		:param page_size: (int) The number of products per page.
+		:return: (List[Product]) The products of the page, empty past the last page.
+
+		Raises:
+			ValueError: If the page or the page size is not positive.
+		"""
+        if page < 1 or page_size < 1:
+            raise ValueError("The page and the page size must be positive.")
+        index = self._get_price_index()
+        with self._aggregate_lock:
+            return index.slice((page - 1) * page_size, page * page_size)
+
+    def add_listener(self, listener):
+        """
+        Registers an object to be told about the changes of the store.
+
+        The listener may define any of the following methods, they are called after
+        the change has been made:
+            on_product_added(product), on_product_removed(product),
+            on_stock_changed(product): the quantity or the active status changed,
+            on_price_changed(product), on_promotion_changed(product),
+            on_order_confirmed(receipt).
+
+        :param listener: The object to register.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregisters an object registered with add_listener.
+
+        :param listener: The object to unregister.
+        """
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, *args):
+        """
+        Calls the handler of an event on every listener defining it.
+
+        :param event: (str) The name of the handler.
+        :param args: The arguments of the handler.
+        """
+        for listener in self._listeners:
+            handler = getattr(listener, event, None)
+            if handler is not None:
+                handler(*args)
 
     def display_total_quantity(self):
         """
 		Display the total number of all products in the store.
 		"""
         total_quantity = self.get_total_quantity()
-        print(f"\nTotal of {total_quantity} items in store")
+        self.io.print(f"\nTotal of {total_quantity} items in store")
 
-    def init_order_list(self) -> List:
+    def init_order_list(self) -> Cart:
         """
 		Initializes the order list.
 
-        This method is used to create an empty order list when it's first initialized
+        This method is used to create an empty order cart when it's first initialized
 
-		:return: (list): An empty order list.
+		:return: (Cart): An empty order cart.
 		"""
         # if len(self.purchased_list) > 0:
         # 	return self.purchased_list
         self.purchased_list = []
-        return []
+        return Cart()
 
     def specify_product_quantity(self, max_num, selected_index, items_list, order_list):
         """
@@ -222,7 +766,7 @@ class Store:
 
         :param selected_index: The index of the selected product in the items_list
         :param items_list: A list of available products
-        :param order_list: The current order list
+        :param order_list: (Cart) The current order cart
 
         :return:
             tuple: A tuple containing the order status (True for confirmed, False for cancelled) and
@@ -251,7 +795,7 @@ class Store:
             if isinstance(items_list[selected_index], LimitedProduct):
                 temp_product: LimitedProduct = items_list[selected_index]
                 if quantity > temp_product.get_limit():
-                    Store.display_limit_message(temp_product.limit, items_list[selected_index].name)
+                    self.display_limit_message(temp_product.limit, items_list[selected_index].name)
                     continue
 
             # if quantity is zero then cancel the current process and ignore it.
@@ -277,20 +821,21 @@ class Store:
                 max_num = quantity - qty_to_adjust
                 if max_num == 0:
                     # print(f"No more items available from {items_list[selected_index].name}")
-                    print(f"The {items_list[selected_index].name} is currently out of stock.")
-                    print(f"{items_list[selected_index].name} item is deactivated!")
+                    self.io.print(f"The {items_list[selected_index].name} is currently"
+                                  " out of stock.")
+                    self.io.print(f"{items_list[selected_index].name} item is deactivated!")
                     break
-                print("--- The available quantity for purchase is insufficient, "
-                      f"with a maximum limit of {max_num} units. ---")
+                self.io.print("--- The available quantity for purchase is insufficient, "
+                              f"with a maximum limit of {max_num} units. ---")
                 continue
 
             # if every thing went smoothly,it indicates that the process has been accepted
             # and successful
             if success and qty_to_adjust == 0:
                 # is_accepted = True
-                print(f"  <---- You have successfully added {quantity} of "
-                      f"{items_list[selected_index].name}"
-                      " to your order. ---->")
+                self.io.print(f"  <---- You have successfully added {quantity} of "
+                              f"{items_list[selected_index].name}"
+                              " to your order. ---->")
                 self.purchased_list = order_list
                 break
         return order_status, order_is_done
@@ -305,11 +850,11 @@ class Store:
 
         # check if the store is empty
         if max_num == 0:
-            print("--- Currently, there are no items available for sale in the store."
-                  "Please visit us again later! ---")
+            self.io.print("--- Currently, there are no items available for sale in the store."
+                          "Please visit us again later! ---")
             return
 
-        Store.order_intro()
+        self.order_intro()
 
         # prepare the valid options menu
         options = Store.make_option_list(0, max_num + 1)
@@ -350,7 +895,7 @@ class Store:
             selected_index = int(selected_item) - 1
 
             # find the maximum available quantity
-            max_num = items_list[selected_index].quantity
+            max_num = self.available_quantity(items_list[selected_index], order_list)
             # print(type(items_list[selected_index]))
             if isinstance(items_list[selected_index], NonStockedProduct):
                 # Ensure that the maximum number of items does not exceed the policy limit
@@ -358,19 +903,23 @@ class Store:
                 # print(max_num)
             order_status, order_is_done = self.specify_product_quantity(max_num, selected_index,
                                                                         items_list, order_list)
-            print("")
+            self.io.print("")
         # If the order is confirmed, proceed to generate a summary or bill
         # for the completed order
         if order_status == confirmed_status:
             # total_price = self.order(order_list)
             if len(order_list) > 0:
-                print("--- Order confirmed ---")
-                print("You have purchased the following items:")
-                self.display_order_summary(order_list, self.order(order_list))
+                self.io.print("--- Order confirmed ---")
+                self.io.print("You have purchased the following items:")
+                receipt = self.checkout(self.resolve_lines(order_list),
+                                        cart_id=order_list.cart_id)
+                self.display_order_summary(order_list, receipt.total, receipt.order_id)
                 # self.purchased_list = order_list
         else:
             # Inform the customer that the order has been cancelled
-            print("--- Order cancelled ----")
+            self.io.print("--- Order cancelled ----")
+        if self.reservations is not None:
+            self.reservations.release(order_list.cart_id)
 
     def find_product_by_name(self, product_name: str) -> Optional[Product]:
         """
@@ -378,18 +927,15 @@ class Store:
 
 		:return: (Product) Return the product if found; otherwise, return None
 		"""
-        for product in self.products_list:
-            if product.name == product_name:
-                return product
-        return None
+        return self._products_by_name.get(product_name)
 
-    def add_product_to_order(self, product_name, req_quantity, lst: List[Tuple[str, int]]) -> Tuple:
+    def add_product_to_order(self, product_name, req_quantity, cart: Cart) -> Tuple:
         """
-		Adds a product to the order list.
+		Adds a product to the order cart.
 
 		:param: product_name (str): The name of the product.
 		:param: req_quantity (int): The requested quantity of the product.
-		:param:lst (List[Tuple[str, int]]): The order list as a list of tuples.
+		:param: cart (Cart): The order cart.
 
 		:return: Tuple[bool, int]: A tuple containing the success status of adding the product
 									(True if successful, False otherwise) and the quantity
@@ -397,75 +943,299 @@ class Store:
 									(positive value indicating the shortage)
 		"""
         product = self.find_product_by_name(product_name)
+        old_quantity = cart.quantity_of(product_name)
+        if self.reservations is not None:
+            # the line is held for the cart, the other carts can't take it meanwhile
+            missing = self.reservations.reserve(cart.cart_id, product, old_quantity + req_quantity)
+            if missing > 0:
+                return False, missing
+            cart.add(product, req_quantity)
+            return True, 0
+
         available_quantity = product.quantity
         if isinstance(product, NonStockedProduct):
             available_quantity = 2 ** 32
 
-        for index, item in enumerate(lst):
-            if item[0] == product_name:
-                old_item = item
-                old_quantity = old_item[1]
-                if (old_quantity + req_quantity) > available_quantity:
-                    return False, abs(available_quantity - old_quantity - req_quantity)
-                item = (old_item[0], old_quantity + req_quantity)
-                lst[index] = item
-                # print(f"item = {item[0]} , {item[1]} ")
-                # print(f"item = {lst[index][0]} , {lst[index][1]} ")
-                return True, 0
-        if req_quantity > available_quantity:
-            return False, abs(available_quantity - req_quantity)
-        lst.append((product_name, req_quantity))
+        if (old_quantity + req_quantity) > available_quantity:
+            return False, abs(available_quantity - old_quantity - req_quantity)
+        cart.add(product, req_quantity)
         return True, 0
 
+    def available_quantity(self, product: Product, cart: Optional[Cart] = None) -> int:
+        """
+		Returns the quantity of a product that can be ordered, the quantity on hand minus
+		the quantity held by the other carts.
+
+		:param product: (Product) The product.
+		:param cart: (Cart, optional) The cart asking, its own holds are available to it.
+		:return: (int) The available quantity.
+		"""
+        if self.reservations is None:
+            return product.quantity
+        return self.reservations.available(product, getattr(cart, "cart_id", None))
+
     @classmethod
-    def generate_order_id(cls, num_cells: int):
+    def generate_order_id(cls, num_cells: Optional[int] = None):
         """
-		Generates a random order ID with a fixed number of cell
+		Generates a unique order ID, see order_ids.OrderIdAllocator.
 
-		:return: (str) The generated random order ID
+		:param num_cells: Unused, the order IDs have a fixed length.
+		:return: (str) The generated order ID
 		"""
-        chars = string.ascii_letters + string.digits
-        order_id = "".join(random.choices(chars, k=num_cells)).upper()
-        return order_id
+        return cls.order_ids.next_id()
 
-    @staticmethod
-    def display_order_summary(order_list: List[Product], total_price: float) -> None:
+    def get_receipt(self, order_id: str) -> Optional[Receipt]:
+        """
+		Finds the receipt of an order confirmed by the store.
+
+		:param order_id: (str) The ID of the order.
+		:return: (Receipt) The receipt of the order, None if the store has no such order.
+		"""
+        return self._receipts.get(order_id)
+
+    def display_order_summary(self, order_list: Cart, total_price: float,
+                              order_id: Optional[str] = None) -> None:
         """
         Displays the order summary.
 
-        :param order_list: (List[Product]): A list of products in the order, along with
+        :param order_list: (Cart): The order cart, the products in the order along with
                             their quantities
         :param total_price: The total price of the order
+        :param order_id: The ID of the order, a new one is generated if not given
         :return: None
         """
-        order_id = Store.generate_order_id(9)
-        print(f"\n  <---- Order #{order_id} Summary ---->")
-        print(" You have successfully purchased the following:")
+        if order_id is None:
+            order_id = Store.generate_order_id()
+        self.io.print(f"\n  <---- Order #{order_id} Summary ---->")
+        self.io.print(" You have successfully purchased the following:")
         for index, obj in enumerate(order_list, start=1):
-            print(f"{index}. {obj[0].ljust(18)} - Qty: {obj[1]}")
-        print("------------------------------------------")
-        print(f"   Total price:         ${total_price}")
+            self.io.print(f"{index}. {obj[0].ljust(18)} - Qty: {obj[1]}")
+        self.io.print("------------------------------------------")
+        self.io.print(f"   Total price:         ${format_cents(to_cents(total_price))}")
+
+    def resolve_lines(self, shopping_list: Union[Cart, List[Tuple[str, int]]]) \
+            -> List[Tuple[Product, int]]:
+        """
+        Resolves a shopping list into (product, quantity) lines, the products that
+        are not in the store are skipped.
 
-    def order(self, shopping_list: List[Tuple[str, int]]) -> float:
+        :param shopping_list: (Cart or List[Tuple[str, int]]): The order cart, or a shopping
+                              list containing the product names and quantities
+        :return: (List[Tuple[Product, int]]) The lines of the shopping list.
+        """
+        if isinstance(shopping_list, Cart):
+            # the cart already holds the products, no need to resolve the names
+            return [(line.product, line.quantity) for line in shopping_list.lines()]
+        lines = []
+        for name, quantity in shopping_list:
+            product = self.find_product_by_name(name)
+            if product is not None:
+                lines.append((product, quantity))
+        return lines
+
+    def quote(self, shopping_list: Union[Cart, List[Tuple[str, int]]]) -> float:
+        """
+        Calculates the total price of a shopping list without buying it.
+
+        :param shopping_list: (Cart or List[Tuple[str, int]]): The order cart, or a shopping
+                              list containing the product names and quantities
+        :return: float: The total price of the shopping list.
+        """
+        lines = [(product, quantity) for product, quantity in self.resolve_lines(shopping_list)
+                 if product.is_active()]
+        return to_amount(sum(price_lines_cents(lines)))
+
+    @contextmanager
+    def locked_products(self, products: Iterable[Product]):
+        """
+        Context manager holding the locks of the given products.
+
+        The locks are taken in product name order, every caller uses the same order so
+        two orders sharing products can't deadlock.
+
+        :param products: (Iterable[Product]) The products to lock.
+        """
+        names = sorted({product.name for product in products})
+        with ExitStack() as stack:
+            for name in names:
+                lock = self._product_locks.get(name)
+                if lock is None:
+                    lock = self._product_locks.setdefault(name, threading.Lock())
+                stack.enter_context(lock)
+            yield
+
+    def checkout(self, lines: List[Tuple[Product, int]], skip_inactive: bool = True,
+                 cart_id: Optional[int] = None) -> Receipt:
+        """
+        Buys the given lines atomically and returns the receipt of the order.
+
+        The products of the order are locked, the stock of every line is checked before
+        any of it is taken, so the order either buys every line or nothing. The stock held
+        by other carts is not available, the holds of the cart of the order are turned
+        into the sale. The purchased lines are then priced together, one batch per promotion.
+
+        :param lines: (List[Tuple[Product, int]]): The (product, quantity) lines to buy.
+        :param skip_inactive: (bool) Whether the lines of inactive products are skipped,
+                              otherwise they reject the order.
+        :param cart_id: (int, optional) The ID of the cart of the order.
+        :return: (Receipt) The receipt of the order.
+
+        Raises:
+            OrderRejected: If a product has insufficient quantity available, or is
+                           inactive and skip_inactive is False.
+        """
+        with self.locked_products(product for product, _ in lines):
+            demand: Dict[int, int] = {}
+            purchased_lines = []
+            for product, quantity in lines:
+                if not product.is_active():
+                    if skip_inactive:
+                        continue
+                    raise OrderRejected(f"The {product.name} is currently out of stock.")
+                if not isinstance(product, NonStockedProduct):
+                    demand[id(product)] = demand.get(id(product), 0) + quantity
+                    available = product.quantity if self.reservations is None \
+                        else self.reservations.available(product, cart_id)
+                    if demand[id(product)] > available:
+                        raise OrderRejected(f"The {product.name} has insufficient quantity "
+                                            "available.")
+                purchased_lines.append((product, quantity))
+
+            saved_state = [(product, product.quantity, product.is_active())
+                           for product, _ in purchased_lines]
+            try:
+                for product, quantity in purchased_lines:
+                    product.deduct_stock(quantity)
+            except Exception:
+                for product, quantity, active in reversed(saved_state):
+                    product.quantity = quantity
+                    product.active = active
+                raise
+            if self.reservations is not None and cart_id is not None:
+                self.reservations.release(cart_id)
+        return self.make_receipt(purchased_lines)
+
+    def make_receipt(self, purchased_lines: List[Tuple[Product, int]]) -> Receipt:
+        """
+        Prices the lines of an order already bought, records its receipt and tells the
+        listeners about it.
+
+        :param purchased_lines: (List[Tuple[Product, int]]) The (product, quantity) lines bought.
+        :return: (Receipt) The receipt of the order.
+        """
+        receipt_lines = []
+        line_totals = price_lines_cents(purchased_lines)
+        for (product, quantity), line_total in zip(purchased_lines, line_totals):
+            receipt_lines.append(ReceiptLine(product.name, quantity, product.price,
+                                             getattr(product.promotion, "name", None),
+                                             to_amount(line_total)))
+        # the lines are added in cents, the total is exactly the sum of the lines
+        receipt = Receipt(self.generate_order_id(), receipt_lines, to_amount(sum(line_totals)))
+        self._receipts[receipt.order_id] = receipt
+        if self._listeners:
+            self._notify("on_order_confirmed", receipt)
+        return receipt
+
+    def order(self, shopping_list: Union[Cart, List[Tuple[str, int]]]) -> float:
         """
 		Place an order for a given shopping list and calculate the total price.
 
-		:param: shopping_list:  (List[Tuple[Product, int]]): The shopping list containing
-								the products and quantities
+		:param: shopping_list:  (Cart or List[Tuple[str, int]]): The order cart, or a shopping
+								list containing the product names and quantities
 		:return: float: The total price of the order.
+
+		Raises:
+			OrderRejected: If a product has insufficient quantity available, in which
+			case nothing is bought.
 		"""
-        total_price: float = 0.0
-        for item in shopping_list:
-            # product.quantity -= quantity
-            for product in self.products_list:
-                if product.name == item[0]:
-                    _, price = product.buy(item[1])
-                    total_price += price
-                    break
-        return total_price
+        return self.checkout(self.resolve_lines(shopping_list),
+                             cart_id=getattr(shopping_list, "cart_id", None)).total
 
-    @staticmethod
-    def valid_input(prompt, options):
+    def validate_order(self, shopping_list: Union[Cart, List[Tuple[str, int]]],
+                       check_stock: bool = True) -> List[Tuple[Product, int]]:
+        """
+        Checks a shopping list against the rules of the store, the same rules the
+        interactive ordering applies, and merges the lines of the same product.
+
+        :param shopping_list: (Cart or List[Tuple[str, int]]): The order cart, or a shopping
+                              list containing the product names and quantities
+        :param check_stock: (bool) Whether the available quantities are checked, the
+                            callers allocating the stock themselves skip it.
+        :return: (List[Tuple[Product, int]]) The merged lines of the shopping list.
+
+        Raises:
+            OrderRejected: If the shopping list is empty, names an unknown or inactive product,
+                           orders a non positive quantity, more than the limit of a
+                           LimitedProduct, more than the policy allows of a NonStockedProduct
+                           or more than the available quantity of a product when
+                           check_stock is True.
+        """
+        cart = shopping_list if isinstance(shopping_list, Cart) else None
+        merged: Dict[str, List] = {}
+        for name, quantity in shopping_list:
+            if not isinstance(quantity, int) or quantity <= 0:
+                raise OrderRejected(f"Invalid quantity {quantity!r} for {name}.")
+            line = merged.get(name)
+            if line is None:
+                product = self.find_product_by_name(name)
+                if product is None:
+                    raise OrderRejected(f"The {name} is not available in the store.")
+                merged[name] = [product, quantity]
+            else:
+                line[1] += quantity
+        if not merged:
+            raise OrderRejected("The order is empty.")
+
+        for product, quantity in merged.values():
+            if not product.is_active():
+                raise OrderRejected(f"The {product.name} is currently out of stock.")
+            if isinstance(product, LimitedProduct) and quantity > product.get_limit():
+                raise OrderRejected(f"Only {product.get_limit()} units are allowed from "
+                                    f"{product.name} per order.")
+            if isinstance(product, NonStockedProduct):
+                if quantity > Store.OUR_POLICY_MAX_ALLOWED_ITEMS:
+                    raise OrderRejected("Non stocked items are limited to "
+                                        f"{Store.OUR_POLICY_MAX_ALLOWED_ITEMS} units per order.")
+            elif check_stock and quantity > self.available_quantity(product, cart):
+                raise OrderRejected(f"The {product.name} has insufficient quantity available.")
+        return [(product, quantity) for product, quantity in merged.values()]
+
+    def submit_order(self, shopping_list: Union[Cart, List[Tuple[str, int]]]) -> Receipt:
+        """
+        Places an order without any console I/O.
+
+        The whole shopping list is validated before anything is bought, and the stock is
+        checked again under the locks of the products, so a rejected order leaves the
+        stock untouched even with concurrent orders.
+
+        :param shopping_list: (Cart or List[Tuple[str, int]]): The order cart, or a shopping
+                              list containing the product names and quantities
+        :return: (Receipt) The receipt of the order.
+
+        Raises:
+            OrderRejected: If the order breaks the rules of the store, see validate_order.
+        """
+        return self.checkout(self.validate_order(shopping_list), skip_inactive=False,
+                             cart_id=getattr(shopping_list, "cart_id", None))
+
+    def submit_orders(self, shopping_lists: Iterable[Union[Cart, List[Tuple[str, int]]]]) \
+            -> List[Union[Receipt, OrderRejected]]:
+        """
+        Places many orders in one call, in the given order.
+
+        :param shopping_lists: The shopping lists of the orders.
+        :return: (List[Union[Receipt, OrderRejected]]) For every order, its receipt or
+                  the error that rejected it.
+        """
+        results = []
+        for shopping_list in shopping_lists:
+            try:
+                results.append(self.submit_order(shopping_list))
+            except OrderRejected as error:
+                results.append(error)
+        return results
+
+    def valid_input(self, prompt, options):
         """
 		Validates user input against a list of options.
 
@@ -477,13 +1247,12 @@ class Store:
 		:return: (str) The user's input, which is a valid option.
 		"""
         while True:
-            option = input(prompt).lower()
+            option = self.io.input(prompt).lower()
             if option in options:
                 return option
-            print(f"\n*** Sorry, the option {option} is invalid. Try again! ***\n")
+            self.io.print(f"\n*** Sorry, the option {option} is invalid. Try again! ***\n")
 
-    @staticmethod
-    def valid_range(prompt: str, the_range: range, non_stocked_product: bool,
+    def valid_range(self, prompt: str, the_range: range, non_stocked_product: bool,
                     previously_added_quantity: int) -> int:
         """
         Validates and returns a quantity within the specified range.
@@ -503,7 +1272,7 @@ class Store:
         start = the_range.start
         end = the_range.stop
         while True:
-            option = input(prompt).lower()
+            option = self.io.input(prompt).lower()
             if option == "0":  # == "0" or option == "":
                 return 0
             if option == "":
@@ -516,23 +1285,23 @@ class Store:
                         else:
                             max_items = end
                         if int(option) > max_items:
-                            print("\n*** Sorry, we have a policy in place that restricts the number"
-                                  " of non stocked "
-                                  f"items per order to a maximum of {end} units.\nSince you have"
-                                  " already purchased "
-                                  f"{previously_added_quantity} items, you can still buy an "
-                                  f"additional {max_items} within"
-                                  " the allowed limit")
+                            self.io.print("\n*** Sorry, we have a policy in place that"
+                                          " restricts the number of non stocked "
+                                          f"items per order to a maximum of {end} units."
+                                          "\nSince you have already purchased "
+                                          f"{previously_added_quantity} items, you can still"
+                                          f" buy an additional {max_items} within"
+                                          " the allowed limit")
                             return -1
                     return int(option)
 
                 if non_stocked_product:
-                    print("\n*** Sorry, we have a policy in place that restricts the"
-                          " number of non stocked "
-                          f"items per order to a maximum of {end} units.")
+                    self.io.print("\n*** Sorry, we have a policy in place that restricts the"
+                                  " number of non stocked "
+                                  f"items per order to a maximum of {end} units.")
                 else:
-                    print(f"\n*** Sorry, the option {option} is invalid. Maximum available"
-                          f" quantity is ({end}) Try again! ***\n")
+                    self.io.print(f"\n*** Sorry, the option {option} is invalid. Maximum available"
+                                  f" quantity is ({end}) Try again! ***\n")
             else:
-                print("*** Invalid option.*** Make sure to enter numeric values between"
-                      f" {start, end}")
+                self.io.print("*** Invalid option.*** Make sure to enter numeric values between"
+                              f" {start, end}")
@@ -0,0 +1,163 @@
+"""
+store_io.py - Module file containing the I/O backends of the store
+
+The interactive flows of the store (the menu, the product listing, place_order and the
+prompts of valid_input and valid_range) read and write through an I/O object rather
+than calling input() and print() themselves. The console is the default, a buffered
+console saves the writes of the long listings, and an in-memory backend replays scripted
+input and captures the output, so the flows can be tested and driven at volume without
+a terminal.
+
+Classes:
+    StoreIO: The interface of the I/O backends.
+    ConsoleIO: Reads from and writes to the console.
+    BufferedIO: The console, with the output buffered until the next prompt.
+    MemoryIO: Reads scripted input and captures the output in memory.
+"""
+
+import sys
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Iterable, List, Optional, TextIO
+
+
+class StoreIO(ABC):
+    """
+    The interface of the I/O backends, print and input behave like the builtins.
+    """
+    @abstractmethod
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        """
+        Writes the values, separated by sep and followed by end.
+        """
+
+    @abstractmethod
+    def input(self, prompt: str = "") -> str:
+        """
+        Writes the prompt and reads a line.
+
+        :param prompt: (str) The prompt.
+        :return: (str) The line read, without its line break.
+
+        Raises:
+            EOFError: If there is no more input.
+        """
+
+    def flush(self):
+        """
+        Writes out the output held back, if any.
+        """
+
+
+class ConsoleIO(StoreIO):
+    """
+    Reads from and writes to the console, with the builtins.
+    """
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        print(*values, sep=sep, end=end)
+
+    def input(self, prompt: str = "") -> str:
+        return input(prompt)
+
+
+class BufferedIO(StoreIO):
+    """
+    The console, with the output buffered. The output is written out in one piece
+    before every prompt, when the buffer is full or on flush, so a listing of many
+    lines costs one write.
+
+    Attributes:
+        limit (int): The characters buffered before the output is written out.
+    """
+    def __init__(self, stream: Optional[TextIO] = None, input_stream: Optional[TextIO] = None,
+                 limit: int = 64 * 1024):
+        """
+        :param stream: (TextIO) The output, sys.stdout if not given.
+        :param input_stream: (TextIO) The input, read with the builtin input if not given.
+        :param limit: (int) The characters buffered before the output is written out.
+        """
+        self.limit = limit
+        self._stream = stream
+        self._input_stream = input_stream
+        self._buffer: List[str] = []
+        self._size = 0
+
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        text = sep.join(map(str, values)) + end
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.limit:
+            self.flush()
+
+    def input(self, prompt: str = "") -> str:
+        if self._input_stream is None:
+            self.flush()
+            return input(prompt)
+        self._buffer.append(prompt)
+        self.flush()
+        line = self._input_stream.readline()
+        if not line:
+            raise EOFError("No more input.")
+        return line.rstrip("\r\n")
+
+    def flush(self):
+        stream = self._stream if self._stream is not None else sys.stdout
+        if self._buffer:
+            stream.write("".join(self._buffer))
+            self._buffer.clear()
+            self._size = 0
+        stream.flush()
+
+
+class MemoryIO(StoreIO):
+    """
+    Reads scripted input and captures the output in memory. The transcript holds the
+    output with the prompts and the lines read, as a terminal would show them.
+    """
+    def __init__(self, inputs: Iterable[str] = (), capture: bool = True):
+        """
+        :param inputs: (Iterable[str]) The lines to read, in order.
+        :param capture: (bool) Whether to keep the output, the output is dropped when
+                        only the flow matters.
+        """
+        self._inputs = deque(inputs)
+        self._capture = capture
+        self._output: List[str] = []
+
+    def feed(self, *lines: str):
+        """
+        Adds lines to read after the ones not read yet.
+        """
+        self._inputs.extend(lines)
+
+    @property
+    def pending(self) -> int:
+        """
+        :return: (int) The number of lines not read yet.
+        """
+        return len(self._inputs)
+
+    @property
+    def output(self) -> str:
+        """
+        :return: (str) The transcript captured so far.
+        """
+        return "".join(self._output)
+
+    def clear(self):
+        """
+        Drops the transcript captured so far.
+        """
+        self._output.clear()
+
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        if self._capture:
+            self._output.append(sep.join(map(str, values)) + end)
+
+    def input(self, prompt: str = "") -> str:
+        if not self._inputs:
+            raise EOFError("No more scripted input.")
+        line = self._inputs.popleft()
+        if self._capture:
+            self._output.append(f"{prompt}{line}\n")
+        return line
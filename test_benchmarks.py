@@ -0,0 +1,21 @@
+from benchmarks import build_catalog, run_benchmarks, compare_with_baseline
+from products import NonStockedProduct, LimitedProduct
+
+
+def test_build_catalog_is_deterministic_and_mixed():
+    catalog = build_catalog(500, seed=1)
+
+    assert [product.price for product in catalog] == \
+        [product.price for product in build_catalog(500, seed=1)]
+    assert any(isinstance(product, NonStockedProduct) for product in catalog)
+    assert any(isinstance(product, LimitedProduct) for product in catalog)
+    assert any(product.promotion for product in catalog)
+
+
+def test_compare_with_baseline_flags_slowdowns():
+    results = run_benchmarks([200], repeat=1)
+    slower = {"results": [dict(result, us_per_operation=result["us_per_operation"] * 2)
+                          for result in results["results"]]}
+
+    assert compare_with_baseline(results, results, threshold=0.25) == []
+    assert len(compare_with_baseline(slower, results, threshold=0.25)) == len(results["results"])
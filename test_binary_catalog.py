@@ -0,0 +1,61 @@
+import pytest
+from binary_catalog import MappedCatalog, write_catalog
+from main import create_promotions, create_store
+from product_table import ColumnarStore
+from products import LimitedProduct, NonStockedProduct
+
+
+def test_mapped_catalog_serves_the_store(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    write_catalog(path, create_store().products_list)
+
+    catalog = MappedCatalog(path, create_promotions())
+    store = ColumnarStore(catalog)
+    try:
+        assert len(catalog) == 5
+        assert store.get_total_quantity() == 1100
+        assert store.get_active_count() == 5
+        assert isinstance(store.find_product_by_name("Windows License"), NonStockedProduct)
+        assert isinstance(store.find_product_by_name("Shipping"), LimitedProduct)
+        assert store.find_product_by_name("Apple Watch") is None
+        assert str(store.find_product_by_name("MacBook Air M2")) == \
+            "MacBook Air M2, Price: 1450.0, Quantity: 100, Promotion: Second Half price!"
+
+        receipt = store.submit_order([("MacBook Air M2", 2), ("Google Pixel 7", 250)])
+        assert receipt.total == 1450 * 1.5 + 500 * 250
+        assert store.find_product_by_name("Google Pixel 7").is_active() is False
+        with pytest.raises(ValueError):
+            store.add_product(LimitedProduct("Gift wrap", price=5, quantity=10, limit=1))
+    finally:
+        catalog.close()
+
+    reopened = MappedCatalog(path, create_promotions(), writable=False)
+    try:
+        store = ColumnarStore(reopened)
+        assert store.find_product_by_name("MacBook Air M2").quantity == 98
+        assert store.get_total_quantity() == 848
+        assert [product.name for product in store.get_products()[0]] == \
+            ["MacBook Air M2", "Bose QuietComfort Earbuds", "Windows License", "Shipping"]
+        # the orders of a read-only catalog are kept in memory
+        store.submit_order([("MacBook Air M2", 3)])
+        assert store.find_product_by_name("MacBook Air M2").quantity == 95
+    finally:
+        reopened.close()
+    reopened = MappedCatalog(path, create_promotions(), writable=False)
+    try:
+        assert ColumnarStore(reopened).find_product_by_name("MacBook Air M2").quantity == 98
+    finally:
+        reopened.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "catalog.bin"
+    path.write_bytes(b"not a catalog" * 20)
+
+    with pytest.raises(ValueError, match="not a binary catalog"):
+        MappedCatalog(str(path))
+
+    for content in (b"", b"BBCATLOG"):
+        path.write_bytes(content)
+        with pytest.raises(ValueError, match="not a binary catalog"):
+            MappedCatalog(str(path))
@@ -0,0 +1,87 @@
+import pytest
+from products import Product, NonStockedProduct, LimitedProduct
+from store import Store, OrderRejected
+from reservations import ReservationBook
+from flash_sale import OrderBatcher
+
+
+def make_store():
+    return Store([Product("Google Pixel 7", price=500, quantity=5),
+                  NonStockedProduct("Windows License", price=125),
+                  LimitedProduct("Shipping", price=10, quantity=250, limit=1)])
+
+
+class StockListener:
+    def __init__(self):
+        self.changes = []
+
+    def on_stock_changed(self, product):
+        self.changes.append((product.name, product.quantity))
+
+
+def test_batch_allocates_in_arrival_order():
+    store = make_store()
+    listener = StockListener()
+    store.add_listener(listener)
+
+    results = OrderBatcher(store).place_batch([
+        [("Google Pixel 7", 3)],
+        [("Google Pixel 7", 3), ("Windows License", 1)],
+        [("Shipping", 2)],
+        [("Google Pixel 7", 2), ("Shipping", 1)],
+        [("Google Pixel 7", 1)],
+    ])
+
+    assert results[0].total == 1500
+    assert isinstance(results[1], OrderRejected) and "insufficient" in str(results[1])
+    assert isinstance(results[2], OrderRejected) and "allowed" in str(results[2])
+    assert results[3].total == 1010
+    assert isinstance(results[4], OrderRejected)
+    pixel = store.find_product_by_name("Google Pixel 7")
+    assert pixel.quantity == 0 and not pixel.is_active()
+    assert store.get_receipt(results[3].order_id) is results[3]
+    # every product is updated once per batch, the pixel is also deactivated
+    assert listener.changes == [("Google Pixel 7", 0), ("Google Pixel 7", 0), ("Shipping", 249)]
+
+
+def test_partial_fills_take_what_is_left():
+    store = make_store()
+    results = OrderBatcher(store, partial=True).place_batch([
+        [("Google Pixel 7", 4)],
+        [("Google Pixel 7", 3), ("Windows License", 2)],
+        [("Google Pixel 7", 1)],
+    ])
+
+    assert [(line.product_name, line.quantity) for line in results[1].lines] == \
+        [("Google Pixel 7", 1), ("Windows License", 2)]
+    assert isinstance(results[2], OrderRejected)
+    assert store.find_product_by_name("Google Pixel 7").quantity == 0
+
+
+def test_batch_respects_the_holds_of_the_carts():
+    store = make_store()
+    book = ReservationBook(store)
+    cart = store.init_order_list()
+    store.add_product_to_order("Google Pixel 7", 2, cart)
+
+    results = OrderBatcher(store).place_batch([[("Google Pixel 7", 4)], [("Google Pixel 7", 3)],
+                                               cart])
+
+    assert isinstance(results[0], OrderRejected)
+    assert results[1].total == 1500 and results[2].total == 1000
+    assert len(book) == 0 and store.find_product_by_name("Google Pixel 7").quantity == 0
+
+
+def test_submitted_orders_resolve_their_futures():
+    store = make_store()
+    with OrderBatcher(store, window=0.01) as batcher:
+        futures = [batcher.submit([("Google Pixel 7", 2)]) for _ in range(3)]
+        unknown = batcher.submit([("iPhone", 1)])
+
+    assert [future.result().total for future in futures[:2]] == [1000, 1000]
+    with pytest.raises(OrderRejected):
+        futures[2].result()
+    with pytest.raises(OrderRejected):
+        unknown.result()
+    with pytest.raises(ValueError):
+        batcher.submit([("Google Pixel 7", 1)])
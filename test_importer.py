@@ -0,0 +1,87 @@
+from importer import import_catalog
+from main import create_promotions
+from products import NonStockedProduct, LimitedProduct
+from store import Store
+
+CSV_CATALOG = """name,price,quantity,kind,limit,promotion
+MacBook Air M2,1450,100,,,Second Half price!
+Windows License,125,,non_stocked,,30% off!
+Shipping,10,250,,1,
+,99,1,,,
+Google Pixel 7,-500,250,,,
+Bose QuietComfort Earbuds,250,500,product,,Black Friday
+"""
+
+JSONL_CATALOG = """{"name": "MacBook Air M2", "price": 1450, "quantity": 100}
+
+{"name": "Shipping", "price": 10, "quantity": 250, "kind": "limited", "limit": 1}
+{"name": "Broken", "price":
+{"name": "Windows License", "price": 125, "kind": "NonStockedProduct"}
+"""
+
+
+def test_import_csv_reports_invalid_rows(tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text(CSV_CATALOG)
+    store = Store([])
+    rejected = []
+
+    report = import_catalog(store, str(path), create_promotions(), chunk_size=2,
+                            on_error=rejected.append)
+
+    assert report.imported == 3
+    assert report.rejected == 3
+    assert [row.line_number for row in rejected] == [5, 6, 7]
+    assert "Unknown promotion" in rejected[2].message
+    assert isinstance(store.find_product_by_name("Windows License"), NonStockedProduct)
+    assert store.find_product_by_name("Shipping").get_limit() == 1
+    assert store.find_product_by_name("MacBook Air M2").promotion.name == "Second Half price!"
+    assert store.get_total_quantity() == 350
+
+
+def test_import_jsonl(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text(JSONL_CATALOG)
+    store = Store([])
+
+    report = import_catalog(store, str(path), create_promotions())
+
+    assert (report.imported, report.rejected) == (3, 1)
+    assert report.errors[0].line_number == 4
+    assert isinstance(store.find_product_by_name("Shipping"), LimitedProduct)
+    assert store.get_active_count() == 3
+
+
+def test_import_jsonl_rejects_rows_of_the_wrong_types(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text('{"name": "MacBook Air M2", "price": 1450, "promotion": ["x"]}\n'
+                    '{"name": "Shipping", "price": 10, "promotion": {"name": "x"}}\n'
+                    '{"name": "Google Pixel 7", "price": [500]}\n'
+                    '{"name": "Windows License", "price": 125, "kind": "non_stocked"}\n')
+    store = Store([])
+    rejected = []
+
+    report = import_catalog(store, str(path), create_promotions(), on_error=rejected.append)
+
+    assert (report.imported, report.rejected) == (1, 3)
+    assert [row.line_number for row in rejected] == [1, 2, 3]
+    assert "Invalid promotion" in rejected[0].message
+    assert store.find_product_by_name("Windows License") is not None
+
+
+def test_import_rejects_unusable_numbers(tmp_path):
+    path = tmp_path / "catalog.jsonl"
+    path.write_text('{"name": "Infinite", "price": "inf"}\n'
+                    '{"name": "Not a number", "price": "nan"}\n'
+                    '{"name": "Huge", "price": 1e308}\n'
+                    '{"name": "Half", "price": 10, "quantity": 2.5}\n'
+                    '{"name": "Half limit", "price": 10, "quantity": 5, "limit": 1.5}\n'
+                    '{"name": "Whole", "price": 10, "quantity": 3.0}\n')
+    store = Store([])
+    rejected = []
+
+    report = import_catalog(store, str(path), create_promotions(), on_error=rejected.append)
+
+    assert (report.imported, report.rejected) == (1, 5)
+    assert [row.line_number for row in rejected] == [1, 2, 3, 4, 5]
+    assert store.find_product_by_name("Whole").quantity == 3
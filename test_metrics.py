@@ -0,0 +1,71 @@
+import urllib.request
+import pytest
+import metrics
+from metrics import Registry, Histogram
+from products import Product
+from promotions import PercentDiscount
+from flash_sale import OrderBatcher
+from store import Store, OrderRejected
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram("latency_seconds", "Latency.")
+    for value in (0.5e-6, 3e-6, 3e-6, 0.010, 500):
+        histogram.observe(value)
+
+    assert histogram.count == 5
+    assert histogram.quantile(0.2) == 1e-6
+    assert 3e-6 <= histogram.quantile(0.6) <= 3e-6 * 1.25
+    assert 0.010 <= histogram.quantile(0.8) <= 0.010 * 1.25
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{le="+Inf"} 5' in lines
+    assert lines[-1] == "latency_seconds_count 5"
+
+
+def test_enable_instruments_hot_paths_and_disable_restores_them(tmp_path):
+    original_order = Store.order
+    registry = metrics.enable(Registry())
+    try:
+        mac = Product("MacBook Air M2", price=1450, quantity=10)
+        mac.set_promotion(PercentDiscount("30% off!", percent=30))
+        store = Store([mac])
+        registry.track_store(store)
+        store.order([("MacBook Air M2", 2)])
+        with pytest.raises(OrderRejected):
+            store.order([("MacBook Air M2", 20)])
+
+        assert registry.get("store_order_seconds").count == 2
+        assert registry.get("store_order_errors_total").value == 1
+        assert registry.get("store_checkout_seconds").count == 2
+        assert registry.get("store_checkout_errors_total").value == 1
+        # the orders take their stock with deduct_stock and are priced by batches
+        assert registry.get("product_deduct_stock_seconds").count == 1
+        assert registry.get("promotion_price_lines_seconds").count == 1
+        assert registry.get("promotion_apply_batch_seconds").count == 1
+
+        store.submit_order([("MacBook Air M2", 1)])
+        OrderBatcher(store).place_batch([[("MacBook Air M2", 1)], [("MacBook Air M2", 1)]])
+        assert registry.get("store_checkout_seconds").count == 3
+        assert registry.get("product_deduct_stock_seconds").count == 3
+        assert registry.get("promotion_price_lines_seconds").count == 4
+        assert registry.get("promotion_apply_batch_seconds").count == 4
+
+        assert registry.get("product_buy_seconds").count == 0
+        mac.buy(1)
+        assert registry.get("product_buy_seconds").count == 1
+        assert registry.get("product_deduct_stock_seconds").count == 4
+
+        server = registry.serve(0)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as reply:
+                text = reply.read().decode()
+        finally:
+            server.shutdown()
+        assert "store_total_quantity 4" in text
+        assert "# TYPE store_order_seconds histogram" in text
+
+        registry.write(str(tmp_path / "store.prom"))
+        assert (tmp_path / "store.prom").read_text() == registry.render()
+    finally:
+        metrics.disable()
+    assert Store.order is original_order and not metrics.is_enabled()
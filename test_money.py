@@ -0,0 +1,50 @@
+import pytest
+from money import (to_cents, to_amount, format_cents, divide, as_fraction,
+                   ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN, ROUND_UP)
+from products import Product
+from promotions import SecondHalfPrice, PercentDiscount, ThirdOneFree
+from store import Store
+
+
+def test_conversions_and_rounding_rules():
+    assert to_cents(19.99) == 1999 and to_cents(1450) == 145000 and to_cents(0.29) == 29
+    assert to_amount(181250) == 1812.5 and format_cents(181250) == "1812.50"
+    assert format_cents(-5) == "-0.05"
+    assert as_fraction(0.7) == (7, 10) and as_fraction(3) == (3, 1)
+
+    assert [divide(25, 10, rule) for rule in (ROUND_HALF_UP, ROUND_HALF_EVEN,
+                                              ROUND_DOWN, ROUND_UP)] == [3, 2, 2, 3]
+    assert divide(35, 10, ROUND_HALF_EVEN) == 4 and divide(40, 10, ROUND_UP) == 4
+    with pytest.raises(ValueError):
+        divide(1, 3, "sideways")
+
+
+def test_promotions_round_each_line_with_their_rule():
+    shirt = Product("Shirt", price=19.99, quantity=100)
+    shirt.set_promotion(SecondHalfPrice("Second Half price!"))
+    assert shirt.quote_cents(3) == 4998
+    shirt.set_promotion(SecondHalfPrice("Second Half price!", rounding=ROUND_DOWN))
+    assert shirt.quote_cents(3) == 4997
+
+    shirt.set_promotion(PercentDiscount("30% off!", percent=30))
+    assert shirt.quote_cents(1) == 1399 and shirt.quote(1) == 13.99
+    shirt.set_promotion(PercentDiscount("12.5% off!", percent=12.5, rounding=ROUND_UP))
+    assert shirt.quote_cents(1) == 1750
+    shirt.set_promotion(ThirdOneFree("Third One Free!"))
+    assert shirt.promotion.apply_promotion_batch_cents([1999, 10], [3, 7]) == [3998, 50]
+
+
+def test_totals_are_the_exact_sum_of_the_lines():
+    candies = [Product(f"Candy {index}", price=0.1, quantity=10) for index in range(10)]
+    store = Store(candies)
+    receipt = store.submit_order([(candy.name, 1) for candy in candies])
+
+    assert receipt.total == 1.0 and receipt.total_cents == 100
+    assert sum(line.line_total_cents for line in receipt.lines) == receipt.total_cents
+
+    cart = store.init_order_list()
+    for candy in candies:
+        store.add_product_to_order(candy.name, 3, cart)
+    assert cart.total_cents == 300 and cart.total_price == 3.0
+    cart.remove("Candy 0")
+    assert cart.total_cents == 270
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import threading
+import pytest
+from order_ids import OrderIdAllocator, parse_order_id
+
+
+def test_ids_are_unique_and_increase_per_thread():
+    allocator = OrderIdAllocator(shard=7)
+    per_thread = []
+
+    def allocate():
+        ids = [allocator.next_id() for _ in range(10000)]
+        per_thread.append(ids)
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_ids = [order_id for ids in per_thread for order_id in ids]
+    assert len(set(all_ids)) == 80000
+    assert all(ids == sorted(ids) for ids in per_thread)
+    assert {parse_order_id(order_id)[1] for order_id in all_ids} == {7}
+
+
+def test_clock_stepping_back_keeps_the_order():
+    times = iter([100.0, 100.5, 99.0])
+    allocator = OrderIdAllocator(shard=1, clock=lambda: next(times))
+
+    ids = [allocator.next_id() for _ in range(3)]
+
+    assert ids == sorted(ids)
+    assert [parse_order_id(order_id) for order_id in ids] == \
+        [(100000, 1, 0), (100500, 1, 1), (100500, 1, 2)]
+
+
+def _allocate(allocator, queue):
+    queue.put([allocator.next_id() for _ in range(1000)])
+
+
+def test_forked_processes_take_their_own_shard():
+    context = multiprocessing.get_context("fork")
+    allocator = OrderIdAllocator()
+    queue = context.Queue()
+    processes = [context.Process(target=_allocate, args=(allocator, queue)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    ids = queue.get() + queue.get() + [allocator.next_id() for _ in range(1000)]
+    for process in processes:
+        process.join()
+
+    assert len(set(ids)) == 3000
+    assert len({parse_order_id(order_id)[1] for order_id in ids}) == 3
+
+
+def test_invalid_shard():
+    with pytest.raises(ValueError):
+        OrderIdAllocator(shard=-1)
+
+
+def test_default_shard_is_the_whole_process_id(monkeypatch):
+    monkeypatch.setattr(os, "getpid", lambda: 4194303)
+    high = OrderIdAllocator(clock=lambda: 100.0)
+    monkeypatch.setattr(os, "getpid", lambda: 4194303 % 65536)
+    low = OrderIdAllocator(clock=lambda: 100.0)
+
+    # the two pids shared a shard when it was the pid modulo 65536
+    assert high.next_id() != low.next_id()
+    assert parse_order_id(high.next_id()) == (100000, 4194303, 1)
+    assert parse_order_id("000000186A000070000000001") == (100000, 7, 1)
@@ -0,0 +1,134 @@
+import threading
+import order_journal
+from main import create_promotions, create_store
+from order_journal import OrderJournal, iter_orders, read_index, replay, INDEX_SUFFIX
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_replay_rebuilds_the_inventory_at_any_time(tmp_path):
+    path = str(tmp_path / "orders.journal")
+    promotions = create_promotions()
+    store = create_store(promotions)
+    clock = FakeClock()
+    journal = OrderJournal(store, path, checkpoint_every=5, clock=clock)
+    for second in range(1, 21):
+        clock.now = 1000.0 + second
+        store.submit_order([("MacBook Air M2", 1), ("Shipping", 1)])
+    clock.now = 1030.0
+    store.find_product_by_name("Google Pixel 7").set_quantity(0)
+    journal.close()
+
+    # the checkpoints due while one is being written are skipped
+    assert len(read_index(path)) >= 2
+    for second in (0, 1, 7, 13, 20):
+        past = replay(path, 1000.0 + second, promotions)
+        assert past.find_product_by_name("MacBook Air M2").quantity == 100 - second
+        assert past.find_product_by_name("Shipping").quantity == 250 - second
+        assert past.find_product_by_name("Google Pixel 7").is_active() is True
+    assert replay(path, 1030.0, promotions).find_product_by_name("Google Pixel 7") \
+        .is_active() is False
+
+
+def test_replay_between_two_prices(tmp_path):
+    path = str(tmp_path / "orders.journal")
+    promotions = create_promotions()
+    store = create_store(promotions)
+    clock = FakeClock()
+    journal = OrderJournal(store, path, checkpoint_every=100, clock=clock)
+    pixel = store.find_product_by_name("Google Pixel 7")
+    clock.now = 1001.0
+    pixel.price = 450
+    pixel.set_promotion(promotions["Third One Free!"])
+    clock.now = 1002.0
+    pixel.price = 400
+    store.find_product_by_name("Shipping").set_limit(3)
+    clock.now = 1003.0
+    pixel.set_promotion(None)
+    journal.close()
+
+    before = replay(path, 1000.5, promotions).find_product_by_name("Google Pixel 7")
+    assert (before.price, before.promotion) == (500, None)
+    between = replay(path, 1001.5, promotions)
+    assert between.find_product_by_name("Google Pixel 7").price == 450
+    assert between.find_product_by_name("Google Pixel 7").promotion.name == "Third One Free!"
+    assert between.find_product_by_name("Shipping").limit == 1
+    after = replay(path, 1003.0, promotions)
+    assert after.find_product_by_name("Google Pixel 7").price == 400
+    assert after.find_product_by_name("Google Pixel 7").promotion is None
+    assert after.find_product_by_name("Shipping").limit == 3
+
+
+def test_orders_are_journaled_with_their_lines(tmp_path):
+    path = str(tmp_path / "orders.journal")
+    store = create_store(create_promotions())
+    clock = FakeClock()
+    journal = OrderJournal(store, path, checkpoint_every=3, clock=clock)
+    receipts = []
+    for second in range(1, 6):
+        clock.now = 1000.0 + second
+        receipts.append(store.submit_order([("MacBook Air M2", 2)]))
+    journal.close()
+
+    orders = list(iter_orders(path, 1002.0, 1004.0))
+    assert [order["order_id"] for order in orders] == \
+        [receipt.order_id for receipt in receipts[1:4]]
+    assert orders[0]["lines"] == [["MacBook Air M2", 2, 1450.0, "Second Half price!", 2175.0]]
+    assert orders[0]["total"] == 2175.0
+
+
+def test_reopened_journal_drops_a_torn_record(tmp_path):
+    path = str(tmp_path / "orders.journal")
+    promotions = create_promotions()
+    store = create_store(promotions)
+    clock = FakeClock()
+    journal = OrderJournal(store, path, clock=clock)
+    clock.now = 1001.0
+    store.submit_order([("MacBook Air M2", 1)])
+    journal.close()
+    with open(path, "ab") as file:
+        file.write(b'{"type":"stock","ts":1002.0,"name":"MacB')
+    (tmp_path / ("orders.journal" + INDEX_SUFFIX)).unlink()
+
+    journal = OrderJournal(store, path, clock=clock)
+    clock.now = 1003.0
+    store.submit_order([("MacBook Air M2", 1)])
+    journal.close()
+
+    assert replay(path, 1001.5, promotions).find_product_by_name("MacBook Air M2").quantity == 99
+    assert replay(path, 1003.0, promotions).find_product_by_name("MacBook Air M2").quantity == 98
+
+
+def test_checkpoints_are_written_off_the_checkout_thread(tmp_path, monkeypatch):
+    path = str(tmp_path / "orders.journal")
+    promotions = create_promotions()
+    store = create_store(promotions)
+    clock = FakeClock()
+    journal = OrderJournal(store, path, checkpoint_every=3, clock=clock)
+    pixel = store.find_product_by_name("Google Pixel 7")
+    copied_by = []
+    product_to_record = order_journal.product_to_record
+
+    def copy_during_a_change(product):
+        if not copied_by:
+            # a checkout changes the stock while the inventory is copied
+            clock.now = 1002.0
+            pixel.set_quantity(7)
+        copied_by.append(threading.current_thread())
+        return product_to_record(product)
+
+    monkeypatch.setattr(order_journal, "product_to_record", copy_during_a_change)
+    clock.now = 1001.0
+    store.submit_order([("MacBook Air M2", 1), ("Shipping", 1)])
+    journal.close()
+
+    assert copied_by and threading.current_thread() not in copied_by
+    assert len(read_index(path)) == 2
+    assert replay(path, 1001.0, promotions).find_product_by_name("Google Pixel 7").quantity == 250
+    assert replay(path, 1002.0, promotions).find_product_by_name("Google Pixel 7").quantity == 7
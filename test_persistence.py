@@ -0,0 +1,96 @@
+import os
+import time
+from main import create_promotions, create_store
+from products import Product
+from persistence import open_store, WriteAheadLog, read_snapshot
+
+
+def test_inventory_survives_restart(tmp_path):
+    promotions = create_promotions()
+    store, inventory = open_store(str(tmp_path), promotions, lambda: create_store(promotions))
+    store.submit_order([("MacBook Air M2", 3), ("Shipping", 1)])
+    store.find_product_by_name("Google Pixel 7").set_quantity(0)
+    store.add_product(Product("Apple Watch", price=400, quantity=7))
+    store.remove_product(store.find_product_by_name("Bose QuietComfort Earbuds"))
+    store.find_product_by_name("Google Pixel 7").price = 123
+    store.find_product_by_name("MacBook Air M2").set_promotion(promotions["30% off!"])
+    store.find_product_by_name("Shipping").set_limit(2)
+    store.find_product_by_name("Windows License").set_promotion(None)
+    store.submit_order([("MacBook Air M2", 1)])
+    inventory.close()
+
+    recovered, inventory = open_store(str(tmp_path), create_promotions())
+    inventory.close()
+
+    assert recovered.find_product_by_name("MacBook Air M2").quantity == 96
+    assert recovered.find_product_by_name("MacBook Air M2").promotion.name == "30% off!"
+    assert recovered.find_product_by_name("Google Pixel 7").price == 123
+    assert recovered.find_product_by_name("Shipping").limit == 2
+    assert recovered.find_product_by_name("Windows License").promotion is None
+    assert recovered.find_product_by_name("Shipping").quantity == 249
+    assert recovered.find_product_by_name("Google Pixel 7").is_active() is False
+    assert recovered.find_product_by_name("Apple Watch").quantity == 7
+    assert recovered.find_product_by_name("Bose QuietComfort Earbuds") is None
+    assert recovered.get_total_quantity() == store.get_total_quantity()
+
+
+def test_snapshots_bound_the_replayed_tail(tmp_path):
+    promotions = create_promotions()
+    store, inventory = open_store(str(tmp_path), promotions, lambda: create_store(promotions),
+                                  snapshot_every=10)
+    for _ in range(50):
+        store.submit_order([("Google Pixel 7", 1)])
+    inventory.snapshot()
+    store.submit_order([("Google Pixel 7", 1)])
+    inventory.close()
+
+    snapshot = read_snapshot(str(tmp_path))
+    tail = list(WriteAheadLog.read_records(str(tmp_path), snapshot["seq"]))
+    assert len(WriteAheadLog.segments(str(tmp_path))) <= 2
+    assert [record["op"] for record in tail] == ["stock", "order"]
+
+    recovered, inventory = open_store(str(tmp_path), promotions)
+    inventory.close()
+    assert recovered.find_product_by_name("Google Pixel 7").quantity == 199
+
+
+def test_torn_record_is_ignored(tmp_path):
+    promotions = create_promotions()
+    store, inventory = open_store(str(tmp_path), promotions, lambda: create_store(promotions))
+    store.submit_order([("MacBook Air M2", 1)])
+    inventory.close()
+    _, last_segment = WriteAheadLog.segments(str(tmp_path))[-1]
+    with open(last_segment, "ab") as file:
+        file.write(b'{"op":"stock","name":"MacBook Air M2","quan')
+
+    recovered, inventory = open_store(str(tmp_path), promotions)
+    recovered.submit_order([("MacBook Air M2", 1)])
+    inventory.close()
+    recovered, inventory = open_store(str(tmp_path), promotions)
+    inventory.close()
+
+    assert recovered.find_product_by_name("MacBook Air M2").quantity == 98
+    assert os.path.exists(os.path.join(str(tmp_path), "snapshot.json"))
+
+
+def test_log_writer_sleeps_while_idle(tmp_path):
+    log = WriteAheadLog(str(tmp_path), batch_size=100, flush_interval=0.001)
+    writes = []
+    write_pending = log._write_pending
+
+    def counted_write():
+        writes.append(len(log._pending))
+        write_pending()
+
+    log._write_pending = counted_write
+    seq = log.append({"op": "remove", "name": "Google Pixel 7"})
+    # written by the flush interval, without waiting for a full batch or a sync
+    deadline = time.monotonic() + 2
+    while not list(WriteAheadLog.read_records(str(tmp_path))) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    log.close()
+
+    assert [record["seq"] for record in WriteAheadLog.read_records(str(tmp_path))] == [seq]
+    # one write for the record and one by close, none while the log was idle
+    assert writes == [1, 0]
@@ -0,0 +1,35 @@
+import random
+import price_index
+from price_index import PriceIndex
+from products import Product
+
+
+def test_index_matches_a_sorted_list(monkeypatch):
+    monkeypatch.setattr(price_index, "BUCKET_SIZE", 4)
+    rand = random.Random(3)
+    products = [Product(f"Product {number}", price=rand.randint(1, 50), quantity=1)
+                for number in range(200)]
+    index = PriceIndex((product.price, number, product)
+                       for number, product in enumerate(products[:50]))
+    expected = {number: product.price for number, product in enumerate(products[:50])}
+    for _ in range(2000):
+        number = rand.randrange(len(products))
+        if rand.random() < 0.3:
+            index.discard(products[number])
+            expected.pop(number, None)
+        else:
+            price = rand.randint(1, 50)
+            index.add(price, number, products[number])
+            expected[number] = price
+
+    ordered = [products[number] for number, _ in
+               sorted(expected.items(), key=lambda item: (item[1], item[0]))]
+    assert list(index) == ordered
+    assert len(index) == len(ordered)
+    assert index.cheapest(7) == ordered[:7]
+    assert index.slice(13, 29) == ordered[13:29]
+    assert index.slice(len(ordered) - 2, len(ordered) + 10) == ordered[-2:]
+    assert list(index.price_range(10, 20)) == \
+        [products[number] for number, price in sorted(expected.items(),
+                                                      key=lambda item: (item[1], item[0]))
+         if 10 <= price <= 20]
@@ -110,3 +110,21 @@ def test_quick_test():
     print(pixel in best_buy)  # Should print False
 
     print(" ---> The test was successfully completed. <---\n")
+
+
+def test_products_are_slotted():
+    product = LimitedProduct("Shipping", price=10, quantity=250, limit=1)
+
+    assert not hasattr(product, "__dict__")
+    with pytest.raises(AttributeError):
+        product.colour = "red"
+
+
+def test_prices_must_be_finite():
+    for price in (float("inf"), float("nan"), 1e308):
+        with pytest.raises(ValueError):
+            Product("GGF", price, 1)
+    product = Product("GGF", 10, 1)
+    with pytest.raises(ValueError, match="finite"):
+        product.price = float("inf")
+    assert (product.price, product.price_cents) == (10, 1000)
@@ -0,0 +1,88 @@
+import pytest
+from products import Product, NonStockedProduct, LimitedProduct
+from product_table import ProductTable, ColumnarStore
+import promotions
+
+
+def make_store():
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    mac.set_promotion(promotions.SecondHalfPrice("Second Half price!"))
+    windows = NonStockedProduct("Windows License", price=125)
+    shipping = LimitedProduct("Shipping", price=10, quantity=250, limit=1)
+    empty = Product("Google Pixel 7", price=500, quantity=1)
+    empty.set_quantity(0)
+    return ColumnarStore(ProductTable.from_products([mac, windows, shipping, empty]))
+
+
+def test_views_behave_like_products():
+    best_buy = make_store()
+    mac = best_buy.find_product_by_name("MacBook Air M2")
+    windows = best_buy.find_product_by_name("Windows License")
+    shipping = best_buy.find_product_by_name("Shipping")
+
+    assert isinstance(windows, NonStockedProduct)
+    assert isinstance(shipping, LimitedProduct) and shipping.get_limit() == 1
+    assert str(mac) == "MacBook Air M2, Price: 1450.0, Quantity: 100, Promotion: Second Half price!"
+    assert mac in best_buy
+    assert Product("MacBook Air M2", price=1450, quantity=100) not in best_buy
+
+    _, price = mac.buy(2)
+    assert price == 1450 * 1.5
+    assert best_buy.find_product_by_name("MacBook Air M2").quantity == 98
+    with pytest.raises(ValueError):
+        mac.price = -1
+    mac._price_cents = 139999
+    assert best_buy.find_product_by_name("MacBook Air M2").price_cents == 139999
+
+
+def test_columnar_aggregates():
+    best_buy = make_store()
+
+    assert best_buy.get_total_quantity() == 350
+    assert [product.name for product in best_buy.get_products()[0]] == \
+        ["MacBook Air M2", "Windows License", "Shipping"]
+
+    assert best_buy.order([("Shipping", 1), ("Windows License", 3)]) == 10 + 3 * 125
+    best_buy.find_product_by_name("MacBook Air M2").set_quantity(0)
+    best_buy.remove_product(best_buy.find_product_by_name("Shipping"))
+
+    assert best_buy.get_total_quantity() == 0
+    assert best_buy.get_active_count() == 1
+    assert best_buy.find_product_by_name("Shipping") is None
+
+    best_buy.add_product(Product("Bose QuietComfort Earbuds", price=250, quantity=500))
+    assert best_buy.get_total_quantity() == 500
+    assert len(best_buy.table) == 4
+
+
+def test_columnar_price_queries():
+    best_buy = make_store()
+    best_buy.find_product_by_name("Shipping").price = 200
+
+    assert [product.name for product in best_buy.get_cheapest_products(2)] == \
+        ["Windows License", "Shipping"]
+    assert [product.name for product in best_buy.get_products_in_price_range(150, 1500)] == \
+        ["Shipping", "MacBook Air M2"]
+    assert [product.name for product in best_buy.get_products_by_price(2, 2)] == \
+        ["MacBook Air M2"]
+
+
+def test_columnar_listing_pages():
+    best_buy = make_store()
+
+    assert [product.name for product in best_buy.get_products_page(2, 2)] == ["Shipping"]
+    assert [[product.name for product in page] for page in best_buy.iter_products(2)] == \
+        [["MacBook Air M2", "Windows License"], ["Shipping"]]
+    best_buy.find_product_by_name("Shipping").limit = 3
+    assert "Limited to 3 per order" in best_buy.render_products(page=2, page_size=2)
+
+
+def test_columnar_search():
+    best_buy = make_store()
+    assert [product.name for product in best_buy.search_products("ship")] == ["Shipping"]
+
+    best_buy.remove_product(best_buy.find_product_by_name("Shipping"))
+    best_buy.add_product(Product("Shipping Box", price=2, quantity=10))
+
+    assert [product.name for product in best_buy.search_products("shiping")] == ["Shipping Box"]
+    assert [product.name for product in best_buy.search_products("pixel", active_only=True)] == []
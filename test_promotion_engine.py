@@ -0,0 +1,82 @@
+import pickle
+import pytest
+from products import Product
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount, price_lines
+from promotion_engine import (PromotionEngine, PercentOff, BuyNGetM, NthItemDiscount,
+                              QuantityTiers, CompiledPromotion, TABLE_SIZE)
+
+
+def test_single_rules_match_the_promotions():
+    product = Product("MacBook Air M2", price=1450, quantity=1000)
+    pairs = [(NthItemDiscount("half", nth=2, percent=50), SecondHalfPrice("Second Half price!")),
+             (BuyNGetM("third", buy=2, free=1), ThirdOneFree("Third One Free!")),
+             (PercentOff("30", percent=30), PercentDiscount("30% off!", percent=30))]
+    for rule, promotion in pairs:
+        compiled = CompiledPromotion([rule])
+        for quantity in (0, 1, 2, 3, 7, TABLE_SIZE + 5):
+            assert compiled.apply_promotion(product, quantity) == \
+                promotion.apply_promotion(product, quantity)
+
+
+def test_rules_stack_by_priority_and_stop():
+    half = NthItemDiscount("Second Half price!", priority=1)
+    thirty = PercentOff("30% off!", percent=30)
+    bulk = QuantityTiers("Bulk", {10: 20}, priority=5, stop=True)
+
+    assert CompiledPromotion([thirty, half]).calculate_discount_factor(None, 2) == \
+        2 * 0.75 * 0.7
+    stacked = CompiledPromotion([thirty, half, bulk])
+    assert stacked.name == "Bulk + Second Half price! + 30% off!"
+    # below the tier the bulk rule does not apply, so it does not stop the stack
+    assert stacked.calculate_discount_factor(None, 2) == 2 * 0.75 * 0.7
+    assert stacked.calculate_discount_factor(None, 10) == 8
+    assert stacked.calculate_discount_factors([2, 10, 100]) == [2 * 0.75 * 0.7, 8, 80]
+
+
+def test_engine_recompiles_only_affected_stacks():
+    mac = Product("MacBook Air M2", price=1000, quantity=100)
+    bose = Product("Bose QuietComfort Earbuds", price=250, quantity=500)
+    pixel = Product("Google Pixel 7", price=500, quantity=250)
+    half = NthItemDiscount("Second Half price!")
+    sale = PercentOff("Sale", percent=10)
+    engine = PromotionEngine()
+
+    engine.attach(half, [mac, bose, pixel])
+    engine.attach(sale, [mac])
+    assert mac.promotion.name == "Second Half price! + Sale"
+    assert bose.promotion is pixel.promotion
+    shared = bose.promotion
+
+    engine.update_rule(sale, percent=50)
+    assert mac.quote(2) == 750
+    assert bose.promotion is shared and bose.quote(2) == 375
+    assert price_lines([(bose, 2), (pixel, 2), (mac, 1)]) == [375, 750, 500]
+
+    engine.detach(half)
+    assert bose.promotion is None and engine.rules_of(mac) == [sale]
+    assert set(engine.promotions) == {"Sale"}
+    assert pickle.loads(pickle.dumps(mac.promotion)).calculate_discount_factor(None, 3) == 1.5
+
+
+def test_update_rule_validates_the_new_values():
+    pixel = Product("Google Pixel 7", price=500, quantity=250)
+    third = BuyNGetM("Third One Free!", buy=2, free=1)
+    engine = PromotionEngine()
+    engine.attach(third, [pixel])
+
+    with pytest.raises(ValueError):
+        engine.update_rule(third, buy=0)
+    with pytest.raises(ValueError):
+        engine.update_rule(third, free=2, buy=-1)
+    assert (third.buy, third.free) == (2, 1) and pixel.quote(3) == 1000
+    for make in (lambda: PercentOff("Too much", percent=120),
+                 lambda: NthItemDiscount("Negative", percent=-5),
+                 lambda: QuantityTiers("Bulk", {10: 150})):
+        with pytest.raises(ValueError):
+            make()
+
+    sale = PercentOff("Sale", percent=10)
+    engine.attach(sale, [pixel])
+    with pytest.raises(ValueError):
+        engine.update_rule(sale, percent=101)
+    assert sale.percent == 10
@@ -0,0 +1,24 @@
+from products import Product
+from promotions import SecondHalfPrice, ThirdOneFree, PercentDiscount, price_lines
+
+
+def test_batch_pricing_matches_single_pricing():
+    promotions = [SecondHalfPrice("Second Half price!"), ThirdOneFree("Third One Free!"),
+                  PercentDiscount("30% off!", percent=30)]
+    product = Product("MacBook Air M2", price=1450, quantity=100)
+    quantities = list(range(0, 12))
+
+    for promotion in promotions:
+        expected = [promotion.apply_promotion(product, quantity) for quantity in quantities]
+        assert promotion.apply_promotion_batch([1450] * len(quantities), quantities) == expected
+
+
+def test_price_lines_groups_by_promotion_and_keeps_line_order():
+    half = SecondHalfPrice("Second Half price!")
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    bose = Product("Bose QuietComfort Earbuds", price=250, quantity=500)
+    pixel = Product("Google Pixel 7", price=500, quantity=250)
+    mac.set_promotion(half)
+    pixel.set_promotion(half)
+
+    assert price_lines([(mac, 2), (bose, 3), (pixel, 3)]) == [2175.0, 750, 1250.0]
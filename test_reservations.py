@@ -0,0 +1,59 @@
+import pytest
+from products import Product, NonStockedProduct
+from store import Store, OrderRejected
+from reservations import ReservationBook
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_store():
+    pixel = Product("Google Pixel 7", price=500, quantity=3)
+    windows = NonStockedProduct("Windows License", price=125)
+    store = Store([pixel, windows])
+    clock = FakeClock()
+    return store, ReservationBook(store, ttl=60, clock=clock), clock
+
+
+def test_holds_keep_stock_from_other_carts():
+    store, book, _ = make_store()
+    first, second = store.init_order_list(), store.init_order_list()
+
+    assert store.add_product_to_order("Google Pixel 7", 2, first) == (True, 0)
+    assert store.add_product_to_order("Google Pixel 7", 2, second) == (False, 1)
+    assert store.add_product_to_order("Windows License", 500, second) == (True, 0)
+    assert store.available_quantity(store.find_product_by_name("Google Pixel 7"), second) == 1
+    assert book.held_by(first.cart_id) == {"Google Pixel 7": 2}
+
+    with pytest.raises(OrderRejected):
+        store.submit_order([("Google Pixel 7", 2)])
+    receipt = store.submit_order(first)
+    assert receipt.total == 1000
+    assert book.held_by(first.cart_id) == {} and len(book) == 1
+    assert store.submit_order([("Google Pixel 7", 1)]).total == 500
+
+
+def test_expired_holds_are_reclaimed():
+    store, book, clock = make_store()
+    pixel = store.find_product_by_name("Google Pixel 7")
+    abandoned, active = store.init_order_list(), store.init_order_list()
+    store.add_product_to_order("Google Pixel 7", 2, abandoned)
+
+    clock.now = 50
+    store.add_product_to_order("Google Pixel 7", 1, active)
+    assert book.held(pixel) == 3
+
+    clock.now = 70
+    assert store.available_quantity(pixel) == 2
+    assert book.expire() == 0 and len(book) == 1
+    assert store.add_product_to_order("Google Pixel 7", 1, active) == (True, 0)
+
+    clock.now = 125
+    assert book.held(pixel) == 2
+    clock.now = 200
+    assert book.held(pixel) == 0 and len(book) == 0
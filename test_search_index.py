@@ -0,0 +1,67 @@
+from products import Product
+from search_index import SearchIndex, edit_distance
+from main import create_store
+
+
+def names(products):
+    return [product.name for product in products]
+
+
+def test_prefix_search_ranks_and_limits():
+    store = create_store()
+    store.add_product(Product("MacBook Air M1", price=999, quantity=3))
+    store.add_product(Product("Air Purifier", price=199, quantity=3))
+
+    assert names(store.search_products("pixel")) == ["Google Pixel 7"]
+    assert names(store.search_products("macbook air")) == ["MacBook Air M1", "MacBook Air M2"]
+    assert names(store.search_products("air", limit=2)) == ["Air Purifier", "MacBook Air M2"]
+    assert store.search_products("") == []
+
+    store.remove_product(store.find_product_by_name("MacBook Air M2"))
+    assert names(store.search_products("mac")) == ["MacBook Air M1"]
+
+
+def test_fuzzy_search_tolerates_typos():
+    store = create_store()
+    store.find_product_by_name("Google Pixel 7").set_quantity(0)
+
+    assert names(store.search_products("pixle")) == ["Google Pixel 7"]
+    assert names(store.search_products("mackbok ari")) == ["MacBook Air M2"]
+    assert store.search_products("pixle", fuzzy=False) == []
+    assert store.search_products("pixel", active_only=True) == []
+    assert store.search_products("zzzzzz") == []
+
+
+def test_index_follows_removals():
+    products = [Product(f"Widget {number}", price=1, quantity=1) for number in range(5)]
+    index = SearchIndex(enumerate(products))
+    index.discard(2)
+    index.add(7, Product("Gadget", price=1, quantity=1))
+
+    assert names(index.search("widget")) == ["Widget 0", "Widget 1", "Widget 3", "Widget 4"]
+    assert names(index.search("gad")) == ["Gadget"]
+    assert names(index.fuzzy_search("gadgte")) == ["Gadget"]
+    assert len(index) == 5
+
+
+def test_edit_distance():
+    assert edit_distance("kitten", "sitting", 5) == 3
+    assert edit_distance("kitten", "sitting", 2) == 3
+    assert edit_distance("pixel", "pixel", 2) == 0
+
+
+def test_stock_changes_go_on_during_a_search():
+    store = create_store()
+    pixel = store.find_product_by_name("Google Pixel 7")
+    index = store._get_search_index()
+    search = index.fuzzy_search
+
+    def checkout_during_search(*args, **kwargs):
+        # would deadlock if the search held the lock of the stock totals
+        pixel.set_quantity(pixel.quantity - 1)
+        return search(*args, **kwargs)
+
+    index.fuzzy_search = checkout_during_search
+    total = store.get_total_quantity()
+    assert names(store.search_products("pixle")) == ["Google Pixel 7"]
+    assert store.get_total_quantity() == total - 1
@@ -0,0 +1,67 @@
+import asyncio
+import json
+from main import create_store
+from server import StoreServer
+
+
+async def exchange(port, requests):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    for request in requests:
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        responses.append(json.loads(await reader.readline()))
+    writer.close()
+    return responses
+
+
+def test_server_lists_totals_and_orders():
+    async def scenario():
+        server = StoreServer(create_store(), port=0)
+        await server.start()
+        try:
+            return await exchange(server.port, [
+                {"op": "total"},
+                {"op": "order", "lines": [["Google Pixel 7", 2], ["Shipping", 1]]},
+                {"op": "order", "lines": [["Shipping", 5]]},
+                {"op": "list"},
+                {"op": "list", "page": 2, "page_size": 2},
+                {"op": "refund"},
+            ])
+        finally:
+            await server.close()
+
+    total, receipt, rejected, listing, page, unknown = asyncio.run(scenario())
+
+    assert total == {"ok": True, "total_quantity": 1100}
+    assert receipt["ok"] and receipt["receipt"]["total"] == 1010
+    assert rejected["ok"] is False and "Only 1 units" in rejected["error"]
+    assert [product["quantity"] for product in listing["products"]][2] == 248
+    assert page["products"] == listing["products"][2:4]
+    assert unknown["ok"] is False
+
+
+def test_server_survives_long_lines_and_failing_requests():
+    async def scenario():
+        server = StoreServer(create_store(), port=0)
+
+        def fail():
+            raise RuntimeError("broken store")
+        server.store.get_total_quantity = fail
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b'{"op": "list", "pad": "' + b"x" * 200000 + b'"}\n')
+            writer.write(b'{"op": "total"}\n{"op": "list", "page": 1, "page_size": 1}\n')
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(3)]
+            writer.close()
+            return responses
+        finally:
+            await server.close()
+
+    too_long, failed, listing = asyncio.run(scenario())
+
+    assert too_long == {"ok": False, "error": "Request too long."}
+    assert failed == {"ok": False, "error": "Internal error."}
+    assert listing["ok"] and len(listing["products"]) == 1
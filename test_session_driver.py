@@ -0,0 +1,79 @@
+import io
+import pytest
+from products import Product, NonStockedProduct
+from store import Store
+from store_io import BufferedIO, ConsoleIO, MemoryIO
+from reservations import ReservationBook
+import main
+import session_driver
+
+
+def make_store(**kwargs):
+    return Store([Product("MacBook Air M2", price=1450, quantity=10),
+                  NonStockedProduct("Windows License", price=125)], **kwargs)
+
+
+def test_place_order_runs_on_scripted_input():
+    script = MemoryIO(["3", "1", "x", "2", "2", "5", ""])
+    store = make_store(io=script)
+
+    store.place_order()
+
+    assert script.pending == 0
+    assert store.find_product_by_name("MacBook Air M2").quantity == 8
+    transcript = script.output
+    assert "Which product # do you want? 3\n" in transcript
+    assert "the option 3 is invalid" in transcript
+    assert "Invalid option" in transcript
+    assert "--- Order confirmed ---" in transcript
+    assert "Total price:         $3525.00" in transcript
+    assert Store.io.__class__ is ConsoleIO and make_store().io is Store.io
+
+
+def test_start_reads_the_menu_through_the_store_io():
+    script = MemoryIO(["2", "9", "4"])
+    main.start(make_store(io=script))
+    assert "Total of 10 items in store" in script.output
+    assert "Only values of 1, 2, 3, or 4" in script.output
+    assert script.output.endswith("in the future.\n\n")
+    with pytest.raises(EOFError):
+        script.input()
+
+
+def test_buffered_io_writes_before_every_prompt():
+    stream = io.StringIO()
+    buffered = BufferedIO(stream, io.StringIO("3\n"))
+    buffered.print("a", 1, sep="-")
+    assert stream.getvalue() == ""
+    assert buffered.input("? ") == "3"
+    assert stream.getvalue() == "a-1\n? "
+    buffered.print("b", end="")
+    buffered.flush()
+    assert stream.getvalue() == "a-1\n? b"
+    with pytest.raises(EOFError):
+        buffered.input()
+
+
+def test_replay_counts_orders_and_abandoned_sessions(tmp_path):
+    store = make_store()
+    book = ReservationBook(store)
+    sessions = session_driver.synthetic_sessions(50, 2, seed=3)
+    path = str(tmp_path / "sessions.jsonl")
+    session_driver.save_sessions(path, sessions)
+    assert session_driver.load_sessions(path) == sessions
+
+    stats = session_driver.replay(store, [["1", "2", ""], ["1", "3"], ["0"]], capture=True)
+
+    assert (stats["sessions"], stats["orders"], stats["abandoned"]) == (3, 1, 1)
+    assert "--- Order cancelled ----" in stats["transcripts"][2]
+    assert store.find_product_by_name("MacBook Air M2").quantity == 8
+    assert len(book) == 0
+    assert "io" not in vars(store)
+
+    assert session_driver.replay(store, [])["sessions"] == 0
+    assert "io" not in vars(store)
+
+    store.find_product_by_name("MacBook Air M2").set_quantity(1000)
+    stats = session_driver.replay(store, sessions)
+    assert stats["sessions"] == 50 and stats["abandoned"] == 0
+    assert stats["orders"] == len([s for s in sessions if s[-1] == ""])
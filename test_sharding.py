@@ -0,0 +1,93 @@
+import pytest
+from main import create_promotions, create_store
+from products import Product
+from sharding import ShardedStore, shard_of
+from store import OrderRejected
+
+
+@pytest.fixture
+def sharded():
+    promotions = create_promotions()
+    store = ShardedStore(create_store(promotions).products_list, promotions, shard_count=3)
+    yield store, promotions
+    store.close()
+
+
+def test_catalog_is_spread_and_gathered(sharded):
+    store, promotions = sharded
+
+    assert len({shard_of(product.name, 3) for product in create_store().products_list}) > 1
+    assert store.get_total_quantity() == 1100
+    assert store.get_active_count() == 5
+    assert sorted(product.name for product in store.get_products()[0]) == \
+        sorted(product.name for product in create_store().products_list)
+    assert store.find_product_by_name("MacBook Air M2", promotions).promotion.name == \
+        "Second Half price!"
+    assert store.find_product_by_name("Apple Watch") is None
+
+
+def test_cross_shard_order_is_all_or_nothing(sharded):
+    store, _ = sharded
+    assert len({shard_of(name, 3) for name in ("MacBook Air M2", "Google Pixel 7",
+                                                "Shipping")}) > 1
+
+    receipt = store.submit_order([("MacBook Air M2", 2), ("Google Pixel 7", 1),
+                                  ("Shipping", 1)])
+    assert [line.product_name for line in receipt.lines] == \
+        ["MacBook Air M2", "Google Pixel 7", "Shipping"]
+    assert receipt.total == 1450 * 1.5 + 500 + 10
+    assert store.get_receipt(receipt.order_id) is receipt
+    assert store.get_total_quantity() == 1096
+
+    with pytest.raises(OrderRejected, match="insufficient quantity"):
+        store.submit_order([("MacBook Air M2", 2), ("Google Pixel 7", 1000)])
+    with pytest.raises(OrderRejected, match="Only 1 units"):
+        store.submit_order([("Google Pixel 7", 1), ("Shipping", 2)])
+    assert store.get_total_quantity() == 1096
+    assert store.find_product_by_name("MacBook Air M2").quantity == 98
+
+
+def test_products_are_added_and_removed_on_their_shard(sharded):
+    store, _ = sharded
+
+    store.add_product(Product("Apple Watch", price=400, quantity=7))
+    assert store.order([("Apple Watch", 2)]) == 800
+    store.remove_product("Google Pixel 7")
+
+    assert store.get_total_quantity() == 855
+    assert store.find_product_by_name("Google Pixel 7") is None
+
+
+def test_submit_orders_batches_by_shard(sharded):
+    store, _ = sharded
+
+    results = store.submit_orders([[("MacBook Air M2", 1)], [("Google Pixel 7", 1),
+                                                            ("Shipping", 1)],
+                                   [("Apple Watch", 1)], [], [("MacBook Air M2", 1)]])
+
+    assert [type(result).__name__ for result in results] == \
+        ["Receipt", "Receipt", "OrderRejected", "OrderRejected", "Receipt"]
+    assert str(results[2]) == "The Apple Watch is not available in the store."
+    assert store.get_total_quantity() == 1096
+
+
+def test_worker_errors_and_dead_workers_fail_the_request(sharded):
+    store, _ = sharded
+
+    # a malformed request fails without stopping the worker
+    with pytest.raises(ValueError):
+        store._call_one("MacBook Air M2", "find")
+    assert store.find_product_by_name("MacBook Air M2").quantity == 100
+
+    dead = shard_of("Shipping", 3)
+    assert shard_of("MacBook Air M2", 3) != dead
+    store._processes[dead].terminate()
+    store._processes[dead].join()
+
+    with pytest.raises(OrderRejected, match="unavailable"):
+        store.submit_order([("MacBook Air M2", 2), ("Shipping", 1)])
+    results = store.submit_orders([[("Shipping", 1)], [("MacBook Air M2", 1)]])
+    assert isinstance(results[0], OrderRejected) and results[1].total == 1450
+    assert store.find_product_by_name("MacBook Air M2").quantity == 99
+    with pytest.raises(ValueError, match="unavailable"):
+        store.get_total_quantity()
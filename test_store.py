@@ -0,0 +1,245 @@
+import threading
+import pytest
+from products import Product, NonStockedProduct, LimitedProduct
+from store import Store, OrderRejected
+
+
+def make_store():
+    mac = Product("MacBook Air M2", price=1450, quantity=100)
+    bose = Product("Bose QuietComfort Earbuds", price=250, quantity=500)
+    windows = NonStockedProduct("Windows License", price=125)
+    shipping = LimitedProduct("Shipping", price=10, quantity=250, limit=1)
+    return Store([mac, bose, windows, shipping])
+
+
+def test_find_product_by_name_follows_add_and_remove():
+    best_buy = make_store()
+    pixel = Product("Google Pixel 7", price=500, quantity=250)
+
+    assert best_buy.find_product_by_name("Google Pixel 7") is None
+    assert pixel not in best_buy
+
+    best_buy.add_product(pixel)
+    assert best_buy.find_product_by_name("Google Pixel 7") is pixel
+    assert pixel in best_buy
+
+    best_buy.remove_product(pixel)
+    assert best_buy.find_product_by_name("Google Pixel 7") is None
+    assert pixel not in best_buy
+
+
+def test_order_uses_name_index():
+    best_buy = make_store()
+    mac = best_buy.find_product_by_name("MacBook Air M2")
+
+    total_price = best_buy.order([("MacBook Air M2", 2), ("Unknown", 1)])
+
+    assert total_price == 2900
+    assert mac.quantity == 98
+
+
+def test_cart_merges_lines_and_keeps_running_totals():
+    best_buy = make_store()
+    mac = best_buy.find_product_by_name("MacBook Air M2")
+    cart = best_buy.init_order_list()
+
+    assert best_buy.add_product_to_order("MacBook Air M2", 1, cart) == (True, 0)
+    assert best_buy.add_product_to_order("MacBook Air M2", 2, cart) == (True, 0)
+    assert best_buy.add_product_to_order("Shipping", 1, cart) == (True, 0)
+    assert best_buy.add_product_to_order("MacBook Air M2", 98, cart) == (False, 1)
+
+    assert len(cart) == 2
+    assert list(cart) == [("MacBook Air M2", 3), ("Shipping", 1)]
+    assert cart.total_quantity == 4
+    assert cart.total_price == 3 * 1450 + 10
+    assert Store.find_quantity_of_added_item(cart, "Windows License") == -1
+
+    assert cart.remove("Shipping") == 1
+    assert cart.total_price == 3 * 1450
+    assert best_buy.order(cart) == 3 * 1450
+    assert mac.quantity == 97
+
+
+def test_aggregates_follow_product_changes():
+    best_buy = make_store()
+    mac = best_buy.find_product_by_name("MacBook Air M2")
+    bose = best_buy.find_product_by_name("Bose QuietComfort Earbuds")
+
+    assert best_buy.get_total_quantity() == 850
+    assert best_buy.get_active_count() == 4
+
+    mac.buy(100)
+    assert best_buy.get_total_quantity() == 750
+    assert best_buy.get_products()[0] == [bose, *best_buy.get_products()[0][1:]]
+    assert mac not in best_buy.get_products()[0]
+
+    mac.set_quantity(5)
+    assert best_buy.get_total_quantity() == 755
+    assert best_buy.get_products()[0][0] is mac
+
+    best_buy.remove_product(bose)
+    best_buy.add_product(Product("Google Pixel 7", price=500, quantity=250))
+    assert best_buy.get_total_quantity() == 505
+    assert best_buy.get_active_count() == 4
+    assert best_buy.get_products()[0][-1].name == "Google Pixel 7"
+
+    bose.set_quantity(0)
+    assert best_buy.get_total_quantity() == 505
+
+
+def test_a_product_belongs_to_one_store():
+    first = make_store()
+    mac = first.find_product_by_name("MacBook Air M2")
+    pixel = Product("Google Pixel 7", price=500, quantity=3)
+    first.add_product(pixel)
+
+    for add in (lambda: Store([]).add_product(mac), lambda: first.add_product(pixel),
+                lambda: Store([]).add_products([pixel]), lambda: Store([mac])):
+        with pytest.raises(ValueError, match="already belongs"):
+            add()
+    spare = Product("Apple Watch", price=400, quantity=1)
+    with pytest.raises(ValueError, match="twice"):
+        Store([]).add_products([spare, spare])
+    mac.set_quantity(1)
+    assert first.get_total_quantity() == 754
+
+    first.remove_product(pixel)
+    pixel.set_quantity(0)
+    assert (first.get_total_quantity(), first.get_active_count()) == (751, 4)
+    second = Store([spare])
+    second.add_product(pixel)
+    assert (second.get_total_quantity(), second.get_active_count()) == (1, 1)
+
+
+def test_price_queries_follow_price_and_status_changes():
+    best_buy = make_store()
+
+    def names(products):
+        return [product.name for product in products]
+
+    assert names(best_buy.get_cheapest_products(2)) == ["Shipping", "Windows License"]
+    assert names(best_buy.get_products_in_price_range(100, 500)) == \
+        ["Windows License", "Bose QuietComfort Earbuds"]
+
+    best_buy.find_product_by_name("Bose QuietComfort Earbuds").price = 5
+    best_buy.find_product_by_name("Shipping").deactivate()
+    best_buy.add_product(Product("Apple Watch", price=400, quantity=7))
+
+    assert names(best_buy.get_cheapest_products(2)) == ["Bose QuietComfort Earbuds", "Windows License"]
+    assert names(best_buy.get_products_by_price(page=2, page_size=2)) == \
+        ["Apple Watch", "MacBook Air M2"]
+    assert best_buy.get_products_by_price(page=3, page_size=2) == []
+    with pytest.raises(ValueError):
+        best_buy.get_products_by_price(page=0)
+
+
+def test_listing_pages_and_render_cache():
+    best_buy = make_store()
+    mac = best_buy.find_product_by_name("MacBook Air M2")
+
+    def names(products):
+        return [product.name for product in products]
+
+    assert names(best_buy.get_products_page(page=2, page_size=3)) == ["Shipping"]
+    assert best_buy.get_products_page(page=3, page_size=3) == []
+    with pytest.raises(ValueError):
+        best_buy.get_products_page(page=0)
+
+    pages = best_buy.iter_products(page_size=2)
+    assert names(next(pages)) == ["MacBook Air M2", "Bose QuietComfort Earbuds"]
+    mac.buy(100)
+    best_buy.add_product(Product("Google Pixel 7", price=500, quantity=250))
+    assert [names(page) for page in pages] == [["Windows License", "Shipping"], ["Google Pixel 7"]]
+
+    listing = best_buy.render_products()
+    assert listing.splitlines()[2].startswith("1. Bose QuietComfort Earbuds, Price: 250")
+    assert best_buy.render_products() is listing
+    assert "2-2 of 4" in best_buy.render_products(page=2, page_size=1)
+
+    version = best_buy.version
+    best_buy.find_product_by_name("Windows License").set_promotion(None)
+    best_buy.find_product_by_name("Shipping").limit = 2
+    assert best_buy.version == version + 2
+    assert "Limited to 2 per order" in best_buy.render_products()
+
+
+def test_quote_does_not_buy():
+    best_buy = make_store()
+
+    assert best_buy.quote([("MacBook Air M2", 2), ("Windows License", 2)]) == 3150
+    assert best_buy.get_total_quantity() == 850
+
+
+def test_submit_order_returns_receipt():
+    best_buy = make_store()
+
+    receipt = best_buy.submit_order([("MacBook Air M2", 1), ("Windows License", 2),
+                                     ("MacBook Air M2", 1)])
+
+    assert best_buy.get_receipt(receipt.order_id) is receipt
+    assert best_buy.get_receipt("0" * 25) is None
+    assert list(receipt) == [("MacBook Air M2", 2), ("Windows License", 2)]
+    assert [line.line_total for line in receipt.lines] == [2900, 250]
+    assert receipt.total == 3150
+    assert best_buy.get_total_quantity() == 848
+
+
+@pytest.mark.parametrize("shopping_list, message", [
+    ([], "empty"),
+    ([("Google Pixel 7", 1)], "not available"),
+    ([("Shipping", 2)], "Only 1 units"),
+    ([("Windows License", Store.OUR_POLICY_MAX_ALLOWED_ITEMS + 1)], "Non stocked"),
+    ([("Shipping", 1), ("MacBook Air M2", 101)], "insufficient quantity"),
+    ([("MacBook Air M2", 0)], "Invalid quantity"),
+])
+def test_submit_order_rejects_without_buying(shopping_list, message):
+    best_buy = make_store()
+
+    with pytest.raises(OrderRejected, match=message):
+        best_buy.submit_order(shopping_list)
+    assert best_buy.get_total_quantity() == 850
+
+
+def test_submit_orders_reports_every_order():
+    best_buy = make_store()
+
+    results = best_buy.submit_orders([[("Shipping", 1)], [("Shipping", 2)], [("Shipping", 1)]])
+
+    assert [type(result).__name__ for result in results] == \
+        ["Receipt", "OrderRejected", "Receipt"]
+    assert best_buy.find_product_by_name("Shipping").quantity == 248
+
+
+def test_order_is_all_or_nothing():
+    best_buy = make_store()
+
+    with pytest.raises(ValueError, match="insufficient quantity"):
+        best_buy.order([("Bose QuietComfort Earbuds", 10), ("MacBook Air M2", 60),
+                        ("MacBook Air M2", 60)])
+    assert best_buy.get_total_quantity() == 850
+
+
+def test_concurrent_checkout_never_oversells():
+    best_buy = make_store()
+    receipts = []
+    rejections = []
+
+    def shop():
+        for _ in range(50):
+            try:
+                receipts.append(best_buy.submit_order([("Bose QuietComfort Earbuds", 3),
+                                                       ("MacBook Air M2", 1)]))
+            except OrderRejected:
+                rejections.append(1)
+
+    workers = [threading.Thread(target=shop) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(receipts) == 100
+    assert len(rejections) == 300
+    assert best_buy.find_product_by_name("MacBook Air M2").quantity == 0
+    assert best_buy.find_product_by_name("Bose QuietComfort Earbuds").quantity == 200
+    assert best_buy.get_total_quantity() == 450